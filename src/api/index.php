@@ -20,6 +20,51 @@ $endpoint = $_GET['endpoint'] ?? 'health';
 $address  = $_GET['address'] ?? '';
 $limit    = max(1, min(50, intval($_GET['limit'] ?? 5))); // от 1 до 50
 
+// ===== Вспомогательная функция: привести адрес к raw формату (wc:hex) =====
+// Тот же алгоритм, что и address.py в парсере: адреса в базе хранятся
+// как "0:" + 64 hex символа в нижнем регистре
+function toRawAddress($address) {
+    $address = trim($address);
+
+    // Уже raw формат — только приводим hex к нижнему регистру
+    if (preg_match('/^(-?[0-9]+):([a-fA-F0-9]{64})$/', $address, $m)) {
+        return intval($m[1]) . ':' . strtolower($m[2]);
+    }
+
+    // User-friendly адрес: 36 байт в base64 = 48 символов
+    if (!preg_match('/^[A-Za-z0-9+\/_-]{48}$/', $address)) {
+        return $address;
+    }
+
+    $bytes = base64_decode(strtr($address, '-_', '+/'), true);
+    if ($bytes === false || strlen($bytes) !== 36) {
+        return $address;
+    }
+
+    // Проверяем CRC16-XMODEM последних двух байт
+    $crc = 0;
+    for ($i = 0; $i < 34; $i++) {
+        $crc ^= ord($bytes[$i]) << 8;
+        for ($j = 0; $j < 8; $j++) {
+            $crc = ($crc & 0x8000) ? (($crc << 1) ^ 0x1021) : ($crc << 1);
+            $crc &= 0xFFFF;
+        }
+    }
+    if ($crc !== ((ord($bytes[34]) << 8) | ord($bytes[35]))) {
+        return $address;
+    }
+
+    // Байт 1 = workchain (подписанный байт), байты 2-33 = хэш
+    $workchain = ord($bytes[1]);
+    if ($workchain > 127) $workchain -= 256;
+
+    return $workchain . ':' . bin2hex(substr($bytes, 2, 32));
+}
+
+if ($address !== '') {
+    $address = toRawAddress($address);
+}
+
 // ===== HEALTH =====
 if ($endpoint === 'health') {
     echo json_encode([
@@ -0,0 +1,106 @@
+"""
+Приведение адресов TON к единому raw формату (wc:hex).
+Используется при загрузке (ton_parser.py) и при поиске (reputation.py),
+чтобы в базе и в поиске адрес всегда выглядел одинаково:
+"0:" + 64 hex символа в нижнем регистре.
+
+Тот же алгоритм повторяет функция toRawAddress в widget.js и в index.php.
+"""
+
+import base64
+import re
+from functools import lru_cache
+
+# Raw формат: workchain:hash (hash - 32 байта в hex)
+RAW_ADDRESS_RE = re.compile(r"^(-?\d+):([0-9a-fA-F]{64})$")
+
+# User-friendly формат: 36 байт в base64 (обычном или url-safe) = 48 символов
+FRIENDLY_ADDRESS_RE = re.compile(r"^[A-Za-z0-9+/_-]{48}$")
+
+
+def crc16(data: bytes) -> int:
+    """
+    CRC16-XMODEM (полином 0x1021), которым подписаны user-friendly адреса
+
+    Args:
+        data: байты для подсчёта
+
+    Returns:
+        контрольная сумма (0..65535)
+    """
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+@lru_cache(maxsize=65536)
+def to_raw_address(address: str) -> str:
+    """
+    Приводим адрес к raw формату wc:hex (hex в нижнем регистре).
+    Результат кэшируется: одни и те же адреса встречаются постоянно.
+
+    Args:
+        address: адрес в любом формате (0:.../-1:.../EQ.../UQ...)
+
+    Returns:
+        адрес в raw формате
+
+    Raises:
+        ValueError: адрес не распознан или не сошлась контрольная сумма
+    """
+    address = address.strip()
+
+    match = RAW_ADDRESS_RE.match(address)
+    if match:
+        return f"{int(match.group(1))}:{match.group(2).lower()}"
+
+    if not FRIENDLY_ADDRESS_RE.match(address):
+        raise ValueError(f"Неизвестный формат адреса: {address}")
+
+    # Структура: флаги(1 байт) + workchain(1 байт) + hash(32 байта) + crc(2 байта)
+    decoded = base64.b64decode(address.replace("-", "+").replace("_", "/"))
+
+    if crc16(decoded[:34]) != int.from_bytes(decoded[34:36], "big"):
+        raise ValueError(f"Неверная контрольная сумма адреса: {address}")
+
+    workchain = decoded[1] - 256 if decoded[1] > 127 else decoded[1]
+    return f"{workchain}:{decoded[2:34].hex()}"
+
+
+def try_raw_address(address: str) -> str:
+    """
+    Как to_raw_address, но без исключений: нераспознанный адрес
+    возвращается без изменений (обрезанный по краям)
+
+    Args:
+        address: адрес в любом формате
+
+    Returns:
+        адрес в raw формате или исходная строка
+    """
+    if not address:
+        return ""
+    try:
+        return to_raw_address(address)
+    except ValueError:
+        return address.strip()
+
+
+def hash_part(address: str) -> str:
+    """
+    Hex часть адреса без workchain (для поиска без учёта workchain)
+
+    Args:
+        address: адрес в любом формате
+
+    Returns:
+        64 hex символа или пустая строка, если адрес не распознан
+    """
+    try:
+        return to_raw_address(address).split(":", 1)[1]
+    except ValueError:
+        return ""
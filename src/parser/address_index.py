@@ -0,0 +1,140 @@
+"""
+Индекс адресов для поиска пользователя (ReputationCounter.find_user_by_address).
+Строится рядом с reputation_data и отвечает на все формы поиска без
+перебора всех адресов:
+    - точный адрес                   - множество, O(1)
+    - hex часть (без workchain)      - словарь, O(1)
+    - фрагмент адреса                - сортированные списки, O(log n):
+      начало hex части или конец адреса (например, последние 16 символов)
+
+Все ключи в нижнем регистре: так же сравнивал прежний поиск перебором.
+"""
+
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional
+
+# Длина hex части адреса (32 байта)
+HASH_LENGTH = 64
+
+
+class AddressIndex:
+    """Индексы адресов из базы: по hex части, по началу hex части и по концу адреса"""
+
+    def __init__(self, addresses: Iterable[str] = ()):
+        """
+        Строим индекс
+
+        Args:
+            addresses: адреса из базы (в том виде, как они хранятся)
+        """
+        self.addresses = set()
+
+        # {hex часть в нижнем регистре: адрес}; при совпадении остаётся первый адрес
+        self.by_hash = {}
+
+        # {адрес в нижнем регистре: адрес} - только для адресов не в нижнем регистре
+        self.cased = {}
+
+        # Сортированные ключи: hex части и перевёрнутые адреса в нижнем регистре.
+        # Списки строк, а не пар (ключ, адрес): сортируются в разы быстрее,
+        # а адрес восстанавливается по ключу через by_hash и cased
+        reversed_suffixes = []
+        for address in addresses:
+            lowered = self._add(address)
+            if lowered is not None:
+                reversed_suffixes.append(lowered[::-1])
+
+        # Пакетная сборка: одна сортировка вместо вставки каждого адреса
+        self.hash_prefixes: List[str] = sorted(self.by_hash)
+        self.reversed_suffixes: List[str] = sorted(reversed_suffixes)
+
+    def _add(self, address: str) -> Optional[str]:
+        """
+        Добавляем адрес в множество и словари
+
+        Returns:
+            Адрес в нижнем регистре или None, если адрес уже был
+        """
+        if address in self.addresses:
+            return None
+
+        self.addresses.add(address)
+        lowered = address.lower()
+
+        if lowered != address:
+            self.cased.setdefault(lowered, address)
+
+        if len(lowered) >= HASH_LENGTH:
+            self.by_hash.setdefault(lowered[-HASH_LENGTH:], address)
+
+        return lowered
+
+    def add(self, address: str):
+        """
+        Добавляем новый адрес (например, пользователя, получившего первую оценку)
+
+        Args:
+            address: адрес из базы
+        """
+        hashes = len(self.by_hash)
+        lowered = self._add(address)
+        if lowered is None:
+            return
+
+        insort(self.reversed_suffixes, lowered[::-1])
+        if len(self.by_hash) > hashes:
+            insort(self.hash_prefixes, lowered[-HASH_LENGTH:])
+
+    def __contains__(self, address: str) -> bool:
+        """Есть ли адрес в базе (точное совпадение)"""
+        return address in self.addresses
+
+    def __len__(self) -> int:
+        """Количество адресов"""
+        return len(self.addresses)
+
+    def find_by_hash(self, hex_part: str) -> Optional[str]:
+        """
+        Адрес с такой hex частью (любой workchain, любой регистр)
+
+        Args:
+            hex_part: 64 hex символа (address.hash_part)
+
+        Returns:
+            Адрес из базы или None
+        """
+        return self.by_hash.get(hex_part.lower())
+
+    def find_by_fragment(self, fragment: str) -> Optional[str]:
+        """
+        Адрес по фрагменту: сначала конец адреса, затем начало hex части.
+        Если подходит несколько адресов, возвращается первый по алфавиту ключа.
+
+        Args:
+            fragment: часть адреса (без учёта регистра)
+
+        Returns:
+            Адрес из базы или None
+        """
+        fragment = fragment.lower()
+        if not fragment:
+            return None
+
+        key = self._find_prefix(self.reversed_suffixes, fragment[::-1])
+        if key is not None:
+            lowered = key[::-1]
+            return lowered if lowered in self.addresses else self.cased[lowered]
+
+        key = self._find_prefix(self.hash_prefixes, fragment)
+        if key is not None:
+            return self.by_hash[key]
+
+        return None
+
+    @staticmethod
+    def _find_prefix(keys: List[str], prefix: str) -> Optional[str]:
+        """Первый ключ, начинающийся с prefix (бинарный поиск)"""
+        position = bisect_left(keys, prefix)
+        if position < len(keys) and keys[position].startswith(prefix):
+            return keys[position]
+        return None
@@ -0,0 +1,323 @@
+"""
+Параллельная перезагрузка (backfill) базы repOWR.
+Нужна после изменения схемы или правил валидатора: holders разбиваются
+на шарды, загрузка, парсинг и валидация шардов идут в рабочих процессах,
+а запись в БД - в одном основном процессе (единственный писатель SQLite).
+Прогресс шардов хранится в БД, поэтому прерванный backfill при следующем
+запуске продолжается с первого необработанного шарда.
+
+Уже сохранённые транзакции не перезаписываются: запись отбрасывает их как
+дубликаты по tx_hash. Поэтому пересборка после изменения схемы или правил
+валидатора делается в новую (пустую) базу - укажите другой DATABASE_PATH
+или переместите старый файл. На непустой базе backfill только дочитывает
+недостающую историю.
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional, Tuple
+
+# Импортируем наши модули
+from ton_parser import TonParser, FULL_HISTORY, error_class
+from events import JettonTransfer
+import config
+
+# Парсер рабочего процесса (без подключения к БД), создаётся в _init_worker
+_worker_parser = None
+
+
+def _init_worker(api_rps: float):
+    """
+    Инициализация рабочего процесса
+
+    Args:
+        api_rps: доля квоты запросов, доступная этому процессу
+    """
+    global _worker_parser
+    _worker_parser = TonParser(with_db=False, api_rps=api_rps)
+
+
+def _fetch_account(address: str, start_checkpoint: Dict[str, Any]) -> Tuple[str, List[JettonTransfer], Optional[Dict[str, Any]], Optional[Exception]]:
+    """
+    Загружаем всю историю одного аккаунта (выполняется в потоке рабочего процесса)
+
+    Args:
+        address: адрес аккаунта
+        start_checkpoint: FULL_HISTORY или курсор продолжения недочитанной истории
+
+    Returns:
+        Кортеж (адрес, трансферы, новый чекпоинт, ошибка или None)
+    """
+    try:
+        transfers, checkpoint = _worker_parser.get_account_transfers(
+            address, config.TRANSACTIONS_LIMIT, start_checkpoint
+        )
+        return address, transfers, checkpoint, None
+    except Exception as e:
+        return address, [], None, e
+
+
+def process_shard(shard_id: int, accounts: List[str],
+                  start_checkpoints: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Загружаем, парсим и валидируем один шард (выполняется в рабочем процессе)
+
+    Args:
+        shard_id: номер шарда
+        accounts: адреса аккаунтов шарда
+        start_checkpoints: курсоры продолжения аккаунтов, история которых
+                           не дочитана прошлым backfill (остальные - с начала)
+
+    Returns:
+        Словарь {shard_id, records, checkpoints, stats, loaded, failed}:
+        records - пары (транзакция, данные) для Storage.write_batch,
+        loaded - успешно загруженные аккаунты,
+        failed - {адрес: класс ошибки} для аккаунтов, которые не удалось загрузить
+    """
+    parser = _worker_parser
+    stats = parser.new_stats()
+    checkpoints = {}
+    loaded = []
+    failed = {}
+    seen = set()
+    fresh = []
+
+    with ThreadPoolExecutor(max_workers=config.FETCH_CONCURRENCY) as pool:
+        starts = [(start_checkpoints or {}).get(address, FULL_HISTORY) for address in accounts]
+        for address, transfers, checkpoint, error in pool.map(_fetch_account, accounts, starts):
+            if error:
+                if config.DEBUG_MODE:
+                    print(f"⚠ Шард {shard_id}: ошибка загрузки {address[:8]}...: {error}")
+                failed[address] = error_class(error)
+                continue
+
+            loaded.append(address)
+            if checkpoint:
+                checkpoints[address] = checkpoint
+
+            for transfer in transfers:
+                # Трансфер между двумя holders шарда виден обоим - валидируем один раз
+                if transfer.tx_hash:
+                    if transfer.tx_hash in seen:
+                        continue
+                    seen.add(transfer.tx_hash)
+
+                fresh.append(transfer)
+
+    # Весь шард валидируется одной пачкой
+    records = parser.prepare_transactions(fresh, stats)
+
+    return {
+        "shard_id": shard_id,
+        "records": records,
+        "checkpoints": checkpoints,
+        "stats": stats,
+        "loaded": loaded,
+        "failed": failed,
+    }
+
+
+class Backfill:
+    """Класс для параллельной перезагрузки истории всех holders"""
+
+    def __init__(self, workers: int = None, shard_size: int = None):
+        """
+        Инициализация backfill
+
+        Args:
+            workers: количество рабочих процессов (по умолчанию config.BACKFILL_WORKERS)
+            shard_size: количество holders в одном шарде (по умолчанию config.BACKFILL_SHARD_SIZE)
+        """
+        self.workers = workers or config.BACKFILL_WORKERS
+        self.shard_size = shard_size or config.BACKFILL_SHARD_SIZE
+
+        # Парсер основного процесса: перебор holders и запись в БД
+        self.parser = TonParser()
+        self.storage = self.parser.storage
+
+        self.stats = self.parser.new_stats()
+        self.stats["shards"] = 0
+        self.stats["failed_accounts"] = 0
+
+    def plan(self, restart: bool = False) -> bool:
+        """
+        Составляем план шардов или продолжаем незавершённый
+
+        Args:
+            restart: начать заново, даже если есть незавершённый план
+
+        Returns:
+            False, если список holders загружен не полностью (план не сохраняется:
+            продолжение по урезанному плану никогда не дошло бы до остальных holders)
+        """
+        done, total = self.storage.get_backfill_progress()
+
+        if total and done < total and not restart:
+            print(f"♻️ Продолжаем backfill: обработано {done} из {total} шардов")
+            return True
+
+        # Существующие транзакции заново не валидируются (см. описание модуля)
+        existing = self.storage.count_known_hashes()
+        if existing:
+            print(f"⚠ В базе уже {existing} транзакций: они останутся как есть, будет дочитана только "
+                  f"недостающая история. Для пересборки по новым правилам нужна пустая база")
+
+        accounts = list(self.parser.iter_ingestion_accounts())
+        if not self.parser.holders_complete:
+            print(f"❌ Список holders загружен не полностью ({len(accounts)} аккаунтов): "
+                  f"план backfill не сохранён, повторите запуск")
+            return False
+
+        shards = [
+            accounts[i:i + self.shard_size]
+            for i in range(0, len(accounts), self.shard_size)
+        ]
+
+        self.storage.create_backfill_plan(shards)
+        print(f"🗂 План backfill: {len(accounts)} аккаунтов, {len(shards)} шардов по {self.shard_size}")
+        return True
+
+    def resume_checkpoints(self, accounts: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Курсоры продолжения аккаунтов, полная история которых не дочитана
+        (упёрлась в MAX_PAGES_PER_ACCOUNT): их чтение продолжается, а не
+        начинается заново
+
+        Args:
+            accounts: адреса аккаунтов шарда
+
+        Returns:
+            Словарь {адрес: чекпоинт с курсором продолжения}
+        """
+        resumed = {}
+        for address in accounts:
+            checkpoint = self.storage.get_checkpoint(address)
+            if checkpoint and checkpoint.get("resume_before_lt") and checkpoint["last_lt"] == FULL_HISTORY["last_lt"]:
+                resumed[address] = checkpoint
+        return resumed
+
+    def write_shard(self, result: Dict[str, Any]):
+        """
+        Записываем результаты шарда (только в основном процессе)
+
+        Args:
+            result: результат process_shard
+        """
+        stats = self.parser.new_stats()
+        for key in ("total", "parsed", "valid", "invalid", "skipped"):
+            stats[key] = result["stats"][key]
+
+        self.parser.write_records(result["records"], stats)
+        self.storage.save_checkpoints(result["checkpoints"])
+
+        for key, value in stats.items():
+            self.stats[key] += value
+
+        # Аккаунты с ошибкой загрузки уходят в очередь повторов (с чтением
+        # всей истории), а не заставляют перечитывать весь шард
+        self.storage.record_fetch_failures(
+            result["failed"], config.RETRY_BASE_DELAY, config.RETRY_MAX_DELAY, full_history=True
+        )
+        self.storage.clear_fetch_retries(result["loaded"])
+
+        shard_id = result["shard_id"]
+        self.storage.finish_shard(shard_id, stats["total"])
+        self.stats["shards"] += 1
+        self.stats["failed_accounts"] += len(result["failed"])
+
+        # Историю, не уместившуюся в MAX_PAGES_PER_ACCOUNT страниц, дочитают
+        # следующие запуски (парсер или backfill) от курсора продолжения
+        unfinished = sum(1 for checkpoint in result["checkpoints"].values() if checkpoint.get("resume_before_lt"))
+
+        print(f"   💾 Шард #{shard_id}: {stats['total']} трансферов, сохранено {stats['saved']}"
+              + (f", в очередь повторов {len(result['failed'])}" if result["failed"] else "")
+              + (f", недочитано аккаунтов {unfinished}" if unfinished else ""))
+
+    def run(self, restart: bool = False) -> Dict[str, int]:
+        """
+        Запускаем backfill
+
+        Args:
+            restart: начать заново, даже если есть незавершённый план
+
+        Returns:
+            Суммарная статистика
+        """
+        if not self.plan(restart):
+            return self.stats
+
+        pending = iter(self.storage.get_pending_shards())
+
+        # Квота API общая для ключа - делим её между процессами
+        worker_rps = config.API_RPS / self.workers
+        max_in_flight = self.workers * 2
+        in_flight = {}
+
+        print(f"\n🚀 Backfill: процессов {self.workers}, лимит {config.API_RPS} RPS на всех")
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(worker_rps,)) as pool:
+            while True:
+                # Держим в работе не больше max_in_flight шардов: результаты
+                # ждут писателя в памяти основного процесса
+                for shard_id, accounts in pending:
+                    future = pool.submit(process_shard, shard_id, accounts, self.resume_checkpoints(accounts))
+                    in_flight[future] = shard_id
+                    if len(in_flight) >= max_in_flight:
+                        break
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    shard_id = in_flight.pop(future)
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"   ⚠ Шард #{shard_id} не обработан: {e}")
+                        continue
+
+                    self.write_shard(result)
+
+        return self.stats
+
+    def close(self):
+        """Закрываем соединения"""
+        self.parser.close()
+
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Параллельная перезагрузка базы repOWR")
+    arg_parser.add_argument("--workers", type=int, default=config.BACKFILL_WORKERS, help="рабочих процессов")
+    arg_parser.add_argument("--shard-size", type=int, default=config.BACKFILL_SHARD_SIZE, help="holders в одном шарде")
+    arg_parser.add_argument("--restart", action="store_true", help="начать заново, не продолжая прошлый план")
+    args = arg_parser.parse_args()
+
+    backfill = Backfill(args.workers, args.shard_size)
+    started = time.time()
+
+    try:
+        stats = backfill.run(restart=args.restart)
+
+        done, total = backfill.storage.get_backfill_progress()
+
+        print("\n" + "=" * 60)
+        print("📊 СТАТИСТИКА BACKFILL")
+        print("=" * 60)
+        print(f"Шардов обработано:     {done} из {total}")
+        print(f"Всего получено:        {stats['total']}")
+        print(f"Валидных сообщений:    {stats['valid']}")
+        print(f"Сохранено в БД:        {stats['saved']}")
+        print(f"Дубликатов (пропущено): {stats['duplicates']}")
+        print(f"В очередь повторов:    {stats['failed_accounts']} (python ton_parser.py --retry)")
+        print(f"Время:                 {time.time() - started:.1f} с")
+        print("=" * 60)
+    except KeyboardInterrupt:
+        print("\n\n⚠ Backfill прерван, при следующем запуске он продолжится с необработанных шардов")
+    finally:
+        backfill.close()
@@ -0,0 +1,520 @@
+"""
+Бенчмарк полной загрузки для парсера repOWR.
+Поднимает локальную замену Tonapi (tonapi_stub.py) с синтетической
+цепочкой или записанными ответами, прогоняет TonParser.ingest() на
+пустой временной базе и выводит трансферы/сек, запросы к API и записи в БД.
+
+С флагом --decode вместо этого замеряет только разбор ответов /events
+(микробенчмарк CPU на одно событие: прежний разбор словарей и EventDecoder).
+
+С флагом --schema замеряет проверку полей JSON-сообщений: прежние
+ручные цепочки if и функции, скомпилированные из схем валидатора.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, Any, List
+
+# Импортируем наши модули
+import config
+from address import try_raw_address
+from events import EventDecoder
+from tonapi_client import json_loads
+from tonapi_stub import TonApiStub, SyntheticChain, ReplayStore, parse_memo_mix
+import validator as v
+
+
+def run_ingestion_benchmark(stub: TonApiStub, rps: float, concurrency: int, strategy: str,
+                            verbose: bool = False) -> Dict[str, Any]:
+    """
+    Прогоняем полную загрузку против локального сервера
+
+    Args:
+        stub: запущенный TonApiStub
+        rps: квота запросов в секунду для парсера
+        concurrency: количество потоков загрузки
+        strategy: стратегия загрузки (config.INGESTION_STRATEGY)
+        verbose: показывать ли вывод самого парсера
+
+    Returns:
+        Словарь с результатами замера
+    """
+    # TonParser читает настройки из config при создании
+    from ton_parser import TonParser
+
+    workdir = tempfile.mkdtemp(prefix="repowr_bench_")
+
+    config.DATABASE_PATH = os.path.join(workdir, "bench.db")
+    config.TON_API_ENDPOINT = stub.url
+    config.TON_API_KEY = ""
+    config.API_RPS = rps
+    config.FETCH_CONCURRENCY = concurrency
+    config.INGESTION_STRATEGY = strategy
+    config.API_RECORD_DIR = ""
+
+    parser = TonParser()
+    output = None if verbose else io.StringIO()
+
+    try:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+            stats = parser.ingest()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "elapsed": elapsed,
+            "stats": stats,
+            "client": dict(parser.client.stats),
+            "server": dict(stub.stats),
+            "db": dict(parser.storage.stats),
+            "validator_cache": parser.validator.cache_info(),
+        }
+    finally:
+        parser.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(result: Dict[str, Any]):
+    """Выводим результаты замера"""
+    stats = result["stats"]
+    elapsed = result["elapsed"]
+    total = stats.get("total", 0)
+
+    print("\n" + "=" * 60)
+    print("⏱ БЕНЧМАРК ЗАГРУЗКИ")
+    print("=" * 60)
+    print(f"Время:                 {elapsed:.2f} с")
+    print(f"Трансферов обработано: {total} ({total / elapsed if elapsed else 0:.1f}/с)")
+    print(f"Сохранено в БД:        {stats.get('saved', 0)} (дубликатов {stats.get('duplicates', 0)})")
+    print(f"Не по протоколу:       {stats.get('skipped', 0)} (в архиве {stats.get('archived', 0)})")
+    print(f"Запросов к API:        {result['client']['requests']} "
+          f"(повторов {result['client']['retries']}, 304: {result['client']['not_modified']})")
+    print(f"Ответов 429 от сервера: {result['server']['throttled']}")
+    print(f"Получено байт:         {result['server']['bytes']}")
+    print(f"Записей в БД:          {result['db']['rows']} строк, {result['db']['batches']} SQL-транзакций")
+    print(f"Кэш валидатора:        {result['validator_cache']['hits']} попаданий, "
+          f"{result['validator_cache']['misses']} промахов")
+    print("=" * 60)
+
+
+def build_events_page(events: int, spw_share: float, seed: int = 1) -> bytes:
+    """
+    Собираем ответ /accounts/{addr}/events, похожий на ответ большого
+    аккаунта: много чужих действий (TON, другие Jetton'ы, обмены, NFT)
+    с полными объектами аккаунтов, превью и базовыми транзакциями
+
+    Args:
+        events: количество событий в ответе
+        spw_share: доля событий с трансфером нашего токена
+        seed: зерно генератора случайных чисел
+
+    Returns:
+        Тело ответа (JSON в байтах)
+    """
+    rnd = random.Random(seed)
+    master = try_raw_address(config.JETTON_MASTER_ADDRESS)
+
+    def account():
+        return {
+            "address": f"0:{rnd.getrandbits(256):064x}",
+            "name": rnd.choice(["", "wallet.ton", "Ston.fi Router"]),
+            "is_scam": False,
+            "icon": "https://cache.tonapi.io/imgproxy/icon.png",
+            "is_wallet": True,
+        }
+
+    def jetton(address):
+        return {
+            "address": address,
+            "name": "Jetton",
+            "symbol": "JTN",
+            "decimals": 9,
+            "image": "https://cache.tonapi.io/imgproxy/jetton.png",
+            "verification": "whitelist",
+        }
+
+    def action(kind, payload):
+        return {
+            "type": kind,
+            "status": "ok",
+            kind: payload,
+            "simple_preview": {
+                "name": kind,
+                "description": "Transferring 1 JTN",
+                "value": "1 JTN",
+                "accounts": [account(), account()],
+            },
+            "base_transactions": [f"{rnd.getrandbits(256):064x}" for _ in range(2)],
+        }
+
+    page = []
+    lt = 50_000_000_000
+
+    for i in range(events):
+        lt -= rnd.randint(1, 1000)
+        actions = []
+
+        if rnd.random() < spw_share:
+            payload = {
+                "sender": account(),
+                "recipient": account(),
+                "senders_wallet": f"0:{rnd.getrandbits(256):064x}",
+                "recipients_wallet": f"0:{rnd.getrandbits(256):064x}",
+                "amount": str(rnd.randint(1, 100) * 10 ** 9),
+                "jetton": jetton(master),
+            }
+            if rnd.random() < 0.7:
+                payload["comment"] = f"repOWR:{rnd.randint(1, 5)}:Отзыв {i}:"
+            actions.append(action("JettonTransfer", payload))
+
+        for _ in range(rnd.randint(1, 4)):
+            kind = rnd.choice(["TonTransfer", "JettonTransfer", "JettonSwap", "NftItemTransfer", "SmartContractExec"])
+            if kind == "JettonTransfer":
+                payload = {
+                    "sender": account(),
+                    "recipient": account(),
+                    "amount": "1000000000",
+                    "comment": "Deposit",
+                    "jetton": jetton(f"0:{rnd.getrandbits(256):064x}"),
+                }
+            else:
+                payload = {"sender": account(), "recipient": account(), "amount": rnd.randint(1, 10 ** 9)}
+            actions.append(action(kind, payload))
+
+        page.append({
+            "event_id": f"{rnd.getrandbits(256):064x}",
+            "account": account(),
+            "timestamp": 1700000000 + i,
+            "actions": actions,
+            "value_flow": [{"account": account(), "ton": -1000000, "fees": 1000000}],
+            "is_scam": False,
+            "lt": lt,
+            "in_progress": False,
+            "extra": -1000000,
+        })
+
+    return json.dumps({"events": page, "next_from": lt}, ensure_ascii=False).encode("utf-8")
+
+
+def legacy_decode(body: bytes, jetton_master: str) -> List[Dict[str, Any]]:
+    """
+    Разбор ответа так, как он делался до EventDecoder (для сравнения):
+    json -> _extract_jetton_transfers (обход всех действий с изменением
+    словарей, нормализация адреса мастера на каждом действии) ->
+    parse_transaction по словарю. Адреса, как и прежде, нормализуются
+    через кэшированный try_raw_address
+
+    Args:
+        body: тело ответа /events
+        jetton_master: адрес Jetton мастера
+
+    Returns:
+        Список распарсенных трансферов с комментарием
+    """
+    result = []
+    for event in json.loads(body).get("events", []):
+        # _extract_jetton_transfers
+        transfers = []
+        for action in event.get("actions", []):
+            if action.get("type") != "JettonTransfer":
+                continue
+
+            transfer = action.get("JettonTransfer", {})
+            jetton_address = transfer.get("jetton", {}).get("address", "")
+            if try_raw_address(jetton_address) == try_raw_address(jetton_master):
+                transfer["timestamp"] = event.get("timestamp", 0)
+                transfer["event_id"] = event.get("event_id", "")
+                if not transfer.get("transaction_hash"):
+                    transfer["transaction_hash"] = event.get("event_id", "")
+                transfers.append(transfer)
+
+        # parse_transaction
+        for transfer in transfers:
+            timestamp = transfer.get("timestamp", 0)
+            sender_obj = transfer.get("sender", {})
+            recipient_obj = transfer.get("recipient", {})
+            sender = sender_obj.get("address", "") if isinstance(sender_obj, dict) else ""
+            receiver = recipient_obj.get("address", "") if isinstance(recipient_obj, dict) else ""
+            sender = try_raw_address(sender)
+            receiver = try_raw_address(receiver)
+
+            amount_str = transfer.get("amount", "0")
+            decimals = transfer.get("jetton", {}).get("decimals", 9)
+            amount = float(amount_str) / (10 ** decimals) if amount_str else 0
+
+            comment = transfer.get("comment", "")
+            tx_hash = transfer.get("transaction_hash") or transfer.get("event_id", "")
+            if not comment:
+                continue
+
+            result.append({
+                "tx_hash": tx_hash if tx_hash else f"transfer_{timestamp}_{sender[:8]}",
+                "sender": sender,
+                "receiver": receiver,
+                "amount": amount,
+                "timestamp": timestamp,
+                "memo": comment,
+            })
+
+    return result
+
+
+def run_decode_benchmark(events: int = 1000, spw_share: float = 0.05, repeat: int = 20) -> Dict[str, Any]:
+    """
+    Микробенчмарк разбора ответа /events
+
+    Args:
+        events: событий в одном ответе
+        spw_share: доля событий с трансфером нашего токена
+        repeat: сколько раз разбирать ответ (берётся лучшее время)
+
+    Returns:
+        Словарь {variant: мкс на событие} и число найденных трансферов
+    """
+    from ton_parser import TonParser
+
+    body = build_events_page(events, spw_share)
+    decoder = EventDecoder(config.JETTON_MASTER_ADDRESS)
+
+    # parse_transaction не обращается к БД и HTTP - достаточно «пустого» объекта
+    parser = TonParser.__new__(TonParser)
+
+    def decode(loads):
+        result = []
+        for event in loads(body).get("events", []):
+            for transfer in decoder.decode_event(event):
+                parsed = parser.parse_transaction(transfer)
+                if parsed:
+                    result.append(parsed)
+        return result
+
+    variants = {
+        "legacy (json + dict walk)": lambda: legacy_decode(body, config.JETTON_MASTER_ADDRESS),
+        "EventDecoder + json": lambda: decode(json.loads),
+        "EventDecoder + client loads": lambda: decode(json_loads),
+    }
+
+    timings = {}
+    found = {}
+    for name, func in variants.items():
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            found[name] = len(func())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best / events * 1e6
+
+    return {"events": events, "bytes": len(body), "timings": timings, "found": found}
+
+
+def print_decode_report(result: Dict[str, Any]):
+    """Выводим результаты микробенчмарка разбора"""
+    print("\n" + "=" * 60)
+    print(f"⏱ РАЗБОР /events: {result['events']} событий, {result['bytes']} байт")
+    print(f"   json_loads клиента: {json_loads.__module__}")
+    print("=" * 60)
+    baseline = next(iter(result["timings"].values()))
+    for name, micros in result["timings"].items():
+        print(f"{name:30} {micros:8.2f} мкс/событие  x{baseline / micros:.1f}  "
+              f"(трансферов: {result['found'][name]})")
+    print("=" * 60)
+
+
+def build_json_messages(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """
+    Синтетические JSON-сообщения (уже разобранные): полные и минимальные
+    оценки, профили и типичные ошибки в полях
+
+    Args:
+        count: количество сообщений
+        seed: зерно генератора случайных чисел
+
+    Returns:
+        Список словарей сообщений
+    """
+    rnd = random.Random(seed)
+    templates = [
+        {"protocol": "repOWR", "rating": 5},
+        {"protocol": "repOWR", "rating": 4, "type": "deal", "comment": "Отличная сделка, всё быстро",
+         "link": "https://t.me/omr_market/1234", "ref": "0:" + "ab" * 32},
+        {"protocol": "repOWR", "type": "identity", "nickname": "AtlasDev", "bio": "Разработчик инфраструктуры ОМР",
+         "skills": ["python", "ton", "design"], "languages": ["ru", "en"], "birth_year": 1995,
+         "links": {"telegram": "@atlasdev"}},
+        {"protocol": "repOWR", "rating": 7, "comment": "слишком высокая оценка"},
+        {"protocol": "repOWR", "rating": 3, "type": "trade"},
+        {"protocol": "repOWR", "type": "identity", "nickname": "x", "bio": "y", "skills": ["a", 1]},
+    ]
+    return [dict(rnd.choice(templates)) for _ in range(count)]
+
+
+def legacy_check_fields(data: Dict[str, Any]) -> tuple:
+    """Прежняя ручная проверка полей JSON-сообщения (до схем), для сравнения"""
+    V = v.RepOWRValidator
+    if "protocol" not in data:
+        return v.E_NO_PROTOCOL, None, ()
+    if data["protocol"] != V.PROTOCOL_NAME:
+        return v.E_BAD_PROTOCOL, None, (data["protocol"],)
+
+    message_type = data.get("type")
+
+    if message_type == "identity":
+        if "nickname" not in data:
+            return v.E_NO_NICKNAME, None, ()
+        if "bio" not in data:
+            return v.E_NO_BIO, None, ()
+        if not isinstance(data["nickname"], str):
+            return v.E_NICKNAME_TYPE, None, ()
+        if not isinstance(data["bio"], str):
+            return v.E_BIO_TYPE, None, ()
+        if len(data["bio"]) > 200:
+            return v.E_BIO_TOO_LONG, None, (len(data["bio"]), 200)
+        if "skills" in data:
+            if not isinstance(data["skills"], list):
+                return v.E_SKILLS_TYPE, None, ()
+            for skill in data["skills"]:
+                if not isinstance(skill, str):
+                    return v.E_SKILL_ITEM_TYPE, None, ()
+        if "languages" in data:
+            if not isinstance(data["languages"], list):
+                return v.E_LANGUAGES_TYPE, None, ()
+            for lang in data["languages"]:
+                if not isinstance(lang, str):
+                    return v.E_LANGUAGE_ITEM_TYPE, None, ()
+        if "birth_year" in data:
+            if not isinstance(data["birth_year"], int):
+                return v.E_BIRTH_YEAR_TYPE, None, ()
+            if data["birth_year"] < 1900 or data["birth_year"] > 2020:
+                return v.E_BIRTH_YEAR_RANGE, None, (1900, 2020, data["birth_year"])
+        if "links" in data:
+            if not isinstance(data["links"], dict):
+                return v.E_LINKS_TYPE, None, ()
+        data["format"] = "json"
+        return v.OK, data, ()
+
+    if "rating" not in data:
+        return v.E_JSON_NO_RATING, None, ()
+    if not isinstance(data["rating"], int):
+        return v.E_JSON_RATING_TYPE, None, (type(data["rating"]),)
+    if not (V.MIN_RATING <= data["rating"] <= V.MAX_RATING):
+        return v.E_JSON_RATING_RANGE, None, (V.MIN_RATING, V.MAX_RATING, data["rating"])
+    if message_type and message_type not in V.ALLOWED_TYPES:
+        return v.E_BAD_TYPE, None, (message_type, ", ".join(V.ALLOWED_TYPES))
+    if "comment" in data:
+        if not isinstance(data["comment"], str):
+            return v.E_COMMENT_TYPE, None, ()
+        if len(data["comment"]) > V.MAX_COMMENT_LENGTH:
+            return v.E_JSON_COMMENT_TOO_LONG, None, (len(data["comment"]), V.MAX_COMMENT_LENGTH)
+    if "link" in data:
+        if not isinstance(data["link"], str):
+            return v.E_LINK_TYPE, None, ()
+        if not v.URL_RE.match(data["link"]):
+            return v.E_BAD_URL, None, (data["link"],)
+    if "ref" in data:
+        if not isinstance(data["ref"], str):
+            return v.E_REF_TYPE, None, ()
+    data["format"] = "json"
+    return v.OK, data, ()
+
+
+def run_schema_benchmark(count: int = 100000, repeat: int = 20) -> Dict[str, Any]:
+    """
+    Микробенчмарк проверки полей JSON-сообщений (без разбора JSON)
+
+    Args:
+        count: количество сообщений
+        repeat: сколько раз прогонять (берётся лучшее время)
+
+    Returns:
+        Словарь {variant: мкс на сообщение} и число валидных сообщений
+    """
+    messages = build_json_messages(count)
+
+    variants = {
+        "legacy (if chains)": legacy_check_fields,
+        f"compiled schemas v{v.SCHEMAS.latest}": v.SCHEMAS.get(),
+    }
+
+    best = {}
+    found = {}
+    # Варианты чередуются в каждом повторе, чтобы фоновая нагрузка влияла на них одинаково
+    for _ in range(repeat):
+        for name, func in variants.items():
+            started = time.perf_counter()
+            found[name] = sum(1 for data in messages if func(data)[0] == v.OK)
+            elapsed = time.perf_counter() - started
+            best[name] = min(best.get(name, elapsed), elapsed)
+
+    timings = {name: elapsed / count * 1e6 for name, elapsed in best.items()}
+    return {"messages": count, "timings": timings, "found": found}
+
+
+def print_schema_report(result: Dict[str, Any]):
+    """Выводим результаты микробенчмарка схем"""
+    print("\n" + "=" * 60)
+    print(f"⏱ ПРОВЕРКА ПОЛЕЙ JSON: {result['messages']} сообщений")
+    print("=" * 60)
+    baseline = next(iter(result["timings"].values()))
+    for name, micros in result["timings"].items():
+        print(f"{name:30} {micros:8.3f} мкс/сообщение  x{baseline / micros:.2f}  "
+              f"(валидных: {result['found'][name]})")
+    print("=" * 60)
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк загрузки парсера repOWR")
+    arg_parser.add_argument("--replay", help="каталог с записанными ответами (API_RECORD_DIR)")
+    arg_parser.add_argument("--holders", type=int, default=200, help="количество holders")
+    arg_parser.add_argument("--events", type=int, default=20, help="трансферов на одного holder'а")
+    arg_parser.add_argument("--memo-mix", help="доли форматов, например simple=0.3,json=0.2,other=0.5")
+    arg_parser.add_argument("--duplicate-ratio", type=float, default=0.5, help="доля трансферов, видимых обеим сторонам")
+    arg_parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа сервера, сек")
+    arg_parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    arg_parser.add_argument("--rps", type=float, default=1000, help="квота запросов в секунду")
+    arg_parser.add_argument("--concurrency", type=int, default=config.FETCH_CONCURRENCY, help="потоков загрузки")
+    arg_parser.add_argument("--strategy", default=config.INGESTION_STRATEGY,
+                            choices=["events", "jetton_history", "collector"], help="стратегия загрузки")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--verbose", action="store_true", help="показывать вывод парсера")
+    arg_parser.add_argument("--decode", action="store_true", help="микробенчмарк разбора ответа /events")
+    arg_parser.add_argument("--decode-events", type=int, default=1000, help="событий в ответе (для --decode)")
+    arg_parser.add_argument("--spw-share", type=float, default=0.05, help="доля событий с SPW (для --decode)")
+    arg_parser.add_argument("--schema", action="store_true", help="микробенчмарк проверки полей JSON-сообщений")
+    arg_parser.add_argument("--messages", type=int, default=100000, help="сообщений (для --schema)")
+    args = arg_parser.parse_args()
+
+    if args.schema:
+        print_schema_report(run_schema_benchmark(args.messages))
+        raise SystemExit
+
+    if args.decode:
+        print_decode_report(run_decode_benchmark(args.decode_events, args.spw_share))
+        raise SystemExit
+
+    if args.replay:
+        stub = TonApiStub(replay=ReplayStore(args.replay), latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=args.seed)
+    else:
+        chain = SyntheticChain(
+            config.JETTON_MASTER_ADDRESS, args.holders, args.events,
+            parse_memo_mix(args.memo_mix) if args.memo_mix else None,
+            args.duplicate_ratio, args.seed
+        )
+        stub = TonApiStub(chain=chain, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, seed=args.seed)
+        print(f"🧪 Синтетическая цепочка: {args.holders} holders, {chain.transfers} трансферов")
+
+    stub.start()
+
+    try:
+        print_report(run_ingestion_benchmark(stub, args.rps, args.concurrency, args.strategy, args.verbose))
+    finally:
+        stub.stop()
@@ -6,19 +6,79 @@
 # ===== TON API =====
 TON_API_ENDPOINT = "https://tonapi.io/v2"
 TON_API_KEY = ""  # Ваш API ключ от tonapi.io
+API_RPS = 1  # Квота запросов в секунду для вашего ключа (без ключа - 1 RPS)
 
 # ===== Jetton =====
 JETTON_MASTER_ADDRESS = "EQABi71g1y3BFnxA_qcY-giSbtRx9gArA9xXpfeZyTqP_Jwh"
 
+# Адрес repOWR, на который отправляются identity-сообщения (профили)
+COLLECTOR_ADDRESS = "UQCywBj5RIyKYf1SeLMkmt9gL13pMzCaqORZZ3iFeJyoRaqO"
+
 # ===== Database =====
 DATABASE_PATH = "reputation.db"
 
 # ===== Parser =====
 TRANSACTIONS_LIMIT = 100
+MAX_PAGES_PER_ACCOUNT = 50  # Сколько страниц событий листать назад до чекпоинта
+FETCH_CONCURRENCY = 4  # Сколько аккаунтов загружать параллельно
+HOLDERS_PAGE_SIZE = 1000  # Размер страницы при переборе holders (максимум API - 1000)
+# Стратегия загрузки:
+#   "events"         - полная лента событий каждого holder'а (как раньше)
+#   "jetton_history" - только история SPW каждого holder'а: без событий чужих токенов,
+#                      но по-прежнему запрос на каждого holder'а, и трансфер между
+#                      двумя holders скачивается дважды (из истории каждой стороны)
+#   "collector"      - только identity-сообщения на COLLECTOR_ADDRESS
+INGESTION_STRATEGY = "events"
+BATCH_SIZE = 500  # Сколько трансферов обрабатывать и записывать за один пакет
+DB_BATCH_SIZE = 500  # Сколько записей сохранять в БД одной SQL-транзакцией
+# Что делать с комментариями, не похожими на сообщения repOWR ("спасибо", "за обмен"):
+#   "drop"    - не сохранять
+#   "archive" - сохранять в сжатую таблицу memo_archive, а не в transactions
+#   "keep"    - сохранять в transactions с is_valid = 0 (как раньше)
+MEMO_POLICY = "archive"
+# Известные tx_hash загружаются при старте, и уже сохранённые трансферы не валидируются повторно.
+# До этого количества хранится точное множество, больше - фильтр Блума (с проверкой по БД)
+KNOWN_HASHES_SET_LIMIT = 1000000
+KNOWN_HASHES_BLOOM_ERROR = 0.001  # Доля ложноположительных ответов фильтра Блума
+# Сколько результатов проверки одинаковых сообщений ("repOWR:5:", шаблонный JSON)
+# хранить в LRU-кэше валидатора (0 - без кэша). Ключ - текст сообщения
+VALIDATION_CACHE_SIZE = 100000
 API_TIMEOUT = 30
+API_MAX_RETRIES = 3  # Повторы запроса при 429/5xx (с экспоненциальной задержкой)
+API_MAX_RETRY_AFTER = 60  # Верхняя граница ожидания по заголовку Retry-After (сек)
+API_RECORD_DIR = ""  # Каталог для записи ответов API (для tonapi_stub.py --replay), пусто - выкл.
 DEBUG_MODE = False
 
+# ===== Retry queue (ton_parser.py --retry) =====
+RETRY_BASE_DELAY = 60  # Задержка перед первым повтором неудачной загрузки аккаунта (сек)
+RETRY_MAX_DELAY = 3600  # Максимальная задержка между повторами (удваивается с каждой попыткой)
+RETRY_MAX_ATTEMPTS = 8  # После стольких неудачных попыток аккаунт больше не повторяется
+RETRY_BATCH_SIZE = 100  # Сколько аккаунтов повторять за один проход
+
+# ===== Backfill (backfill.py) =====
+BACKFILL_WORKERS = 4  # Рабочих процессов загрузки и валидации (квота API_RPS делится между ними)
+BACKFILL_SHARD_SIZE = 50  # Holders в одном шарде (единица прогресса при продолжении)
+
+# ===== Watch mode (watcher.py) =====
+WATCH_STREAM_PATH = "/sse/accounts/transactions"  # Поток транзакций (SSE)
+# Аккаунты для подписки: ALL или адреса через запятую (список передаётся в URL,
+# поэтому годится только для нескольких десятков адресов). С ALL приходит весь
+# JettonNotify сети, но уведомления об аккаунтах, которых нет среди holders,
+# отбрасываются без запросов к API
+WATCH_ACCOUNTS = "ALL"
+WATCH_OPERATIONS = "JettonNotify"  # Фильтр операций потока (пусто - без фильтра)
+WATCH_STREAM_TIMEOUT = 60  # Сколько секунд тишины в потоке считать обрывом
+WATCH_RECONNECT_INTERVAL = 30  # Как часто пробовать переподключиться к потоку (сек)
+WATCH_POLL_MIN = 10  # Интервал опроса активного аккаунта (сек)
+WATCH_POLL_MAX = 3600  # Максимальный интервал опроса «спящего» аккаунта (сек)
+WATCH_POLL_BATCH = 20  # Сколько аккаунтов опрашивать за один проход
+WATCH_DISCOVERY_INTERVAL = 3600  # Как часто перечитывать список holders (сек)
+WATCH_API_CACHE_BYTES = 32 * 1024 * 1024  # Кэш ответов с ETag для 304 (байт тел ответов, 0 - выкл.)
+
 # ===== Reputation =====
 TOP_USERS_COUNT = 10
 OUTPUT_FORMAT = "both"  # "console", "json", "both"
 OUTPUT_JSON_PATH = "reputation_report.json"
+# Сколько профилей (и отметок «профиля нет») хранить в LRU-кэше счётчика репутации.
+# Адрес выбывает из кэша, как только в базе появляется его новый профиль (0 - без кэша)
+PROFILE_CACHE_SIZE = 10000
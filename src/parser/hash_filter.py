@@ -0,0 +1,115 @@
+"""
+Фильтр уже сохранённых транзакций (по tx_hash).
+Загружается из БД при старте парсера и проверяется сразу после
+декодирования событий: известные трансферы не валидируются и не
+доходят до записи в БД.
+
+Пока хэшей немного, хранится точное множество. Для больших баз - фильтр
+Блума: он отвечает «точно нет» или «возможно да», поэтому ответы «возможно
+да» вызывающий код подтверждает одним пакетным запросом к БД.
+
+Отброшенные сообщения (MEMO_POLICY = "drop") в БД не попадают, поэтому
+их хэши хранятся отдельным точным множеством: подтвердить их по БД нельзя.
+"""
+
+import hashlib
+import math
+from typing import Iterable, Optional
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray с двойным хэшированием"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Инициализация фильтра
+
+        Args:
+            capacity: ожидаемое количество элементов
+            error_rate: допустимая доля ложноположительных ответов
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        """Позиции битов элемента: h1 + i * h2 (Kirsch-Mitzenmacher)"""
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        """Добавляем элемент"""
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        """Возможно ли, что элемент добавлен (False - точно нет)"""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class KnownHashes:
+    """Множество известных tx_hash: точное или фильтр Блума"""
+
+    def __init__(self, count: int, set_limit: int, error_rate: float = 0.001):
+        """
+        Инициализация фильтра
+
+        Args:
+            count: сколько хэшей будет загружено (для выбора режима и размера)
+            set_limit: до какого количества хэшей хранить точное множество
+            error_rate: доля ложноположительных ответов фильтра Блума
+        """
+        self.exact = count <= set_limit
+
+        if self.exact:
+            self.items = set()
+        else:
+            # Запас под рост базы, пока процесс работает
+            self.items = BloomFilter(count * 2, error_rate)
+
+        # Хэши отброшенных в этом процессе сообщений (только в памяти)
+        self.dropped = set()
+        self.dropped_limit = set_limit
+
+        self.count = 0
+
+    def add(self, tx_hash: str):
+        """Добавляем хэш сохранённой транзакции"""
+        self.items.add(tx_hash)
+        self.count += 1
+
+    def update(self, tx_hashes: Iterable[str]):
+        """Добавляем несколько хэшей"""
+        for tx_hash in tx_hashes:
+            self.add(tx_hash)
+
+    def add_dropped(self, tx_hash: str):
+        """
+        Добавляем хэш отброшенного сообщения. Множество ограничено set_limit:
+        при переполнении оно очищается, и повтор давно отброшенного сообщения
+        снова посчитается новым (и снова будет отброшен)
+        """
+        if len(self.dropped) >= self.dropped_limit:
+            self.dropped.clear()
+        self.dropped.add(tx_hash)
+
+    def check(self, tx_hash: str) -> Optional[bool]:
+        """
+        Проверяем хэш
+
+        Args:
+            tx_hash: хэш транзакции
+
+        Returns:
+            True - транзакция точно есть в БД, False - точно нет,
+            None - возможно есть (фильтр Блума), нужна проверка по БД
+        """
+        if tx_hash in self.dropped:
+            return True
+        if tx_hash not in self.items:
+            return False
+        return True if self.exact else None
@@ -0,0 +1,160 @@
+"""
+Таблица лидеров по репутации.
+Ключи пользователей хранятся в отсортированном списке, разбитом на блоки
+(как в sortedcontainers, но без зависимости): топ и страницы - срезы
+блоков, место пользователя - бинарный поиск, а изменение балла одного
+пользователя - удаление и вставка его ключа внутри одного блока, без
+сортировки всей таблицы и без сдвига миллиона элементов одного списка.
+
+Ключ - кортеж, по возрастанию которого идут места (лучший - первый),
+последний элемент ключа - адрес: он же разрешает ничьи и делает ключи
+уникальными.
+"""
+
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional, Tuple
+
+# Размер блока: блок делится пополам, когда вырастает вдвое
+BLOCK_SIZE = 1000
+
+
+class Leaderboard:
+    """Отсортированная таблица лидеров с обновлением отдельных пользователей"""
+
+    def __init__(self, keys: Iterable[Tuple] = ()):
+        """
+        Строим таблицу
+
+        Args:
+            keys: ключи пользователей (последний элемент ключа - адрес)
+        """
+        # Пакетная сборка: одна сортировка вместо вставки каждого ключа
+        ordered = sorted(keys)
+        self.key_of = {key[-1]: key for key in ordered}
+
+        # Блоки отсортированных ключей и последний ключ каждого блока
+        self.blocks: List[List[Tuple]] = [ordered[i:i + BLOCK_SIZE] for i in range(0, len(ordered), BLOCK_SIZE)]
+        self.maxes: List[Tuple] = [block[-1] for block in self.blocks]
+
+    def _locate(self, key: Tuple) -> Tuple[int, int]:
+        """Блок и позиция в блоке, куда попадает ключ"""
+        index = bisect_left(self.maxes, key)
+        if index == len(self.maxes):
+            index -= 1
+        return index, bisect_left(self.blocks[index], key)
+
+    def _insert(self, key: Tuple):
+        """Вставляем ключ"""
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+
+        index, _ = self._locate(key)
+        block = self.blocks[index]
+        insort(block, key)
+        self.maxes[index] = block[-1]
+
+        if len(block) > BLOCK_SIZE * 2:
+            self.blocks[index:index + 1] = [block[:BLOCK_SIZE], block[BLOCK_SIZE:]]
+            self.maxes[index:index + 1] = [block[BLOCK_SIZE - 1], block[-1]]
+
+    def _delete(self, key: Tuple):
+        """Удаляем ключ (он должен быть в таблице)"""
+        index, position = self._locate(key)
+        block = self.blocks[index]
+        del block[position]
+
+        if block:
+            self.maxes[index] = block[-1]
+        else:
+            del self.blocks[index]
+            del self.maxes[index]
+
+    def update(self, key: Tuple):
+        """
+        Добавляем пользователя или меняем его место
+
+        Args:
+            key: новый ключ пользователя (последний элемент - адрес)
+        """
+        address = key[-1]
+        old_key = self.key_of.get(address)
+
+        if old_key == key:
+            return
+
+        if old_key is not None:
+            self._delete(old_key)
+
+        self._insert(key)
+        self.key_of[address] = key
+
+    def remove(self, address: str):
+        """
+        Убираем пользователя из таблицы
+
+        Args:
+            address: адрес пользователя
+        """
+        old_key = self.key_of.pop(address, None)
+        if old_key is not None:
+            self._delete(old_key)
+
+    def rank(self, address: str) -> Optional[int]:
+        """
+        Место пользователя
+
+        Args:
+            address: адрес пользователя (как в reputation_data)
+
+        Returns:
+            Место начиная с 1 или None, если пользователя нет в таблице
+        """
+        key = self.key_of.get(address)
+        if key is None:
+            return None
+
+        index, position = self._locate(key)
+        return sum(len(block) for block in self.blocks[:index]) + position + 1
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[str]:
+        """
+        Страница таблицы
+
+        Args:
+            offset: сколько мест пропустить
+            limit: количество мест на странице
+
+        Returns:
+            Адреса пользователей по порядку мест
+        """
+        offset = max(0, offset)
+        result = []
+
+        for block in self.blocks:
+            if len(result) >= limit:
+                break
+            if offset >= len(block):
+                offset -= len(block)
+                continue
+            result.extend(key[-1] for key in block[offset:offset + limit - len(result)])
+            offset = 0
+
+        return result
+
+    def top(self, count: int = 10) -> List[str]:
+        """
+        Первые места таблицы
+
+        Args:
+            count: количество мест
+
+        Returns:
+            Адреса пользователей по порядку мест
+        """
+        return self.page(0, count)
+
+    def __len__(self) -> int:
+        """Количество пользователей в таблице"""
+        return len(self.key_of)
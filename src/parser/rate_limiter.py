@@ -0,0 +1,49 @@
+"""
+Ограничитель частоты запросов к API (token bucket).
+Один экземпляр разделяется всеми потоками парсера, чтобы суммарная
+частота запросов не превышала квоту API ключа.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Инициализация ограничителя
+
+        Args:
+            rate: сколько запросов в секунду разрешено (RPS квота ключа)
+            capacity: максимальный «запас» токенов для коротких всплесков
+                      (по умолчанию равен rate, но не меньше 1)
+        """
+        if rate <= 0:
+            raise ValueError("rate должен быть больше нуля")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        """Пополняем токены за прошедшее время (вызывается под блокировкой)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Берём один токен, при необходимости ждём его появления"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            # Спим вне блокировки, чтобы не держать остальные потоки
+            time.sleep(wait)
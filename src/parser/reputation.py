@@ -1,117 +1,295 @@
 """
 Счётчик репутации для протокола repOWR.
 Анализирует данные из базы и рассчитывает репутацию пользователей.
+Репутация строится по агрегатам, которые парсер обновляет вместе с
+рейтингами (Storage.write_batch), а не пересчитывается по всем рейтингам.
 """
 
+import argparse
 import json
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from collections import defaultdict
 
 # Импортируем наши модули
 from database import Database
+from storage import Storage
+from address import try_raw_address, hash_part
+from address_index import AddressIndex
+from leaderboard import Leaderboard
+from validator import RepOWRValidator
 import config
 
 
+class RatingStats:
+    """
+    Статистика оценок одного типа: количество, сумма и гистограмма по
+    значениям 1..5 (вместо списка всех оценок). Средняя, минимум, максимум
+    и распределение считаются из неё за O(1). Корзины гистограммы - слоты
+    объекта, а не отдельный список: так объект занимает 88 байт
+    """
+    
+    # Корзины гистограммы: r1 - количество оценок 1, ..., r5 - оценок 5
+    BUCKETS = ('r1', 'r2', 'r3', 'r4', 'r5')
+    
+    __slots__ = ('count', 'total') + BUCKETS
+    
+    # Допустимые оценки - те же, что пропускает валидатор
+    MIN_RATING = RepOWRValidator.MIN_RATING
+    MAX_RATING = RepOWRValidator.MAX_RATING
+    
+    def __init__(self):
+        """Пустая статистика"""
+        self.count = 0
+        self.total = 0
+        for bucket in self.BUCKETS:
+            setattr(self, bucket, 0)
+    
+    @classmethod
+    def from_counts(cls, counts: Dict[int, int]) -> 'RatingStats':
+        """
+        Статистика по счётчикам оценок
+        
+        Args:
+            counts: {оценка: количество} (как в Storage.get_reputation_aggregates)
+        
+        Returns:
+            Статистика
+        """
+        stats = cls()
+        for rating, count in counts.items():
+            stats.add(rating, count)
+        return stats
+    
+    def add(self, rating: int, count: int = 1):
+        """
+        Учитываем оценку
+        
+        Args:
+            rating: оценка
+            count: сколько раз она выставлена
+        """
+        self.count += count
+        self.total += rating * count
+        if self.MIN_RATING <= rating <= self.MAX_RATING:
+            bucket = self.BUCKETS[rating - self.MIN_RATING]
+            setattr(self, bucket, getattr(self, bucket) + count)
+    
+    @property
+    def histogram(self) -> List[int]:
+        """Количество оценок 1..5"""
+        return [getattr(self, bucket) for bucket in self.BUCKETS]
+    
+    @property
+    def average(self) -> float:
+        """Средняя оценка"""
+        return self.total / self.count if self.count else 0
+    
+    @property
+    def min(self) -> Optional[int]:
+        """Минимальная оценка"""
+        for index, count in enumerate(self.histogram):
+            if count:
+                return index + self.MIN_RATING
+        return None
+    
+    @property
+    def max(self) -> Optional[int]:
+        """Максимальная оценка"""
+        histogram = self.histogram
+        for index in range(len(histogram) - 1, -1, -1):
+            if histogram[index]:
+                return index + self.MIN_RATING
+        return None
+    
+    def distribution(self) -> Dict[int, int]:
+        """Распределение {оценка: количество}"""
+        return {index + self.MIN_RATING: count for index, count in enumerate(self.histogram)}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь для JSON отчёта"""
+        return {
+            'count': self.count,
+            'avg': round(self.average, 2),
+            'min': self.min,
+            'max': self.max,
+            'distribution': self.distribution(),
+        }
+
+
+def leaderboard_key(rep: Dict[str, Any]) -> tuple:
+    """
+    Ключ места в таблице лидеров: выше итоговый балл, при равенстве -
+    больше отзывов, затем по адресу
+
+    Args:
+        rep: данные репутации пользователя
+
+    Returns:
+        Кортеж, по возрастанию которого идут места
+    """
+    return -rep['final_score'], -rep['total_ratings'], rep['address']
+
+
 class ReputationCounter:
     """Класс для расчёта репутации пользователей"""
     
-    def __init__(self):
-        """Инициализация счётчика"""
-        self.db = Database(config.DATABASE_PATH)
-        self.db.connect()
+    def __init__(self, with_db: bool = True):
+        """
+        Инициализация счётчика
+        
+        Args:
+            with_db: подключаться ли к базе данных (бенчмарк загружает
+                     данные репутации сам, через load_reputation)
+        """
+        self.db = None
+        self.storage = None
         
         # Словарь для хранения репутации пользователей
         # Структура: {адрес: {данные репутации}}
         self.reputation_data = {}
+        
+        # Индекс адресов reputation_data для поиска (строится вместе с ней)
+        self.address_index = AddressIndex()
+        
+        # Таблица лидеров (строится вместе с reputation_data)
+        self.leaderboard = Leaderboard()
+        
+        # Номер последнего загруженного изменения агрегатов:
+        # refresh_reputation читает изменённые после него
+        self.loaded_version = None
+        
+        if not with_db:
+            return
+        
+        self.db = Database(config.DATABASE_PATH)
+        self.db.connect()
+        
+        # Агрегаты репутации (таблицы создаются и при необходимости собираются здесь)
+        # и профили пользователей (пачками, через кэш)
+        self.storage = Storage(config.DATABASE_PATH, config.PROFILE_CACHE_SIZE)
+        self.storage.connect()
+        self.storage.create_tables()
     
     def calculate_reputation(self):
         """
         Основной метод расчёта репутации.
-        Получает все рейтинги из БД и рассчитывает репутацию для каждого пользователя.
+        Загружает агрегаты из БД и рассчитывает репутацию для каждого пользователя.
         """
         print("=" * 60)
         print("🧮 Расчёт репутации пользователей (протокол repOWR)")
         print("=" * 60)
         
-        # Получаем все рейтинги из базы
-        print("\n📥 Загрузка данных из базы...")
-        all_ratings = self.db.get_all_ratings()
+        # Агрегаты по адресам, получившим оценки
+        # Репутация считается для того, кому ставят оценки
+        print("\n📥 Загрузка агрегатов из базы...")
+        aggregates = self.storage.get_reputation_aggregates()
+        self.loaded_version = max((aggregate["version"] for aggregate in aggregates.values()), default=0)
         
-        if not all_ratings:
+        if not aggregates:
             print("⚠ Рейтинги не найдены в базе данных")
             return
         
-        print(f"✓ Загружено {len(all_ratings)} рейтингов")
-        
-        # Группируем рейтинги по получателям (receiver)
-        # Репутация считается для того, кому ставят оценки
-        user_ratings = defaultdict(list)
-        user_given_ratings = defaultdict(int)  # Счётчик выставленных оценок
-        
-        for rating in all_ratings:
-            # Добавляем рейтинг в список получателя
-            user_ratings[rating['receiver']].append(rating)
-            
-            # Считаем сколько оценок выставил отправитель
-            user_given_ratings[rating['sender']] += 1
-        
-        print(f"✓ Обработано пользователей: {len(user_ratings)}")
+        print(f"✓ Загружено агрегатов: {len(aggregates)}")
         
         # Рассчитываем репутацию для каждого пользователя
         print("\n⚙️ Расчёт репутации...")
         
-        for address, ratings in user_ratings.items():
-            rep_data = self._calculate_user_reputation(address, ratings)
-            
-            # Добавляем количество выставленных оценок
-            rep_data['ratings_given'] = user_given_ratings.get(address, 0)
-            
-            self.reputation_data[address] = rep_data
+        self.load_reputation({
+            address: self._calculate_user_reputation(address, aggregate)
+            for address, aggregate in aggregates.items()
+        })
         
         print(f"✓ Рассчитано репутаций: {len(self.reputation_data)}")
     
-    def _calculate_user_reputation(self, address: str, ratings: List[Dict]) -> Dict[str, Any]:
+    def load_reputation(self, reputation_data: Dict[str, Dict[str, Any]]):
+        """
+        Подставляем рассчитанную репутацию и перестраиваем индексы поиска
+        
+        Args:
+            reputation_data: {адрес: данные репутации}
+        """
+        self.reputation_data = reputation_data
+        self.address_index = AddressIndex(reputation_data)
+        self.leaderboard = Leaderboard(leaderboard_key(rep) for rep in reputation_data.values())
+    
+    def update_user_reputation(self, rep: Dict[str, Any]):
+        """
+        Обновляем репутацию одного пользователя (индексы и место в таблице лидеров)
+        
+        Args:
+            rep: данные репутации (результат _calculate_user_reputation)
+        """
+        address = rep['address']
+        if address not in self.reputation_data:
+            self.address_index.add(address)
+        
+        self.reputation_data[address] = rep
+        self.leaderboard.update(leaderboard_key(rep))
+    
+    def refresh_reputation(self) -> int:
+        """
+        Догружаем репутацию адресов, агрегаты которых изменились после
+        прошлой загрузки (по номеру изменения агрегатов, а не по времени:
+        пачка, зафиксированная писателем позже, всегда получает больший номер)
+        
+        Returns:
+            Количество обновлённых пользователей
+        """
+        if self.loaded_version is None:
+            self.calculate_reputation()
+            return len(self.reputation_data)
+        
+        aggregates = self.storage.get_reputation_aggregates(since_version=self.loaded_version)
+        
+        for address, aggregate in aggregates.items():
+            self.update_user_reputation(self._calculate_user_reputation(address, aggregate))
+            self.loaded_version = max(self.loaded_version, aggregate["version"])
+        
+        return len(aggregates)
+    
+    def _refresh_if_loaded(self):
+        """
+        Перед ответом боту догружаем изменения из БД, если репутация уже
+        загружена (долгоживущий процесс видит новые оценки без пересчёта)
+        """
+        if self.storage is not None and self.loaded_version is not None:
+            self.refresh_reputation()
+    
+    def _calculate_user_reputation(self, address: str, aggregate: Dict[str, Any]) -> Dict[str, Any]:
         """
         Рассчитываем репутацию для одного пользователя
         
         Args:
             address: адрес пользователя
-            ratings: список его рейтингов
+            aggregate: его агрегат из Storage.get_reputation_aggregates()
         
         Returns:
             Словарь с данными репутации
         """
-        total_score = 0
-        ratings_count = 0
-        
-        # Группируем по типам для статистики
-        by_type = defaultdict(list)
-        
-        for rating in ratings:
-            rating_value = rating.get('rating')
-            rating_type = rating.get('type', 'general')
-            
-            # Накапливаем сумму
-            total_score += rating_value
-            ratings_count += 1
-            
-            # Статистика по типам
-            by_type[rating_type].append(rating_value)
+        ratings_count = aggregate['ratings_count']
         
         # Вычисляем средний балл
-        avg_rating = total_score / ratings_count if ratings_count > 0 else 0
+        avg_rating = aggregate['ratings_sum'] / ratings_count if ratings_count > 0 else 0
         
         # Вычисляем итоговый балл (пока просто средний, можно усложнить)
         final_score = avg_rating
         
+        # Статистика по типам: счётчики оценок, а не списки всех оценок
+        by_type = {
+            rating_type: RatingStats.from_counts(counts)
+            for rating_type, counts in aggregate['by_type'].items()
+        }
+        
         # Формируем результат
         result = {
             'address': address,
             'final_score': round(final_score, 2),
             'avg_rating': round(avg_rating, 2),
             'total_ratings': ratings_count,
-            'by_type': dict(by_type)
+            'min_rating': aggregate['rating_min'],
+            'max_rating': aggregate['rating_max'],
+            'ratings_given': aggregate['ratings_given'],
+            'by_type': by_type
         }
         
         return result
@@ -126,35 +304,14 @@ class ReputationCounter:
         Returns:
             нормализованный адрес (raw формат 0:hex)
         """
-        if not address:
-            return ""
-        
-        address = address.strip()
-        
-        # Если уже в raw формате - возвращаем как есть
-        if address.startswith("0:") or address.startswith("-1:"):
-            return address
-        
-        # Если user-friendly формат (UQ/EQ), конвертируем в raw
-        if address.startswith("UQ") or address.startswith("EQ"):
-            try:
-                # Простая конвертация через pytoniq если доступна
-                try:
-                    from pytoniq_core import Address
-                    addr_obj = Address(address)
-                    return f"{addr_obj.wc}:{addr_obj.hash_part.hex()}"
-                except ImportError:
-                    # Если нет pytoniq - ищем по частичному совпадению
-                    pass
-            except:
-                pass
-        
-        return address
+        return try_raw_address(address)
     
     def find_user_by_address(self, address: str) -> Optional[str]:
         """
         Находит пользователя в базе по адресу (поддерживает разные форматы)
-        Улучшенная версия - декодирует UQ/EQ адреса в raw формат
+        Адрес приводится к raw формату (с проверкой контрольной суммы
+        UQ/EQ адресов), после чего ищется точное совпадение; все формы
+        поиска идут по индексу AddressIndex, без перебора адресов
         
         Args:
             address: адрес для поиска
@@ -162,87 +319,39 @@ class ReputationCounter:
         Returns:
             найденный адрес из базы или None
         """
-        # Если репутация ещё не рассчитана, рассчитываем
+        # Если репутация ещё не рассчитана, рассчитываем, иначе догружаем изменения
         if not self.reputation_data:
             self.calculate_reputation()
+        else:
+            self._refresh_if_loaded()
         
         address = address.strip()
         
         # Пытаемся найти точное совпадение
-        if address in self.reputation_data:
+        if address in self.address_index:
             return address
         
-        # Для UQ/EQ адресов - декодируем base64 и получаем hex
-        if address.startswith("UQ") or address.startswith("EQ"):
-            try:
-                import base64
-                
-                # Убираем префикс UQ/EQ
-                b64_part = address[2:]
-                
-                # Заменяем URL-safe символы на стандартные base64
-                b64_part = b64_part.replace('-', '+').replace('_', '/')
-                
-                # Добавляем паддинг если нужно
-                padding = 4 - (len(b64_part) % 4)
-                if padding != 4:
-                    b64_part += '=' * padding
-                
-                # Декодируем
-                decoded = base64.b64decode(b64_part)
-                decoded_hex = decoded.hex()
-                
-                # Структура: tag(1) + hash(32) + crc(2) = 35 байт = 70 hex символов
-                # НО: workchain встроен в tag, hash начинается со второго hex символа
-                
-                if len(decoded_hex) >= 66:
-                    # Hash - это символы с 1 по 65 (32 байта)
-                    hash_hex = decoded_hex[1:65]
-                    
-                    # Workchain обычно 0 для user-friendly адресов
-                    # Можно извлечь из первого байта, но проще поискать по hash
-                    
-                    if config.DEBUG_MODE:
-                        print(f"🔍 Конвертация: {address[:10]}... hash={hash_hex[:16]}...")
-                    
-                    # Ищем в базе по hash части (игнорируя workchain)
-                    for db_address in self.reputation_data.keys():
-                        if ":" in db_address:
-                            db_hash = db_address.split(":", 1)[1]
-                            if db_hash == hash_hex:
-                                if config.DEBUG_MODE:
-                                    print(f"✅ Найдено: {db_address}")
-                                return db_address
-            except Exception as e:
-                if config.DEBUG_MODE:
-                    print(f"⚠️ Ошибка декодирования адреса {address}: {e}")
-        
-        # Для raw адресов (0:hex или -1:hex)
-        if ":" in address:
-            # Ищем точное совпадение
-            if address in self.reputation_data:
-                return address
-            
-            # Извлекаем hex часть
-            try:
-                hex_part = address.split(":", 1)[1].lower()
-                
-                # Ищем по hex части
-                for db_address in self.reputation_data.keys():
-                    if db_address.lower().endswith(hex_part):
-                        return db_address
-            except:
-                pass
+        # Канонический raw адрес - так адреса хранятся в базе
+        raw_address = self.normalize_address(address)
+        if raw_address in self.address_index:
+            return raw_address
         
-        # Если ничего не нашли - пытаемся искать по частичному совпадению
-        # (последние 16 символов для уверенности)
-        search_key = address.lower()[-16:] if len(address) >= 16 else address.lower()
+        if config.DEBUG_MODE and raw_address != address:
+            print(f"🔍 Конвертация: {address[:10]}... -> {raw_address[:20]}...")
         
-        for db_address in self.reputation_data.keys():
-            if search_key in db_address.lower():
-                return db_address
+        # Записи, сохранённые до перехода на канонические адреса:
+        # ищем по hex части без учёта workchain и регистра
+        hex_part = hash_part(address)
+        if hex_part:
+            found = self.address_index.find_by_hash(hex_part)
+            if found:
+                return found
         
-        return None
+        # Если ничего не нашли - ищем по фрагменту адреса: конец адреса
+        # (последние 16 символов для уверенности) или начало hex части
+        search_key = address[-16:] if len(address) >= 16 else address
+        
+        return self.address_index.find_by_fragment(search_key)
     
     def get_user_reputation(self, address: str) -> Optional[Dict[str, Any]]:
     
@@ -271,16 +380,40 @@ class ReputationCounter:
             count: количество пользователей в топе
         
         Returns:
-            Список пользователей, отсортированный по final_score
+            Список пользователей по местам в таблице лидеров (см. leaderboard_key)
         """
-        # Сортируем по final_score
-        sorted_users = sorted(
-            self.reputation_data.values(),
-            key=lambda x: x['final_score'],
-            reverse=True
-        )
+        return self.get_leaderboard_page(0, count)
+    
+    def get_leaderboard_page(self, offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Получаем страницу таблицы лидеров
+        
+        Args:
+            offset: сколько мест пропустить
+            limit: количество пользователей на странице
         
-        return sorted_users[:count]
+        Returns:
+            Список пользователей по местам
+        """
+        self._refresh_if_loaded()
+        return [self.reputation_data[address] for address in self.leaderboard.page(offset, limit)]
+    
+    def get_user_rank(self, address: str) -> Optional[int]:
+        """
+        Получаем место пользователя в таблице лидеров
+        
+        Args:
+            address: адрес пользователя (в любом формате)
+        
+        Returns:
+            Место начиная с 1 или None если не найден
+        """
+        found_address = self.find_user_by_address(address)
+        
+        if not found_address:
+            return None
+        
+        return self.leaderboard.rank(found_address)
     
     def format_reputation_text(self, address: str) -> str:
         """
@@ -304,7 +437,7 @@ class ReputationCounter:
             return f"📊 РЕПУТАЦИЯ ПОЛЬЗОВАТЕЛЯ\n\nАдрес: {address[:10]}...{address[-6:]}\n\n⚠️ Репутация не найдена"
         
         # Получаем профиль пользователя (если есть) - ищем по raw адресу
-        profile = self.db.get_profile_by_address(found_address)
+        profile = self.storage.get_profile_by_address(found_address)
         
         text = "📊 РЕПУТАЦИЯ ПОЛЬЗОВАТЕЛЯ\n\n"
         
@@ -365,14 +498,14 @@ class ReputationCounter:
         text += f"⭐️ Средняя оценка: {rep['avg_rating']}\n"
         text += f"📊 Отзывов получено: {rep['total_ratings']}\n"
         text += f"✍️ Отзывов оставлено: {rep['ratings_given']}\n"
+        text += f"🏅 Место в рейтинге: {self.leaderboard.rank(found_address)} из {len(self.leaderboard)}\n"
         
         # Детали по типам (если есть)
         if rep.get('by_type'):
             text += f"\n📋 По типам:\n"
-            for rtype, values in rep['by_type'].items():
-                avg = sum(values) / len(values)
+            for rtype, stats in rep['by_type'].items():
                 type_name = rtype if rtype else "general"
-                text += f"  • {type_name}: {len(values)} шт., средняя {avg:.1f}\n"
+                text += f"  • {type_name}: {stats.count} шт., средняя {stats.average:.1f}\n"
         
         return text
     
@@ -393,13 +526,18 @@ class ReputationCounter:
         if not found_address:
             return f"📋 ОТЗЫВЫ ПОЛЬЗОВАТЕЛЯ\n\nАдрес: {address[:10]}...{address[-6:]}\n\n⚠️ Пользователь не найден"
         
-        # Получаем профиль (если есть)
-        profile = self.db.get_profile_by_address(found_address)
-        
         # Получаем последние отзывы
         received_ratings = self.db.get_recent_ratings(found_address, as_sender=False, limit=limit)
         given_ratings = self.db.get_recent_ratings(found_address, as_sender=True, limit=limit)
         
+        # Профили пользователя и всех участников отзывов - одним запросом
+        profiles = self.storage.get_profiles_by_addresses(
+            [found_address]
+            + [rating['sender'] for rating in received_ratings]
+            + [rating['receiver'] for rating in given_ratings]
+        )
+        profile = profiles[found_address]
+        
         text = "📋 ОТЗЫВЫ ПОЛЬЗОВАТЕЛЯ\n\n"
         
         # Показываем имя пользователя
@@ -416,7 +554,7 @@ class ReputationCounter:
         if received_ratings:
             for i, rating in enumerate(received_ratings, 1):
                 # Получаем профиль отправителя (если есть)
-                sender_profile = self.db.get_profile_by_address(rating['sender'])
+                sender_profile = profiles[rating['sender']]
                 sender_name = sender_profile['nickname'] if sender_profile else f"{rating['sender'][:8]}..."
                 
                 # Форматируем дату
@@ -449,7 +587,7 @@ class ReputationCounter:
         if given_ratings:
             for i, rating in enumerate(given_ratings, 1):
                 # Получаем профиль получателя (если есть)
-                receiver_profile = self.db.get_profile_by_address(rating['receiver'])
+                receiver_profile = profiles[rating['receiver']]
                 receiver_name = receiver_profile['nickname'] if receiver_profile else f"{rating['receiver'][:8]}..."
                 
                 # Форматируем дату
@@ -490,11 +628,14 @@ class ReputationCounter:
             print("⚠ Пользователи не найдены")
             return
         
+        # Профили всего топа - одним запросом
+        profiles = self.storage.get_profiles_by_addresses([user['address'] for user in top_users])
+        
         for i, user in enumerate(top_users, 1):
             print(f"\n#{i}")
             
-            # Пытаемся получить профиль
-            profile = self.db.get_profile_by_address(user['address'])
+            # Профиль (если есть)
+            profile = profiles[user['address']]
             
             if profile:
                 print(f"  👤 {profile['nickname']}")
@@ -519,12 +660,25 @@ class ReputationCounter:
             # Статистика по типам
             if user.get('by_type'):
                 print("  По типам:")
-                for rtype, values in user['by_type'].items():
-                    avg = sum(values) / len(values)
-                    print(f"    - {rtype}: {len(values)} шт., средняя {avg:.1f}")
+                for rtype, stats in user['by_type'].items():
+                    print(f"    - {rtype}: {stats.count} шт., средняя {stats.average:.1f}")
         
         print("\n" + "=" * 60)
     
+    def _export_user(self, rep: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Данные репутации для JSON отчёта (статистика по типам - словари)
+        
+        Args:
+            rep: данные репутации пользователя
+        
+        Returns:
+            Копия данных, пригодная для json.dump
+        """
+        exported = dict(rep)
+        exported['by_type'] = {rtype: stats.to_dict() for rtype, stats in rep['by_type'].items()}
+        return exported
+    
     def save_to_json(self, filepath: str = None):
         """
         Сохраняем отчёт в JSON файл
@@ -540,8 +694,8 @@ class ReputationCounter:
             'generated_at': datetime.now().isoformat(),
             'protocol': 'repOWR',
             'total_users': len(self.reputation_data),
-            'top_users': self.get_top_users(config.TOP_USERS_COUNT),
-            'all_users': list(self.reputation_data.values())
+            'top_users': [self._export_user(rep) for rep in self.get_top_users(config.TOP_USERS_COUNT)],
+            'all_users': [self._export_user(rep) for rep in self.reputation_data.values()]
         }
         
         # Сохраняем в файл
@@ -564,19 +718,59 @@ class ReputationCounter:
         
         print("\n✅ Расчёт репутации завершён!")
     
+    def rebuild(self, verify_only: bool = False) -> bool:
+        """
+        Пересобираем агрегаты с нуля и сверяем их с полным пересчётом
+        
+        Args:
+            verify_only: только сверить, не пересобирая
+        
+        Returns:
+            True, если агрегаты совпадают с пересчётом
+        """
+        if not verify_only:
+            print("🔧 Пересборка агрегатов репутации...")
+            count = self.storage.rebuild_reputation_aggregates()
+            print(f"✓ Адресов в агрегатах: {count}")
+        
+        print("🔍 Сверка агрегатов с полным пересчётом...")
+        mismatched = self.storage.verify_reputation_aggregates()
+        
+        if not mismatched:
+            print("✓ Агрегаты совпадают с пересчётом")
+            return True
+        
+        print(f"⚠ Расхождения у {len(mismatched)} адресов:")
+        for address in mismatched[:20]:
+            print(f"  - {address}")
+        if len(mismatched) > 20:
+            print(f"  ... и ещё {len(mismatched) - 20}")
+        return False
+    
     def close(self):
-        """Закрываем соединение с базой данных"""
-        self.db.close()
+        """Закрываем соединения с базой данных"""
+        if self.db:
+            self.db.close()
+        if self.storage:
+            self.storage.close()
 
 
 # Точка входа скрипта
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Счётчик репутации repOWR")
+    arg_parser.add_argument("--rebuild", action="store_true", help="пересобрать агрегаты и сверить их с пересчётом")
+    arg_parser.add_argument("--verify", action="store_true", help="только сверить агрегаты с пересчётом")
+    args = arg_parser.parse_args()
+    
     # Создаём счётчик
     counter = ReputationCounter()
     
     try:
-        # Запускаем расчёт
-        counter.run()
+        if args.rebuild or args.verify:
+            counter.rebuild(verify_only=not args.rebuild)
+        else:
+            # Запускаем расчёт
+            counter.run()
     except KeyboardInterrupt:
         print("\n\n⚠ Расчёт прерван пользователем")
     except Exception as e:
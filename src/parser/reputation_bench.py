@@ -0,0 +1,304 @@
+"""
+Бенчмарк поиска пользователя по адресу (ReputationCounter.find_user_by_address).
+Генерирует базу из N адресов (часть - в устаревшем виде, с hex в верхнем
+регистре), строит индекс и замеряет каждую форму поиска: raw адрес,
+user-friendly адрес, адрес устаревшей записи, фрагмент адреса и промах.
+Для сравнения те же запросы выполняются прежним поиском перебором
+(на небольшом числе запросов - каждый из них проходит по всей базе).
+
+С флагом --leaderboard замеряется таблица лидеров: топ, место
+пользователя, страница и обновление баллов против полной сортировки.
+"""
+
+import argparse
+import base64
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Импортируем наши модули
+from address import crc16, to_raw_address, try_raw_address, hash_part
+from reputation import ReputationCounter, leaderboard_key
+
+
+def friendly_address(raw: str, bounceable: bool = False) -> str:
+    """
+    User-friendly (url-safe base64) форма raw адреса
+
+    Args:
+        raw: адрес в raw формате wc:hex
+        bounceable: EQ... (True) или UQ... (False)
+
+    Returns:
+        Адрес из 48 символов
+    """
+    workchain, hex_part = raw.split(":")
+    data = bytes([0x11 if bounceable else 0x51, int(workchain) & 0xFF]) + bytes.fromhex(hex_part)
+    data += crc16(data).to_bytes(2, "big")
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def legacy_find(reputation_data: Dict[str, dict], address: str) -> Optional[str]:
+    """Прежний поиск: точное совпадение, затем перебор всех адресов"""
+    address = address.strip()
+
+    if address in reputation_data:
+        return address
+
+    raw_address = try_raw_address(address)
+    if raw_address in reputation_data:
+        return raw_address
+
+    hex_part = hash_part(address)
+    if hex_part:
+        for db_address in reputation_data.keys():
+            if db_address.lower().endswith(hex_part):
+                return db_address
+
+    search_key = address.lower()[-16:] if len(address) >= 16 else address.lower()
+    for db_address in reputation_data.keys():
+        if search_key in db_address.lower():
+            return db_address
+
+    return None
+
+
+def build_addresses(count: int, seed: int, legacy_share: float) -> List[str]:
+    """
+    Адреса базы: канонические raw и доля устаревших (hex в верхнем регистре)
+
+    Args:
+        count: количество адресов
+        seed: зерно генератора
+        legacy_share: доля устаревших записей
+
+    Returns:
+        Список адресов
+    """
+    rnd = random.Random(seed)
+    addresses = []
+    for _ in range(count):
+        hex_part = f"{rnd.getrandbits(256):064x}"
+        addresses.append(f"0:{hex_part.upper()}" if rnd.random() < legacy_share else f"0:{hex_part}")
+    return addresses
+
+
+def build_queries(addresses: List[str], count: int, seed: int) -> Dict[str, List[str]]:
+    """
+    Запросы каждой формы поиска
+
+    Args:
+        addresses: адреса базы
+        count: запросов каждой формы
+        seed: зерно генератора
+
+    Returns:
+        Словарь {форма: список запросов}
+    """
+    rnd = random.Random(seed + 1)
+    canonical = [address for address in addresses if address == address.lower()]
+    legacy = [address for address in addresses if address != address.lower()]
+
+    queries = {
+        "raw": rnd.sample(canonical, min(count, len(canonical))),
+        "friendly (UQ)": [friendly_address(address) for address in rnd.sample(canonical, min(count, len(canonical)))],
+        "фрагмент (16 символов)": [address[-16:] for address in rnd.sample(canonical, min(count, len(canonical)))],
+        "промах": [f"0:{rnd.getrandbits(256):064x}" for _ in range(count)],
+    }
+    if legacy:
+        queries["устаревшая запись"] = [address.lower() for address in rnd.sample(legacy, min(count, len(legacy)))]
+    return queries
+
+
+def measure(find: Callable[[str], Optional[str]], queries: List[str]) -> Tuple[float, List[Optional[str]]]:
+    """
+    Среднее время одного поиска
+
+    Args:
+        find: функция поиска
+        queries: запросы
+
+    Returns:
+        (микросекунд на запрос, результаты)
+    """
+    # Кэш разбора адресов сбрасывается, чтобы оба поиска разбирали адреса заново
+    to_raw_address.cache_clear()
+
+    started = time.perf_counter()
+    results = [find(query) for query in queries]
+    elapsed = time.perf_counter() - started
+    return elapsed / len(queries) * 1e6, results
+
+
+def run_lookup_benchmark(count: int = 1000000, lookups: int = 10000, legacy_lookups: int = 5,
+                         seed: int = 1, legacy_share: float = 0.1) -> Dict[str, object]:
+    """
+    Замер поиска по адресу
+
+    Args:
+        count: адресов в базе
+        lookups: запросов каждой формы для индекса
+        legacy_lookups: запросов каждой формы для перебора (0 - не замерять)
+        seed: зерно генератора
+        legacy_share: доля устаревших записей в базе
+
+    Returns:
+        Словарь {count, build, rows: [(форма, мкс индекс, мкс перебор или None, совпадают ли результаты)]}
+    """
+    addresses = build_addresses(count, seed, legacy_share)
+    counter = ReputationCounter(with_db=False)
+
+    started = time.perf_counter()
+    # Таблица лидеров строится вместе с индексом: нужны баллы (одинаковые -
+    # места разрешаются по адресу)
+    counter.load_reputation({
+        address: {"address": address, "final_score": 0.0, "total_ratings": 0} for address in addresses
+    })
+    build = time.perf_counter() - started
+
+    rows = []
+    for name, queries in build_queries(addresses, lookups, seed).items():
+        indexed, results = measure(counter.find_user_by_address, queries)
+
+        legacy = None
+        same = None
+        if legacy_lookups:
+            sample = queries[:legacy_lookups]
+            legacy, legacy_results = measure(lambda query: legacy_find(counter.reputation_data, query), sample)
+            same = legacy_results == results[:legacy_lookups]
+
+        rows.append((name, indexed, legacy, same))
+
+    return {"count": count, "build": build, "rows": rows}
+
+
+def print_lookup_report(result: Dict[str, object]):
+    """Выводим результаты замера"""
+    print("\n" + "=" * 72)
+    print(f"🔍 ПОИСК ПО АДРЕСУ: {result['count']:,} адресов, индекс построен за {result['build']:.2f} с")
+    print("=" * 72)
+    print(f"{'Форма поиска':26} {'индекс, мкс':>12} {'перебор, мкс':>14} {'ускорение':>10}  совпадает")
+    for name, indexed, legacy, same in result["rows"]:
+        if legacy is None:
+            print(f"{name:26} {indexed:12,.1f} {'-':>14} {'-':>10}  -")
+        else:
+            print(f"{name:26} {indexed:12,.1f} {legacy:14,.0f} {legacy / indexed:9,.0f}x  {'да' if same else 'НЕТ'}")
+    print("=" * 72)
+
+
+def build_reputation(count: int, seed: int) -> Dict[str, dict]:
+    """
+    Синтетические данные репутации (много совпадающих баллов, как в реальной базе)
+
+    Args:
+        count: количество пользователей
+        seed: зерно генератора
+
+    Returns:
+        Словарь {адрес: данные репутации}
+    """
+    rnd = random.Random(seed)
+    reputation_data = {}
+    for _ in range(count):
+        address = f"0:{rnd.getrandbits(256):064x}"
+        reputation_data[address] = {
+            "address": address,
+            "final_score": round(rnd.uniform(1, 5), 2),
+            "total_ratings": rnd.randint(1, 200),
+        }
+    return reputation_data
+
+
+def run_leaderboard_benchmark(count: int = 1000000, queries: int = 1000, updates: int = 10000,
+                              seed: int = 1) -> Dict[str, object]:
+    """
+    Замер таблицы лидеров
+
+    Args:
+        count: пользователей
+        queries: запросов топа, места и страницы
+        updates: обновлений баллов отдельных пользователей
+        seed: зерно генератора
+
+    Returns:
+        Словарь {count, build, rows: [(операция, мкс таблица, мкс полная сортировка)], same}
+    """
+    reputation_data = build_reputation(count, seed)
+    counter = ReputationCounter(with_db=False)
+    rnd = random.Random(seed + 1)
+    addresses = list(reputation_data)
+
+    def timed(func, repeat: int) -> float:
+        """Среднее время вызова, мкс"""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1e6
+
+    # Прежний способ: сортировка всех пользователей на каждый запрос
+    def full_sort():
+        return sorted(reputation_data.values(), key=leaderboard_key)
+
+    started = time.perf_counter()
+    counter.load_reputation(reputation_data)
+    build = time.perf_counter() - started
+
+    sort_time = timed(full_sort, 3)
+    sample = rnd.sample(addresses, queries)
+
+    rows = []
+    rows.append(("топ-10", timed(lambda: counter.get_top_users(10), queries), sort_time))
+    rows.append(("место пользователя",
+                 timed(lambda: counter.leaderboard.rank(rnd.choice(sample)), queries), sort_time))
+    rows.append(("страница 50 с середины",
+                 timed(lambda: counter.get_leaderboard_page(count // 2, 50), queries), sort_time))
+
+    def update():
+        rep = dict(reputation_data[rnd.choice(addresses)])
+        rep["final_score"] = round(rnd.uniform(1, 5), 2)
+        rep["total_ratings"] += 1
+        counter.update_user_reputation(rep)
+
+    rows.append(("обновление балла", timed(update, updates), sort_time))
+
+    # После обновлений таблица должна совпадать с полной сортировкой
+    expected = [rep["address"] for rep in sorted(counter.reputation_data.values(), key=leaderboard_key)]
+    same = (expected == counter.leaderboard.page(0, count)
+            and all(counter.leaderboard.rank(address) == place for place, address in enumerate(expected[:1000], 1)))
+
+    return {"count": count, "build": build, "rows": rows, "same": same}
+
+
+def print_leaderboard_report(result: Dict[str, object]):
+    """Выводим результаты замера таблицы лидеров"""
+    print("\n" + "=" * 72)
+    print(f"🏆 ТАБЛИЦА ЛИДЕРОВ: {result['count']:,} пользователей, "
+          f"индекс и таблица построены за {result['build']:.2f} с")
+    print("=" * 72)
+    print(f"{'Операция':28} {'таблица, мкс':>14} {'сортировка, мкс':>16} {'ускорение':>10}")
+    for name, value, sort_time in result["rows"]:
+        print(f"{name:28} {value:14,.1f} {sort_time:16,.0f} {sort_time / value:9,.0f}x")
+    print(f"Совпадает с полной сортировкой: {'да' if result['same'] else 'НЕТ'}")
+    print("=" * 72)
+
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк поиска пользователя по адресу")
+    arg_parser.add_argument("--addresses", type=int, default=1000000, help="адресов в базе")
+    arg_parser.add_argument("--lookups", type=int, default=10000, help="запросов каждой формы для индекса")
+    arg_parser.add_argument("--legacy-lookups", type=int, default=5,
+                            help="запросов каждой формы для перебора (0 - не замерять)")
+    arg_parser.add_argument("--legacy-share", type=float, default=0.1, help="доля устаревших записей")
+    arg_parser.add_argument("--leaderboard", action="store_true", help="замер таблицы лидеров")
+    arg_parser.add_argument("--updates", type=int, default=10000, help="обновлений баллов (для --leaderboard)")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    if args.leaderboard:
+        print_leaderboard_report(run_leaderboard_benchmark(args.addresses, args.lookups, args.updates, args.seed))
+        raise SystemExit
+
+    print_lookup_report(run_lookup_benchmark(
+        args.addresses, args.lookups, args.legacy_lookups, args.seed, args.legacy_share
+    ))
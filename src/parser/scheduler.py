@@ -0,0 +1,197 @@
+"""
+Адаптивный планировщик опроса аккаунтов для режима наблюдения.
+Активные аккаунты опрашиваются часто, «спящие» - всё реже (интервал
+удваивается после каждого пустого опроса, но не дальше ожидаемого
+промежутка между событиями аккаунта по его сглаженной частоте), а аккаунт,
+который появился в чужом трансфере, сразу возвращается в начало очереди.
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional
+
+
+class AccountState:
+    """Состояние опроса одного аккаунта"""
+
+    __slots__ = ("interval", "next_due", "rate", "last_poll", "version")
+
+    def __init__(self, interval: float, now: float):
+        self.interval = interval      # текущий интервал опроса (сек)
+        self.next_due = now           # когда опрашивать в следующий раз
+        self.rate = 0.0               # сглаженная частота событий (событий/час)
+        self.last_poll = None         # когда аккаунт опрашивался последний раз
+        self.version = 0              # для отбрасывания устаревших записей кучи
+
+
+class PollScheduler:
+    """Очередь аккаунтов на опрос с индивидуальными интервалами"""
+
+    def __init__(self, min_interval: float, max_interval: float, smoothing: float = 0.3):
+        """
+        Инициализация планировщика
+
+        Args:
+            min_interval: интервал опроса активного аккаунта (сек)
+            max_interval: максимальный интервал для «спящего» аккаунта (сек)
+            smoothing: вес нового наблюдения в сглаженной частоте событий (0..1)
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+
+        self.accounts: Dict[str, AccountState] = {}
+
+        # Куча (next_due, version, address); устаревшие записи пропускаются
+        self.heap = []
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.accounts
+
+    def _push(self, address: str, state: AccountState):
+        """Кладём аккаунт в кучу с новым временем опроса"""
+        state.version += 1
+        heapq.heappush(self.heap, (state.next_due, state.version, address))
+
+    def add(self, address: str, now: float = None) -> bool:
+        """
+        Добавляем аккаунт (новый аккаунт опрашивается сразу)
+
+        Args:
+            address: адрес аккаунта
+            now: текущее время (по умолчанию time.time())
+
+        Returns:
+            True если аккаунт новый
+        """
+        if address in self.accounts:
+            return False
+
+        now = time.time() if now is None else now
+        state = AccountState(self.min_interval, now)
+        self.accounts[address] = state
+        self._push(address, state)
+        return True
+
+    def bump(self, address: str, now: float = None):
+        """
+        Поднимаем аккаунт в начало очереди: он участвовал в трансфере,
+        найденном в ленте другого аккаунта. Неизвестный аккаунт добавляется.
+
+        Args:
+            address: адрес аккаунта
+            now: текущее время
+        """
+        now = time.time() if now is None else now
+
+        if self.add(address, now):
+            return
+
+        state = self.accounts[address]
+        state.interval = self.min_interval
+        if state.next_due > now:
+            state.next_due = now
+            self._push(address, state)
+
+    def record(self, address: str, new_events: int, now: float = None):
+        """
+        Учитываем результат опроса и планируем следующий
+
+        Args:
+            address: адрес аккаунта
+            new_events: сколько новых событий нашлось
+            now: текущее время
+        """
+        now = time.time() if now is None else now
+
+        # В расписание аккаунты попадают только через add() и bump()
+        state = self.accounts.get(address)
+        if state is None:
+            return
+
+        # Сглаженная частота событий в час
+        if state.last_poll is not None and now > state.last_poll:
+            observed = new_events * 3600 / (now - state.last_poll)
+            state.rate += self.smoothing * (observed - state.rate)
+        state.last_poll = now
+
+        if new_events > 0:
+            state.interval = self.min_interval
+        else:
+            # Пустой опрос - экспоненциально откладываем следующий, но не дальше
+            # ожидаемого промежутка между событиями: аккаунт с частыми событиями
+            # не уходит в «спящие» после пары пустых опросов подряд
+            limit = self.max_interval
+            if state.rate > 0:
+                limit = min(limit, max(self.min_interval, 3600 / state.rate))
+            state.interval = min(state.interval * 2, limit)
+
+        state.next_due = now + state.interval
+        self._push(address, state)
+
+    def pop_due(self, limit: int, now: float = None) -> List[str]:
+        """
+        Забираем аккаунты, которым пора на опрос (самые просроченные первыми).
+        Забранные аккаунты возвращаются в очередь через record().
+
+        Args:
+            limit: максимальное количество аккаунтов
+            now: текущее время
+
+        Returns:
+            Список адресов
+        """
+        now = time.time() if now is None else now
+        due = []
+
+        while self.heap and len(due) < limit:
+            next_due, version, address = self.heap[0]
+            state = self.accounts.get(address)
+
+            # Устаревшая запись (аккаунт перепланирован)
+            if state is None or version != state.version:
+                heapq.heappop(self.heap)
+                continue
+
+            if next_due > now:
+                break
+
+            heapq.heappop(self.heap)
+            # Пока аккаунт на опросе, его нет в куче
+            state.version += 1
+            due.append(address)
+
+        return due
+
+    def next_due_in(self, now: float = None) -> Optional[float]:
+        """
+        Через сколько секунд наступит ближайший опрос
+
+        Returns:
+            Секунды (0 если уже пора) или None, если очередь пуста
+        """
+        now = time.time() if now is None else now
+
+        while self.heap:
+            next_due, version, address = self.heap[0]
+            state = self.accounts.get(address)
+            if state is None or version != state.version:
+                heapq.heappop(self.heap)
+                continue
+            return max(0.0, next_due - now)
+
+        return None
+
+    def summary(self) -> Dict[str, int]:
+        """
+        Краткая статистика для логов
+
+        Returns:
+            {"accounts": всего, "hot": на минимальном интервале, "cold": на максимальном}
+        """
+        hot = sum(1 for s in self.accounts.values() if s.interval <= self.min_interval)
+        cold = sum(1 for s in self.accounts.values() if s.interval >= self.max_interval)
+        return {"accounts": len(self.accounts), "hot": hot, "cold": cold}
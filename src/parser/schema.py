@@ -0,0 +1,265 @@
+"""
+Декларативные схемы JSON-сообщений repOWR.
+Поля сообщения (тип, обязательность, диапазон, длина, допустимые значения,
+формат) описываются один раз, а compile_protocol() генерирует по схемам
+одну функцию проверки без циклов по описаниям полей - такую же, как
+если бы её написали вручную. Схемы разных версий протокола хранятся
+в SchemaRegistry.
+
+Порядок проверок: общие поля, затем выбор схемы по полю "type", затем
+наличие всех обязательных полей схемы и поля в порядке объявления.
+Функция возвращает (код ошибки, данные, параметры ошибки), как
+RepOWRValidator.check(). Параметры ошибок:
+    missing, items        - ()
+    type                  - (тип значения,)
+    range                 - (min, max, значение)
+    length                - (длина, max_length)
+    choices               - (значение, "допустимые через запятую")
+    pattern               - (значение,)
+"""
+
+from typing import Dict, Any, Callable, List, NamedTuple, Optional, Pattern, Tuple
+
+# Код успешной проверки (совпадает с validator.OK)
+OK = 0
+
+# Сигнатура скомпилированной проверки: данные -> (код, данные, параметры ошибки)
+CheckFunction = Callable[[Dict[str, Any]], Tuple[int, Optional[Dict[str, Any]], tuple]]
+
+
+class Field(NamedTuple):
+    """Описание одного поля сообщения"""
+
+    name: str
+    errors: Dict[str, int]  # код ошибки для каждой проверки: {"type": E_..., "range": E_..., ...}
+    type: Optional[type] = None  # isinstance-проверка (int пропускает и bool, как раньше)
+    required: bool = False
+    min: Optional[int] = None
+    max: Optional[int] = None
+    max_length: Optional[int] = None
+    items: Optional[type] = None  # тип элементов массива
+    choices: Optional[Tuple[Any, ...]] = None  # допустимые значения
+    pattern: Optional[Pattern] = None  # регулярное выражение для строки (например, URL)
+    skip_empty: bool = False  # проверять только непустое значение, а не любое присутствующее
+
+
+class Schema(NamedTuple):
+    """Схема сообщения одного типа"""
+
+    name: str
+    fields: Tuple[Field, ...]
+    format: str = "json"  # значение поля "format" в данных валидного сообщения
+
+    def with_fields(self, *fields: Field) -> "Schema":
+        """
+        Схема следующей версии протокола: поля с теми же именами заменяются,
+        новые добавляются в конец
+
+        Args:
+            fields: изменённые и новые поля
+
+        Returns:
+            Новая схема
+        """
+        replaced = {field.name: field for field in fields}
+        result = [replaced.pop(field.name, field) for field in self.fields]
+        result.extend(field for field in fields if field.name in replaced)
+        return self._replace(fields=tuple(result))
+
+
+class Protocol(NamedTuple):
+    """Схемы одной версии протокола"""
+
+    common: Tuple[Field, ...]  # поля всех сообщений (проверяются до выбора схемы)
+    kinds: Dict[str, Schema]  # {значение поля "type": схема}
+    default: Schema  # схема для остальных значений "type" (и его отсутствия)
+
+
+def _field_source(field: Field, prefix: str, constants: Dict[str, Any]) -> List[str]:
+    """
+    Строки кода проверок одного поля (значение поля уже в переменной value)
+
+    Args:
+        field: описание поля
+        prefix: уникальный префикс имён констант поля
+        constants: пространство имён функции, сюда добавляются константы поля
+
+    Returns:
+        Строки кода без отступа
+    """
+    errors = field.errors
+    lines = []
+
+    if field.type is not None:
+        constants[f"{prefix}_type"] = field.type
+        lines += [
+            f"if not isinstance(value, {prefix}_type):",
+            f"    return {errors['type']}, None, (type(value),)",
+        ]
+
+    if field.min is not None or field.max is not None:
+        conditions = []
+        if field.min is not None:
+            conditions.append(f"value < {field.min!r}")
+        if field.max is not None:
+            conditions.append(f"value > {field.max!r}")
+        lines += [
+            f"if {' or '.join(conditions)}:",
+            f"    return {errors['range']}, None, ({field.min!r}, {field.max!r}, value)",
+        ]
+
+    if field.max_length is not None:
+        lines += [
+            f"if len(value) > {field.max_length}:",
+            f"    return {errors['length']}, None, (len(value), {field.max_length})",
+        ]
+
+    if field.items is not None:
+        constants[f"{prefix}_items"] = field.items
+        lines += [
+            "for item in value:",
+            f"    if not isinstance(item, {prefix}_items):",
+            f"        return {errors['items']}, None, ()",
+        ]
+
+    if field.choices is not None:
+        # Кортеж, а не множество: значение из JSON может быть нехэшируемым (список, объект)
+        constants[f"{prefix}_choices"] = tuple(field.choices)
+        allowed = ", ".join(str(choice) for choice in field.choices)
+        lines += [
+            f"if value not in {prefix}_choices:",
+            f"    return {errors['choices']}, None, (value, {allowed!r})",
+        ]
+
+    if field.pattern is not None:
+        constants[f"{prefix}_match"] = field.pattern.match
+        lines += [
+            f"if {prefix}_match(value) is None:",
+            f"    return {errors['pattern']}, None, (value,)",
+        ]
+
+    return lines
+
+
+def _fields_source(fields: Tuple[Field, ...], prefix: str, constants: Dict[str, Any]) -> List[str]:
+    """
+    Строки кода проверок набора полей: сначала наличие обязательных, затем
+    все поля по порядку
+
+    Args:
+        fields: описания полей
+        prefix: уникальный префикс имён констант
+        constants: пространство имён функции
+
+    Returns:
+        Строки кода без отступа
+    """
+    lines = []
+
+    for field in fields:
+        if field.required:
+            lines += [
+                f"if {field.name!r} not in data:",
+                f"    return {field.errors['missing']}, None, ()",
+            ]
+
+    for index, field in enumerate(fields):
+        checks = _field_source(field, f"{prefix}_{index}", constants)
+
+        if field.required:
+            lines.append(f"value = data[{field.name!r}]")
+            lines += checks
+        elif checks:
+            if field.skip_empty:
+                lines += [f"value = data.get({field.name!r})", "if value:"]
+            else:
+                # "in" и чтение по ключу дешевле вызова data.get(), даже когда поле есть
+                lines += [f"if {field.name!r} in data:", f"    value = data[{field.name!r}]"]
+            lines += ["    " + line for line in checks]
+
+    return lines
+
+
+def compile_protocol(protocol: Protocol) -> CheckFunction:
+    """
+    Генерируем функцию проверки разобранного JSON-сообщения по схемам версии
+
+    Args:
+        protocol: схемы версии протокола
+
+    Returns:
+        Функция data -> (код ошибки, данные, параметры ошибки); исходный
+        код функции доступен в её атрибуте source (для отладки)
+    """
+    constants = {}
+    body = _fields_source(protocol.common, "common", constants)
+
+    if protocol.kinds:
+        body.append("kind = data.get('type')")
+
+    schemas = list(protocol.kinds.items()) + [(None, protocol.default)]
+    for kind, schema in schemas:
+        lines = _fields_source(schema.fields, schema.name, constants) + [
+            f"data['format'] = {schema.format!r}",
+            f"return {OK}, data, ()",
+        ]
+
+        if kind is None:
+            body += lines
+        else:
+            body.append(f"if kind == {kind!r}:")
+            body += ["    " + line for line in lines]
+
+    source = "def check_message(data):\n" + "".join(f"    {line}\n" for line in body)
+
+    exec(compile(source, "<schema>", "exec"), constants)
+
+    function = constants["check_message"]
+    function.source = source
+    return function
+
+
+class SchemaRegistry:
+    """Версии протокола: схемы и скомпилированная проверка каждой версии"""
+
+    def __init__(self):
+        """Пустой реестр"""
+        self.protocols: Dict[int, Protocol] = {}
+        self.checks: Dict[int, CheckFunction] = {}
+
+    def register(self, version: int, protocol: Protocol):
+        """
+        Регистрируем схемы версии протокола (компилируются сразу)
+
+        Args:
+            version: номер версии протокола
+            protocol: схемы версии
+        """
+        if version in self.protocols:
+            raise ValueError(f"Версия схем {version} уже зарегистрирована")
+
+        self.protocols[version] = protocol
+        self.checks[version] = compile_protocol(protocol)
+
+    @property
+    def latest(self) -> int:
+        """Последняя зарегистрированная версия"""
+        return max(self.protocols)
+
+    def get(self, version: int = None) -> CheckFunction:
+        """
+        Скомпилированная проверка версии
+
+        Args:
+            version: номер версии (по умолчанию последняя)
+
+        Returns:
+            Функция проверки разобранного JSON-сообщения
+        """
+        if version is None:
+            version = self.latest
+
+        if version not in self.checks:
+            raise KeyError(f"Неизвестная версия схем: {version}")
+
+        return self.checks[version]
@@ -0,0 +1,922 @@
+"""
+Служебное хранилище парсера repOWR.
+Хранит состояние инкрементального парсинга (чекпоинты аккаунтов, очередь
+повторов неудачных загрузок) и прогресс backfill (шарды) в той же SQLite
+базе, что и транзакции, но в отдельных таблицах, и умеет пакетно
+записывать транзакции, рейтинги и профили (таблицы создаёт Database).
+Вместе с рейтингами в той же SQL-транзакции обновляются агрегаты
+репутации по адресам (reputation_aggregates, reputation_type_counts).
+Профили читаются пачками по списку адресов, через ограниченный LRU-кэш.
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Set, Tuple, Iterator
+
+
+class Storage:
+    """Класс для работы со служебными таблицами парсера"""
+
+    # Поля профиля, которые пишутся в таблицу profiles
+    PROFILE_FIELDS = [
+        "nickname", "bio", "avatar", "skills", "languages", "nationality",
+        "affiliation", "birth_year", "location", "links"
+    ]
+
+    # Ограничение SQLite на количество параметров в одном запросе
+    SQL_CHUNK = 500
+
+    # Полный пересчёт агрегатов репутации по таблице ratings (для rebuild и verify):
+    # полученные оценки считаются по receiver, выставленные - по sender
+    AGGREGATES_SQL = """
+        SELECT address, SUM(ratings_count) AS ratings_count, SUM(ratings_sum) AS ratings_sum,
+               MIN(rating_min) AS rating_min, MAX(rating_max) AS rating_max,
+               SUM(ratings_given) AS ratings_given
+        FROM (
+            SELECT t.receiver AS address, COUNT(*) AS ratings_count, SUM(r.rating) AS ratings_sum,
+                   MIN(r.rating) AS rating_min, MAX(r.rating) AS rating_max, 0 AS ratings_given
+            FROM ratings r JOIN transactions t ON r.tx_id = t.id
+            WHERE t.is_valid = 1
+            GROUP BY t.receiver
+            UNION ALL
+            SELECT t.sender, 0, 0, NULL, NULL, COUNT(*)
+            FROM ratings r JOIN transactions t ON r.tx_id = t.id
+            WHERE t.is_valid = 1
+            GROUP BY t.sender
+        )
+        GROUP BY address
+    """
+
+    # Счётчики полученных оценок по типу и значению (тип не указан - пустая строка)
+    TYPE_COUNTS_SQL = """
+        SELECT t.receiver AS address, COALESCE(r.type, '') AS type, r.rating AS rating, COUNT(*) AS count
+        FROM ratings r JOIN transactions t ON r.tx_id = t.id
+        WHERE t.is_valid = 1
+        GROUP BY t.receiver, COALESCE(r.type, ''), r.rating
+    """
+
+    # Поля профиля, которые хранятся как JSON (списки и объекты)
+    PROFILE_JSON_FIELDS = ("skills", "languages", "links")
+
+    def __init__(self, db_path: str, profile_cache_size: int = 0):
+        """
+        Инициализация хранилища
+
+        Args:
+            db_path: путь к файлу базы данных SQLite
+            profile_cache_size: сколько профилей хранить в LRU-кэше (0 - без кэша)
+        """
+        self.db_path = db_path
+        self.conn = None
+
+        # Кэш профилей {адрес: профиль или None} и последний известный id
+        # профиля: профили с большим id вытесняют свои адреса из кэша
+        self.profile_cache_size = profile_cache_size
+        self.profile_cache = OrderedDict()
+        self.profile_watermark = None
+
+        # Счётчики записи (для бенчмарков): SQL-транзакций и вставленных строк
+        self.stats = {"batches": 0, "rows": 0}
+
+    def connect(self):
+        """Подключаемся к базе данных"""
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+
+    def create_tables(self):
+        """Создаём служебные таблицы, если их ещё нет"""
+        cursor = self.conn.cursor()
+
+        # Агрегаты появились позже рейтингов: для существующей базы их нужно собрать
+        aggregates_existed = self._table_exists("reputation_aggregates")
+
+        # Чекпоинты: последнее обработанное событие каждого аккаунта.
+        # Если чтение упёрлось в MAX_PAGES_PER_ACCOUNT, не дойдя до last_lt,
+        # сохраняется курсор продолжения (resume_before_lt) и событие,
+        # которое станет чекпоинтом, когда пропуск будет дочитан (pending_*)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS account_checkpoints (
+                address TEXT PRIMARY KEY,
+                last_lt INTEGER NOT NULL,
+                last_event_id TEXT,
+                resume_before_lt INTEGER,
+                pending_lt INTEGER,
+                pending_event_id TEXT,
+                updated_at INTEGER
+            )
+        """)
+
+        # Архив сообщений, не относящихся к протоколу (MEMO_POLICY = "archive"):
+        # вне горячей таблицы transactions, данные строки сжаты zlib
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memo_archive (
+                tx_hash TEXT PRIMARY KEY,
+                timestamp INTEGER,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+        # Очередь повторов: аккаунты, историю которых не удалось загрузить
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fetch_retries (
+                address TEXT PRIMARY KEY,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                full_history INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at INTEGER NOT NULL,
+                updated_at INTEGER
+            )
+        """)
+
+        # План backfill: holders, разбитые на шарды, и прогресс каждого шарда
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_shards (
+                shard_id INTEGER PRIMARY KEY,
+                accounts TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                transfers INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER
+            )
+        """)
+
+        # Агрегаты репутации: полученные оценки (количество, сумма, min/max)
+        # и количество выставленных оценок по каждому адресу.
+        # version - номер изменения, растущий с каждой записью: по нему
+        # читатели догружают изменённые агрегаты (см. get_reputation_aggregates)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reputation_aggregates (
+                address TEXT PRIMARY KEY,
+                ratings_count INTEGER NOT NULL DEFAULT 0,
+                ratings_sum INTEGER NOT NULL DEFAULT 0,
+                rating_min INTEGER,
+                rating_max INTEGER,
+                ratings_given INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER
+            )
+        """)
+
+        # Базы, созданные до появления номера изменения
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(reputation_aggregates)")}
+        if "version" not in columns:
+            cursor.execute("ALTER TABLE reputation_aggregates ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_reputation_aggregates_version ON reputation_aggregates (version)")
+
+        # Полученные оценки по типу и значению (тип не указан - пустая строка)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS reputation_type_counts (
+                address TEXT NOT NULL,
+                type TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (address, type, rating)
+            ) WITHOUT ROWID
+        """)
+
+        self.conn.commit()
+
+        # Последний профиль адреса ищется по (address, id)
+        if self._table_exists("profiles"):
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_address ON profiles (address, id)")
+            self.conn.commit()
+
+        if not aggregates_existed and self._table_exists("ratings"):
+            self.rebuild_reputation_aggregates()
+
+    def _table_exists(self, name: str) -> bool:
+        """Есть ли в базе таблица с таким именем"""
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def get_checkpoint(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Получаем чекпоинт аккаунта
+
+        Args:
+            address: адрес аккаунта (в том виде, в каком он запрашивается у API)
+
+        Returns:
+            Словарь {last_lt, last_event_id} (и resume_before_lt, pending_lt,
+            pending_event_id, если чтение не дошло до last_lt) или None,
+            если аккаунт ещё не парсился
+        """
+        row = self.conn.execute("""
+            SELECT last_lt, last_event_id, resume_before_lt, pending_lt, pending_event_id
+            FROM account_checkpoints WHERE address = ?
+        """, (address,)).fetchone()
+
+        if not row:
+            return None
+
+        checkpoint = {"last_lt": row["last_lt"], "last_event_id": row["last_event_id"]}
+        if row["resume_before_lt"] is not None:
+            checkpoint["resume_before_lt"] = row["resume_before_lt"]
+            checkpoint["pending_lt"] = row["pending_lt"]
+            checkpoint["pending_event_id"] = row["pending_event_id"]
+
+        return checkpoint
+
+    def save_checkpoints(self, checkpoints: Dict[str, Dict[str, Any]]):
+        """
+        Сохраняем чекпоинты пачкой в одной транзакции
+
+        Args:
+            checkpoints: словарь {адрес: {last_lt, last_event_id}} (с курсором
+                         продолжения, если чтение не дошло до last_lt)
+        """
+        if not checkpoints:
+            return
+
+        now = int(time.time())
+        rows = [
+            (address, cp["last_lt"], cp.get("last_event_id", ""), cp.get("resume_before_lt"),
+             cp.get("pending_lt"), cp.get("pending_event_id"), now)
+            for address, cp in checkpoints.items()
+        ]
+
+        with self.conn:
+            # Чекпоинт только двигается вперёд: старый lt не перезаписывает новый.
+            # Курсор продолжения записывается и снимается всегда: он получен
+            # чтением, начатым от сохранённого состояния
+            self.conn.executemany("""
+                INSERT INTO account_checkpoints
+                    (address, last_lt, last_event_id, resume_before_lt, pending_lt, pending_event_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(address) DO UPDATE SET
+                    last_lt = excluded.last_lt,
+                    last_event_id = excluded.last_event_id,
+                    resume_before_lt = excluded.resume_before_lt,
+                    pending_lt = excluded.pending_lt,
+                    pending_event_id = excluded.pending_event_id,
+                    updated_at = excluded.updated_at
+                WHERE excluded.last_lt > account_checkpoints.last_lt
+                   OR excluded.resume_before_lt IS NOT NULL
+                   OR account_checkpoints.resume_before_lt IS NOT NULL
+            """, rows)
+
+    def record_fetch_failures(self, failures: Dict[str, str], base_delay: float, max_delay: float,
+                              full_history: bool = False):
+        """
+        Ставим аккаунты в очередь повторов (или увеличиваем счётчик попыток).
+        Следующая попытка - через base_delay * 2^(попыток - 1), но не позже max_delay.
+
+        Args:
+            failures: словарь {адрес: класс ошибки}
+            base_delay: задержка перед первым повтором (сек)
+            max_delay: максимальная задержка между повторами (сек)
+            full_history: повтор должен читать всю историю аккаунта (backfill)
+        """
+        if not failures:
+            return
+
+        now = int(time.time())
+        addresses = list(failures)
+
+        with self.conn:
+            attempts = {}
+            for i in range(0, len(addresses), self.SQL_CHUNK):
+                chunk = addresses[i:i + self.SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT address, attempts FROM fetch_retries WHERE address IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for row in rows:
+                    attempts[row["address"]] = row["attempts"]
+
+            rows = []
+            for address, error in failures.items():
+                attempt = attempts.get(address, 0) + 1
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                rows.append((address, error, attempt, int(full_history), now + int(delay), now))
+
+            # Флаг full_history не сбрасываем: backfill-аккаунт остаётся backfill-аккаунтом
+            self.conn.executemany("""
+                INSERT INTO fetch_retries (address, error, attempts, full_history, next_attempt_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(address) DO UPDATE SET
+                    error = excluded.error,
+                    attempts = excluded.attempts,
+                    full_history = MAX(fetch_retries.full_history, excluded.full_history),
+                    next_attempt_at = excluded.next_attempt_at,
+                    updated_at = excluded.updated_at
+            """, rows)
+
+    def clear_fetch_retries(self, addresses: List[str]):
+        """
+        Убираем из очереди повторов успешно загруженные аккаунты
+
+        Args:
+            addresses: адреса аккаунтов
+        """
+        if not addresses:
+            return
+
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM fetch_retries WHERE address = ?",
+                [(address,) for address in addresses]
+            )
+
+    def get_retry_addresses(self) -> Set[str]:
+        """
+        Все аккаунты в очереди повторов (очередь маленькая, держим её в памяти)
+
+        Returns:
+            Множество адресов
+        """
+        rows = self.conn.execute("SELECT address FROM fetch_retries").fetchall()
+        return {row["address"] for row in rows}
+
+    def get_due_retries(self, limit: int, max_attempts: int) -> List[Dict[str, Any]]:
+        """
+        Аккаунты, которым пора повторить загрузку
+
+        Args:
+            limit: максимальное количество аккаунтов
+            max_attempts: аккаунты с таким числом попыток больше не повторяются
+
+        Returns:
+            Список словарей {address, error, attempts, full_history}
+        """
+        rows = self.conn.execute("""
+            SELECT address, error, attempts, full_history FROM fetch_retries
+            WHERE next_attempt_at <= ? AND attempts < ?
+            ORDER BY next_attempt_at
+            LIMIT ?
+        """, (int(time.time()), max_attempts, limit)).fetchall()
+
+        return [dict(row) for row in rows]
+
+    def get_retry_summary(self, max_attempts: int) -> Dict[str, int]:
+        """
+        Состояние очереди повторов
+
+        Args:
+            max_attempts: предел попыток (аккаунты сверх него считаются брошенными)
+
+        Returns:
+            Словарь {queued: всего в очереди, due: пора повторить, exhausted: попытки исчерпаны}
+        """
+        row = self.conn.execute("""
+            SELECT COUNT(*) AS queued,
+                   COALESCE(SUM(attempts < ? AND next_attempt_at <= ?), 0) AS due,
+                   COALESCE(SUM(attempts >= ?), 0) AS exhausted
+            FROM fetch_retries
+        """, (max_attempts, int(time.time()), max_attempts)).fetchone()
+
+        return {"queued": row["queued"], "due": row["due"], "exhausted": row["exhausted"]}
+
+    def create_backfill_plan(self, shards: List[List[str]]):
+        """
+        Сохраняем новый план backfill (старый план удаляется)
+
+        Args:
+            shards: список шардов, каждый шард - список адресов аккаунтов
+        """
+        now = int(time.time())
+
+        with self.conn:
+            self.conn.execute("DELETE FROM backfill_shards")
+            self.conn.executemany(
+                "INSERT INTO backfill_shards (shard_id, accounts, updated_at) VALUES (?, ?, ?)",
+                [(shard_id, json.dumps(accounts), now) for shard_id, accounts in enumerate(shards)]
+            )
+
+    def get_pending_shards(self) -> List[Tuple[int, List[str]]]:
+        """
+        Получаем необработанные шарды текущего плана backfill
+
+        Returns:
+            Список пар (номер шарда, адреса аккаунтов) по возрастанию номера
+        """
+        rows = self.conn.execute(
+            "SELECT shard_id, accounts FROM backfill_shards WHERE done = 0 ORDER BY shard_id"
+        ).fetchall()
+
+        return [(row["shard_id"], json.loads(row["accounts"])) for row in rows]
+
+    def finish_shard(self, shard_id: int, transfers: int):
+        """
+        Отмечаем шард обработанным (вызывается после записи всех его данных)
+
+        Args:
+            shard_id: номер шарда
+            transfers: сколько трансферов было в шарде
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE backfill_shards SET done = 1, transfers = ?, updated_at = ? WHERE shard_id = ?",
+                (transfers, int(time.time()), shard_id)
+            )
+
+    def get_backfill_progress(self) -> Tuple[int, int]:
+        """
+        Прогресс текущего плана backfill
+
+        Returns:
+            Кортеж (обработано шардов, всего шардов)
+        """
+        row = self.conn.execute(
+            "SELECT COALESCE(SUM(done), 0) AS done, COUNT(*) AS total FROM backfill_shards"
+        ).fetchone()
+
+        return row["done"], row["total"]
+
+    def _find_existing_hashes(self, tx_hashes: List[str]) -> Dict[str, int]:
+        """
+        Ищем уже сохранённые транзакции по списку хэшей (пачками по SQL_CHUNK)
+
+        Args:
+            tx_hashes: список хэшей транзакций
+
+        Returns:
+            Словарь {tx_hash: id} для найденных транзакций
+        """
+        found = {}
+
+        for i in range(0, len(tx_hashes), self.SQL_CHUNK):
+            chunk = tx_hashes[i:i + self.SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, tx_hash FROM transactions WHERE tx_hash IN ({placeholders})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                found[row["tx_hash"]] = row["id"]
+
+        return found
+
+    def count_known_hashes(self) -> int:
+        """
+        Сколько транзакций уже сохранено (в transactions и в архиве memo_archive)
+
+        Returns:
+            Количество хэшей
+        """
+        row = self.conn.execute("""
+            SELECT (SELECT COUNT(*) FROM transactions) + (SELECT COUNT(*) FROM memo_archive) AS total
+        """).fetchone()
+        return row["total"]
+
+    def iter_known_hashes(self) -> Iterator[str]:
+        """
+        Перебираем хэши всех сохранённых транзакций (потоково, без списка в памяти)
+
+        Yields:
+            tx_hash
+        """
+        for table in ("transactions", "memo_archive"):
+            for row in self.conn.execute(f"SELECT tx_hash FROM {table}"):
+                yield row[0]
+
+    def find_known_hashes(self, tx_hashes: List[str]) -> Set[str]:
+        """
+        Какие из хэшей уже сохранены (в transactions или в архиве)
+
+        Args:
+            tx_hashes: список хэшей
+
+        Returns:
+            Множество найденных хэшей
+        """
+        found = set(self._find_existing_hashes(tx_hashes))
+
+        for i in range(0, len(tx_hashes), self.SQL_CHUNK):
+            chunk = tx_hashes[i:i + self.SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT tx_hash FROM memo_archive WHERE tx_hash IN ({placeholders})",
+                chunk
+            ).fetchall()
+            found.update(row["tx_hash"] for row in rows)
+
+        return found
+
+    def write_batch(self, records: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[Optional[int]]:
+        """
+        Пакетно записываем транзакции и их данные в одной SQL-транзакции.
+        Дубликаты определяются для всей пачки сразу: по уже сохранённым
+        хэшам и по повторам внутри самой пачки.
+
+        Args:
+            records: список пар (распарсенная транзакция, данные сообщения).
+                     У транзакции заполнено поле is_valid; данные - результат
+                     валидатора (для identity дополнительно поле address)
+
+        Returns:
+            Список id транзакций в порядке records; None - дубликат
+        """
+        if not records:
+            return []
+
+        with self.conn:
+            existing = self._find_existing_hashes(list({tx["tx_hash"] for tx, _ in records}))
+
+            # Новые транзакции: первая встреча хэша, которого ещё нет в базе
+            new_hashes = set()
+            new_rows = []
+            is_new = []
+            for tx, _ in records:
+                fresh = tx["tx_hash"] not in existing and tx["tx_hash"] not in new_hashes
+                is_new.append(fresh)
+                if fresh:
+                    new_hashes.add(tx["tx_hash"])
+                    new_rows.append((
+                        tx["tx_hash"], tx["sender"], tx["receiver"], tx["amount"],
+                        tx["timestamp"], tx["memo"], int(tx["is_valid"])
+                    ))
+
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO transactions (tx_hash, sender, receiver, amount, timestamp, memo, is_valid)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, new_rows)
+
+            # Получаем id вставленных транзакций одним проходом
+            inserted = self._find_existing_hashes(list(new_hashes))
+
+            tx_ids = []
+            rating_rows = []
+            profile_rows = []
+            rated = []
+            for (tx, data), fresh in zip(records, is_new):
+                tx_id = inserted.get(tx["tx_hash"]) if fresh else None
+                tx_ids.append(tx_id)
+
+                if tx_id is None or not tx["is_valid"]:
+                    continue
+
+                data["tx_id"] = tx_id
+
+                if data.get("type") == "identity":
+                    row = [tx_id, data.get("address", "")]
+                    for field in self.PROFILE_FIELDS:
+                        value = data.get(field)
+                        # Списки и объекты храним как JSON
+                        if isinstance(value, (list, dict)):
+                            value = json.dumps(value, ensure_ascii=False)
+                        row.append(value)
+                    profile_rows.append(row)
+                else:
+                    # Пустой type ("", [], 0) валидатор пропускает как «не указан»
+                    rating_type = data.get("type") or None
+                    rating_rows.append((
+                        tx_id, data.get("rating"), rating_type, data.get("comment"),
+                        data.get("link"), data.get("ref")
+                    ))
+                    rated.append((tx["sender"], tx["receiver"], data.get("rating"), rating_type))
+
+            self.conn.executemany("""
+                INSERT INTO ratings (tx_id, rating, type, comment, link, ref)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rating_rows)
+
+            columns = ", ".join(["tx_id", "address"] + self.PROFILE_FIELDS)
+            placeholders = ", ".join("?" * (len(self.PROFILE_FIELDS) + 2))
+            self.conn.executemany(
+                f"INSERT INTO profiles ({columns}) VALUES ({placeholders})",
+                profile_rows
+            )
+
+            self._update_reputation_aggregates(rated)
+
+        # Новые профили вытесняют из кэша прежние (и отметки «профиля нет»)
+        for row in profile_rows:
+            self.profile_cache.pop(row[1], None)
+
+        self.stats["batches"] += 1
+        self.stats["rows"] += len(new_rows) + len(rating_rows) + len(profile_rows)
+
+        return tx_ids
+
+    def _update_reputation_aggregates(self, rated: List[Tuple[str, str, int, Optional[str]]]):
+        """
+        Добавляем новые рейтинги к агрегатам (вызывается внутри SQL-транзакции write_batch)
+
+        Args:
+            rated: список (sender, receiver, оценка, тип) вставленных рейтингов
+        """
+        if not rated:
+            return
+
+        # Сначала сворачиваем пачку по адресам: одна строка upsert на адрес
+        received = {}
+        given = {}
+        type_counts = {}
+        for sender, receiver, rating, rating_type in rated:
+            entry = received.get(receiver)
+            if entry is None:
+                received[receiver] = [1, rating, rating, rating]
+            else:
+                entry[0] += 1
+                entry[1] += rating
+                entry[2] = min(entry[2], rating)
+                entry[3] = max(entry[3], rating)
+
+            given[sender] = given.get(sender, 0) + 1
+
+            key = (receiver, rating_type or "", rating)
+            type_counts[key] = type_counts.get(key, 0) + 1
+
+        now = int(time.time())
+
+        # Номер изменения берётся уже под блокировкой записи (внутри SQL-транзакции
+        # писателя), поэтому он больше любого номера, который видел читатель до
+        # фиксации этой пачки, - в отличие от времени, которое не упорядочено
+        # с моментом фиксации
+        version = self._next_aggregates_version()
+
+        rows = [
+            (address, count, total, low, high, 0, version, now)
+            for address, (count, total, low, high) in received.items()
+        ]
+        rows.extend((address, 0, 0, None, None, count, version, now) for address, count in given.items())
+
+        # MIN/MAX от NULL дают NULL, поэтому COALESCE с обоими значениями
+        self.conn.executemany("""
+            INSERT INTO reputation_aggregates
+                (address, ratings_count, ratings_sum, rating_min, rating_max, ratings_given, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(address) DO UPDATE SET
+                ratings_count = ratings_count + excluded.ratings_count,
+                ratings_sum = ratings_sum + excluded.ratings_sum,
+                rating_min = COALESCE(MIN(rating_min, excluded.rating_min), rating_min, excluded.rating_min),
+                rating_max = COALESCE(MAX(rating_max, excluded.rating_max), rating_max, excluded.rating_max),
+                ratings_given = ratings_given + excluded.ratings_given,
+                version = excluded.version,
+                updated_at = excluded.updated_at
+        """, rows)
+
+        self.conn.executemany("""
+            INSERT INTO reputation_type_counts (address, type, rating, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(address, type, rating) DO UPDATE SET count = count + excluded.count
+        """, [(address, rating_type, rating, count) for (address, rating_type, rating), count in type_counts.items()])
+
+    def _next_aggregates_version(self) -> int:
+        """
+        Номер следующего изменения агрегатов (вызывается внутри SQL-транзакции
+        записи; номер берётся по индексу, без просмотра таблицы)
+        """
+        # Пустая запись захватывает блокировку записи до чтения номера:
+        # два писателя не могут получить один и тот же номер
+        self.conn.execute("UPDATE reputation_aggregates SET version = version WHERE 0")
+        row = self.conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM reputation_aggregates").fetchone()
+        return row[0]
+
+    def get_reputation_version(self) -> int:
+        """
+        Номер последнего изменения агрегатов
+
+        Returns:
+            Номер (0 - агрегатов нет)
+        """
+        row = self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM reputation_aggregates").fetchone()
+        return row[0]
+
+    def get_reputation_aggregates(self, since_version: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Агрегаты репутации адресов, получивших хотя бы одну оценку
+
+        Args:
+            since_version: только агрегаты, изменённые после этого номера
+                           изменения (см. get_reputation_version)
+
+        Returns:
+            Словарь {адрес: {ratings_count, ratings_sum, rating_min, rating_max,
+            ratings_given, version, by_type}}, где by_type - {тип или None: {оценка: количество}}
+        """
+        aggregates = {}
+
+        condition = "ratings_count > 0"
+        params = ()
+        if since_version is not None:
+            condition += " AND version > ?"
+            params = (since_version,)
+
+        for row in self.conn.execute(f"""
+            SELECT address, ratings_count, ratings_sum, rating_min, rating_max, ratings_given, version
+            FROM reputation_aggregates
+            WHERE {condition}
+        """, params):
+            aggregate = dict(row)
+            aggregate["by_type"] = {}
+            aggregates[row["address"]] = aggregate
+
+        if since_version is None:
+            type_rows = self.conn.execute("SELECT address, type, rating, count FROM reputation_type_counts")
+        else:
+            type_rows = self.conn.execute(f"""
+                SELECT address, type, rating, count FROM reputation_type_counts
+                WHERE address IN (SELECT address FROM reputation_aggregates WHERE {condition})
+            """, params)
+
+        for address, rating_type, rating, count in type_rows:
+            aggregate = aggregates.get(address)
+            if aggregate is not None:
+                aggregate["by_type"].setdefault(rating_type or None, {})[rating] = count
+
+        return aggregates
+
+    def rebuild_reputation_aggregates(self) -> int:
+        """
+        Пересобираем агрегаты репутации с нуля по таблице ratings
+
+        Returns:
+            Количество адресов в агрегатах
+        """
+        with self.conn:
+            # Пересобранные агрегаты получают новый номер изменения:
+            # читатели перечитают их все
+            version = self._next_aggregates_version()
+
+            self.conn.execute("DELETE FROM reputation_aggregates")
+            self.conn.execute("DELETE FROM reputation_type_counts")
+
+            self.conn.execute(f"""
+                INSERT INTO reputation_aggregates
+                    (address, ratings_count, ratings_sum, rating_min, rating_max, ratings_given, version, updated_at)
+                SELECT address, ratings_count, ratings_sum, rating_min, rating_max, ratings_given, ?, ?
+                FROM ({self.AGGREGATES_SQL})
+            """, (version, int(time.time())))
+
+            self.conn.execute(f"""
+                INSERT INTO reputation_type_counts (address, type, rating, count)
+                SELECT address, type, rating, count FROM ({self.TYPE_COUNTS_SQL})
+            """)
+
+        row = self.conn.execute("SELECT COUNT(*) FROM reputation_aggregates").fetchone()
+        return row[0]
+
+    def verify_reputation_aggregates(self) -> List[str]:
+        """
+        Сверяем агрегаты репутации с полным пересчётом по таблице ratings
+
+        Returns:
+            Отсортированный список адресов, агрегаты которых расходятся с пересчётом
+        """
+        columns = "address, ratings_count, ratings_sum, rating_min, rating_max, ratings_given"
+
+        expected = {row[0]: tuple(row) for row in self.conn.execute(f"SELECT {columns} FROM ({self.AGGREGATES_SQL})")}
+        stored = {row[0]: tuple(row) for row in self.conn.execute(f"SELECT {columns} FROM reputation_aggregates")}
+        mismatched = {address for address in expected.keys() | stored.keys()
+                      if expected.get(address) != stored.get(address)}
+
+        expected_types = {tuple(row[:3]): row[3] for row in self.conn.execute(self.TYPE_COUNTS_SQL)}
+        stored_types = {tuple(row[:3]): row[3] for row in self.conn.execute(
+            "SELECT address, type, rating, count FROM reputation_type_counts"
+        )}
+        mismatched.update(key[0] for key in expected_types.keys() | stored_types.keys()
+                          if expected_types.get(key) != stored_types.get(key))
+
+        return sorted(mismatched)
+
+    def _decode_profile(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Строка таблицы profiles -> словарь (списки и объекты разбираются из JSON)"""
+        profile = dict(row)
+        for field in self.PROFILE_JSON_FIELDS:
+            value = profile.get(field)
+            if isinstance(value, str):
+                try:
+                    profile[field] = json.loads(value)
+                except ValueError:
+                    pass
+        return profile
+
+    def _sync_profile_cache(self):
+        """Вытесняем из кэша адреса, профили которых появились после прошлой проверки"""
+        if self.profile_watermark is None:
+            self.profile_cache.clear()
+            self.profile_watermark = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM profiles").fetchone()[0]
+            return
+
+        # Профили могут записываться другим процессом (парсером), поэтому
+        # новые id проверяются одним запросом по первичному ключу
+        for address, profile_id in self.conn.execute(
+            "SELECT address, id FROM profiles WHERE id > ?", (self.profile_watermark,)
+        ):
+            self.profile_cache.pop(address, None)
+            self.profile_watermark = max(self.profile_watermark, profile_id)
+
+    def get_profiles_by_addresses(self, addresses: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Последние профили нескольких адресов: кэш, затем один запрос
+        на SQL_CHUNK адресов, которых нет в кэше
+
+        Args:
+            addresses: адреса (повторы допускаются)
+
+        Returns:
+            Словарь {адрес: профиль или None}; профили общие с кэшем - не изменять
+        """
+        self._sync_profile_cache()
+
+        profiles = {}
+        missing = []
+        for address in dict.fromkeys(addresses):
+            if address in self.profile_cache:
+                self.profile_cache.move_to_end(address)
+                profiles[address] = self.profile_cache[address]
+            else:
+                missing.append(address)
+
+        for i in range(0, len(missing), self.SQL_CHUNK):
+            chunk = missing[i:i + self.SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            found = {}
+            for row in self.conn.execute(f"""
+                SELECT * FROM profiles
+                WHERE id IN (SELECT MAX(id) FROM profiles WHERE address IN ({placeholders}) GROUP BY address)
+            """, chunk):
+                found[row["address"]] = self._decode_profile(row)
+
+            for address in chunk:
+                profile = found.get(address)
+                profiles[address] = profile
+                if self.profile_cache_size:
+                    self.profile_cache[address] = profile
+
+        while len(self.profile_cache) > self.profile_cache_size:
+            self.profile_cache.popitem(last=False)
+
+        return profiles
+
+    def get_profile_by_address(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Последний профиль адреса (через кэш)
+
+        Args:
+            address: адрес
+
+        Returns:
+            Профиль или None
+        """
+        return self.get_profiles_by_addresses([address])[address]
+
+    def archive_memos(self, transactions: List[Dict[str, Any]]) -> int:
+        """
+        Сохраняем транзакции с посторонними сообщениями в сжатый архив
+
+        Args:
+            transactions: распарсенные транзакции (tx_hash, sender, receiver,
+                          amount, timestamp, memo)
+
+        Returns:
+            Сколько транзакций добавлено (уже архивированные пропускаются)
+        """
+        if not transactions:
+            return 0
+
+        rows = []
+        for tx in transactions:
+            payload = json.dumps(
+                [tx["sender"], tx["receiver"], tx["amount"], tx["memo"]],
+                ensure_ascii=False, separators=(",", ":")
+            )
+            rows.append((tx["tx_hash"], tx["timestamp"], zlib.compress(payload.encode("utf-8"), 9)))
+
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO memo_archive (tx_hash, timestamp, data) VALUES (?, ?, ?)",
+                rows
+            )
+            inserted = self.conn.total_changes - before
+
+        self.stats["batches"] += 1
+        self.stats["rows"] += inserted
+
+        return inserted
+
+    def iter_archived_memos(self) -> Iterator[Dict[str, Any]]:
+        """
+        Читаем архив посторонних сообщений (например, чтобы вернуть их
+        в разбор после изменения правил протокола)
+
+        Yields:
+            Словари {tx_hash, sender, receiver, amount, timestamp, memo}
+        """
+        cursor = self.conn.execute("SELECT tx_hash, timestamp, data FROM memo_archive ORDER BY timestamp")
+
+        for row in cursor:
+            sender, receiver, amount, memo = json.loads(zlib.decompress(row["data"]).decode("utf-8"))
+            yield {
+                "tx_hash": row["tx_hash"],
+                "sender": sender,
+                "receiver": receiver,
+                "amount": amount,
+                "timestamp": row["timestamp"],
+                "memo": memo,
+            }
+
+    def close(self):
+        """Закрываем соединение с базой данных"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
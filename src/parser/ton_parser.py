@@ -3,38 +3,127 @@
 Получает транзакции Jetton-токена, валидирует их и сохраняет в базу данных.
 """
 
+import argparse
 import requests
-import time
 import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Set
 
 # Импортируем наши модули
 from database import Database
+from address import try_raw_address
+from events import EventDecoder, JettonTransfer
+from hash_filter import KnownHashes
+from storage import Storage
+from rate_limiter import TokenBucket
+from tonapi_client import TonApiClient, TonApiError
 from validator import RepOWRValidator
 import config
 
+# Чекпоинт «с начала истории»: get_account_transfers листает события
+# назад, пока они не закончатся (больше MAX_PAGES_PER_ACCOUNT страниц -
+# в следующих чтениях, от сохранённого курсора продолжения)
+FULL_HISTORY = {"last_lt": 0, "last_event_id": ""}
+
+
+def error_class(error: Exception) -> str:
+    """
+    Короткий класс ошибки загрузки для очереди повторов
+
+    Args:
+        error: исключение
+
+    Returns:
+        "http_<код>" для ошибок Tonapi, иначе имя класса исключения
+    """
+    if isinstance(error, TonApiError):
+        return f"http_{error.status_code}"
+    return type(error).__name__
+
 
 class TonParser:
     """Класс для парсинга транзакций из TON блокчейна"""
     
-    def __init__(self):
-        """Инициализация парсера"""
-        self.db = Database(config.DATABASE_PATH)
-        self.validator = RepOWRValidator()  # ОБНОВЛЕНО: используем новый валидатор
+    def __init__(self, with_db: bool = True, api_rps: Optional[float] = None, api_cache_bytes: int = 0):
+        """
+        Инициализация парсера
+        
+        Args:
+            with_db: подключаться ли к базе данных (рабочие процессы
+                     backfill.py только загружают и валидируют, в БД не пишут)
+            api_rps: квота запросов в секунду этого парсера (по умолчанию config.API_RPS)
+            api_cache_bytes: объём кэша условных запросов в байтах (0 - без кэша;
+                             включается только долгоживущим watcher.py)
+        """
+        self.db = None
+        self.storage = None
+        self.known_hashes = None
+        # Дошёл ли последний перебор holders до конца списка (см. iter_token_holders)
+        self.holders_complete = True
+        self.validator = RepOWRValidator(cache_size=config.VALIDATION_CACHE_SIZE)  # ОБНОВЛЕНО: используем новый валидатор
         self.api_endpoint = config.TON_API_ENDPOINT
         self.api_key = config.TON_API_KEY
         self.jetton_master = config.JETTON_MASTER_ADDRESS
         
+        # Декодер событий: фильтр по нашему токену считается один раз
+        self.decoder = EventDecoder(self.jetton_master)
+        
+        # Общий ограничитель частоты запросов для всех потоков
+        self.rate_limiter = TokenBucket(api_rps or config.API_RPS)
+        
+        # Один HTTP клиент на весь парсер: пул соединений, повторы, кэш ETag
+        self.client = TonApiClient(
+            self.api_endpoint,
+            self.api_key,
+            rate_limiter=self.rate_limiter,
+            timeout=config.API_TIMEOUT,
+            max_retries=config.API_MAX_RETRIES,
+            pool_size=config.FETCH_CONCURRENCY,
+            cache_bytes=api_cache_bytes,
+            max_retry_after=config.API_MAX_RETRY_AFTER,
+            record_dir=config.API_RECORD_DIR,
+        )
+        
+        if not with_db:
+            return
+        
         # Подключаемся к базе данных
+        self.db = Database(config.DATABASE_PATH)
         self.db.connect()
         
         # Создаём таблицы если их ещё нет
         self.db.create_tables()
+        
+        # Служебное хранилище: чекпоинты инкрементального парсинга
+        self.storage = Storage(config.DATABASE_PATH)
+        self.storage.connect()
+        self.storage.create_tables()
+        
+        # Уже сохранённые транзакции: отсекаем их сразу после декодирования
+        self.known_hashes = self.load_known_hashes()
+    
+    def load_known_hashes(self) -> KnownHashes:
+        """
+        Загружаем хэши сохранённых транзакций (точное множество или
+        фильтр Блума, если хэшей больше KNOWN_HASHES_SET_LIMIT)
+        
+        Returns:
+            Заполненный фильтр
+        """
+        count = self.storage.count_known_hashes()
+        known = KnownHashes(count, config.KNOWN_HASHES_SET_LIMIT, config.KNOWN_HASHES_BLOOM_ERROR)
+        known.update(self.storage.iter_known_hashes())
+        
+        if config.DEBUG_MODE:
+            print(f"✓ Загружено известных транзакций: {known.count} "
+                  f"({'множество' if known.exact else 'фильтр Блума'})")
+        
+        return known
     
     def normalize_address(self, address: str) -> str:
         """
-        Нормализует адрес к единому формату
+        Нормализует адрес к единому формату (raw wc:hex в нижнем регистре)
         
         Args:
             address: адрес в любом формате
@@ -42,20 +131,7 @@ class TonParser:
         Returns:
             нормализованный адрес
         """
-        if not address:
-            return ""
-        
-        address = address.strip()
-        
-        # Если это raw формат (0:...), извлекаем hex часть
-        if address.startswith("0:") or address.startswith("-1:"):
-            return address.split(":", 1)[1].lower()
-        
-        # Если это user-friendly (EQ.../UQ...), убираем префикс
-        if address.startswith("EQ") or address.startswith("UQ"):
-            return address[2:].lower()
-        
-        return address.lower()
+        return try_raw_address(address)
     
     def convert_to_raw_address(self, address: str) -> str:
         """
@@ -66,259 +142,374 @@ class TonParser:
             address: адрес в любом формате (UQ/EQ/raw)
         
         Returns:
-            адрес в raw формате (0:abc123...)
+            адрес в raw формате (0:abc123...); нераспознанный адрес - как есть
         """
-        if not address:
-            return ""
-        
-        address = address.strip()
+        raw_address = try_raw_address(address)
         
-        # Если уже в raw формате - возвращаем как есть
-        if address.startswith("0:") or address.startswith("-1:"):
-            return address
+        if config.DEBUG_MODE and raw_address and ":" not in raw_address:
+            print(f"⚠️ Ошибка конвертации адреса {address}")
         
-        # Для UQ/EQ адресов - декодируем в raw
-        if address.startswith("UQ") or address.startswith("EQ"):
-            try:
-                import base64
-                
-                # Убираем префикс UQ/EQ
-                b64_part = address[2:]
-                
-                # Заменяем URL-safe символы на стандартные base64
-                b64_part = b64_part.replace('-', '+').replace('_', '/')
-                
-                # Добавляем padding если нужно
-                padding = 4 - (len(b64_part) % 4)
-                if padding != 4:
-                    b64_part += '=' * padding
-                
-                # Декодируем
-                decoded = base64.b64decode(b64_part)
-                
-                # Структура: tag(1 байт) + hash(32 байта) + crc(2 байта) = 35 байт
-                if len(decoded) >= 33:
-                    # Извлекаем workchain из первого байта
-                    workchain = decoded[0]
-                    if workchain > 127:
-                        workchain = workchain - 256
-                    
-                    # Извлекаем hash (32 байта после workchain)
-                    hash_bytes = decoded[1:33]
-                    hash_hex = hash_bytes.hex()
-                    
-                    # Формируем raw адрес
-                    raw_address = f"{workchain}:{hash_hex}"
-                    return raw_address
-            except Exception as e:
-                if config.DEBUG_MODE:
-                    print(f"⚠️ Ошибка конвертации адреса {address}: {e}")
-                return address
-        
-        # Если формат неизвестен - возвращаем как есть
-        return address
+        return raw_address
     
-    def get_token_holders(self, limit: int = 1000) -> List[str]:
+    def iter_token_holders(self, page_size: int = 1000) -> Iterator[str]:
         """
-        Получаем список держателей (holders) Jetton токена
+        Постранично перебираем всех держателей (holders) Jetton токена.
+        Генератор: в памяти держится только текущая страница.
+        Если страницу не удалось загрузить, перебор обрывается, а
+        holders_complete остаётся False: вызывающий код отличает
+        неполный список от его настоящего конца.
         
         Args:
-            limit: максимальное количество holders
+            page_size: количество holders на одной странице API
         
-        Returns:
-            Список адресов держателей токена
+        Yields:
+            Адреса держателей токена
         """
-        url = f"{self.api_endpoint}/jettons/{self.jetton_master}/holders"
-        
-        params = {"limit": limit, "offset": 0}
-        
-        headers = {"Accept": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
+        path = f"/jettons/{self.jetton_master}/holders"
         
         print(f"📊 Получаем список держателей токена...")
         
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=config.API_TIMEOUT)
+        offset = 0
+        total = None
+        self.holders_complete = False
+        
+        while True:
+            params = {"limit": page_size, "offset": offset}
             
-            if response.status_code != 200:
-                print(f"⚠ Ошибка {response.status_code}: {response.text[:200]}")
-                return []
+            try:
+                data = self.client.get_json(path, params)
+            except TonApiError as e:
+                print(f"⚠ Ошибка {e}")
+                return
+            except requests.exceptions.RequestException as e:
+                print(f"⚠ Ошибка при запросе holders (offset {offset}): {e}")
+                return
             
-            data = response.json()
             holders = data.get("addresses", [])
             
+            if total is None and data.get("total"):
+                total = data["total"]
+                print(f"✓ Всего держателей токена: {total}")
+            
             if not holders:
-                print(f"⚠ Holders не найдены в ответе")
-                return []
+                if offset == 0:
+                    print(f"⚠ Holders не найдены в ответе")
+                self.holders_complete = True
+                return
             
-            # Конвертируем в список адресов
-            holder_addresses = []
             for holder in holders:
                 if isinstance(holder, dict):
                     address = holder.get("address", "")
                     if address:
-                        holder_addresses.append(address)
+                        yield address
                 elif isinstance(holder, str):
-                    holder_addresses.append(holder)
-            
-            print(f"✓ Найдено {len(holder_addresses)} держателей токена")
+                    yield holder
             
-            return holder_addresses
+            # Неполная страница - значит, она последняя
+            if len(holders) < page_size:
+                self.holders_complete = True
+                return
             
-        except requests.exceptions.RequestException as e:
-            print(f"⚠ Ошибка при запросе holders: {e}")
-            return []
+            offset += len(holders)
     
-    def get_jetton_transfers(self, limit: int = 100) -> List[Dict[str, Any]]:
+    def iter_ingestion_accounts(self) -> Iterator[str]:
         """
-        Получаем список переводов Jetton токена через Tonapi
+        Перебираем аккаунты, историю которых нужно читать, в зависимости
+        от стратегии загрузки (config.INGESTION_STRATEGY):
+        - "events": все holders, полная лента событий каждого;
+        - "jetton_history": все holders, только история нашего Jetton'а;
+        - "collector": только адрес repOWR для identity-сообщений.
+        
+        Yields:
+            Адреса аккаунтов
+        """
+        if config.INGESTION_STRATEGY == "collector":
+            yield config.COLLECTOR_ADDRESS
+            return
         
+        yield from self.iter_token_holders(page_size=config.HOLDERS_PAGE_SIZE)
+    
+    @staticmethod
+    def _continues(checkpoint: Optional[Dict[str, Any]], start: Dict[str, Any]) -> bool:
+        """
+        Продолжает ли сохранённый чекпоинт чтение от start: курсор недочитанной
+        истории с тем же last_lt (например, начатое чтение FULL_HISTORY)
+
         Args:
-            limit: максимальное количество событий на один адрес
-        
+            checkpoint: сохранённый чекпоинт аккаунта или None
+            start: чекпоинт, с которого требуется читать
+
         Returns:
-            Список словарей с данными трансферов
+            True если читать нужно от сохранённого курсора, а не от start
         """
+        return bool(checkpoint and checkpoint.get("resume_before_lt")
+                    and checkpoint["last_lt"] == start["last_lt"])
+    
+    def iter_account_transfers(self, limit: int = 100,
+                               accounts: Optional[Iterable[str]] = None,
+                               start_checkpoints: Optional[Dict[str, Dict[str, Any]]] = None) -> Iterator[Tuple[str, List[JettonTransfer], Optional[Dict[str, Any]]]]:
+        """
+        Стадия загрузки: параллельно читаем историю аккаунтов и отдаём
+        результаты по мере готовности, не накапливая их в памяти.
+        Аккаунты, которые не удалось загрузить, попадают в очередь повторов
+        (fetch_retries) и в результаты не выдаются.
         
-        # Шаг 1: Получаем список holders токена
-        holder_addresses = self.get_token_holders(limit=1000)
+        Args:
+            limit: максимальное количество событий на одну страницу
+            accounts: какие аккаунты читать (по умолчанию iter_ingestion_accounts())
+            start_checkpoints: чекпоинты, с которых читать вместо сохранённых
+                               (например, FULL_HISTORY для повтора backfill);
+                               сохранённый курсор продолжения того же чтения
+                               не сбрасывается
+        
+        Yields:
+            Кортежи (адрес, трансферы аккаунта, новый чекпоинт или None)
+        """
+        print(f"\n🔍 Парсим события аккаунтов (стратегия: {config.INGESTION_STRATEGY}, "
+              f"потоков: {config.FETCH_CONCURRENCY}, лимит {config.API_RPS} RPS)...")
+        
+        # Аккаунты подаются из генератора постранично; в работе держим не больше
+        # max_in_flight аккаунтов, чтобы память не зависела от числа holders
+        holders = iter(accounts) if accounts is not None else self.iter_ingestion_accounts()
+        max_in_flight = config.FETCH_CONCURRENCY * 2
+        in_flight = {}
+        processed = 0
+        failed = 0
+        
+        # Очередь повторов маленькая: загружаем её целиком, чтобы снимать
+        # с неё аккаунты без лишнего запроса к БД на каждый успешный аккаунт
+        queued_retries = self.storage.get_retry_addresses()
+        
+        with ThreadPoolExecutor(max_workers=config.FETCH_CONCURRENCY) as pool:
+            while True:
+                # Дозаполняем очередь задач
+                for address in holders:
+                    # Чекпоинт читаем в основном потоке: соединение SQLite
+                    # нельзя использовать из рабочих потоков
+                    checkpoint = self.storage.get_checkpoint(address)
+                    start = start_checkpoints.get(address) if start_checkpoints else None
+                    if start is not None and not self._continues(checkpoint, start):
+                        checkpoint = start
+                    future = pool.submit(self.get_account_transfers, address, limit, checkpoint)
+                    in_flight[future] = address
+                    if len(in_flight) >= max_in_flight:
+                        break
+                
+                if not in_flight:
+                    break
+                
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    address = in_flight.pop(future)
+                    processed += 1
+                    
+                    # Прогресс
+                    if processed % 10 == 0:
+                        print(f"   [{processed}] аккаунтов обработано")
+                    
+                    try:
+                        transfers, checkpoint = future.result()
+                    except Exception as e:
+                        if config.DEBUG_MODE:
+                            print(f"⚠ Ошибка при парсинге адреса {address[:8]}...: {e}")
+                        # Повторим только этот аккаунт, а не весь проход
+                        self.storage.record_fetch_failures(
+                            {address: error_class(e)}, config.RETRY_BASE_DELAY, config.RETRY_MAX_DELAY
+                        )
+                        queued_retries.add(address)
+                        failed += 1
+                        continue
+                    
+                    if address in queued_retries:
+                        self.storage.clear_fetch_retries([address])
+                        queued_retries.discard(address)
+                    
+                    if config.DEBUG_MODE and transfers:
+                        print(f"   Найдено трансферов: {len(transfers)}")
+                    
+                    yield address, transfers, checkpoint
         
-        if not holder_addresses:
+        if processed == 0:
             print("\n⚠ Не удалось получить список holders")
-            return []
-        
-        # Ограничиваем количество адресов для парсинга
-        max_addresses = 100
-        if len(holder_addresses) > max_addresses:
-            print(f"⚠ Holders слишком много ({len(holder_addresses)})")
-            print(f"   Будем парсить только топ-{max_addresses}")
-            holder_addresses = holder_addresses[:max_addresses]
+        else:
+            print(f"   Всего обработано аккаунтов: {processed}")
         
-        # Шаг 2: Парсим события каждого holder'а
-        all_transfers = []
+        if failed:
+            print(f"   ⚠ Не удалось загрузить аккаунтов: {failed} (поставлены в очередь повторов)")
+    
+    def iter_transfer_batches(self, limit: int = 100, batch_size: int = 500) -> Iterator[Tuple[List[JettonTransfer], Dict[str, Dict[str, Any]]]]:
+        """
+        Собираем трансферы из стадии загрузки в пачки для записи в БД.
+        Дубликаты внутри пачки отбрасываются здесь, между пачками -
+        отсекаются базой (уникальный tx_hash) и попадают в stats["duplicates"].
         
-        print(f"\n🔍 Парсим события {len(holder_addresses)} holders...")
+        Args:
+            limit: максимальное количество событий на одну страницу
+            batch_size: сколько уникальных трансферов набирать в пачку
         
-        for i, address in enumerate(holder_addresses, 1):
-            # Прогресс-бар
-            if i % 10 == 0 or i == len(holder_addresses):
-                print(f"   [{i}/{len(holder_addresses)}] {i * 100 // len(holder_addresses)}%")
+        Yields:
+            Кортежи (трансферы пачки, чекпоинты аккаунтов, целиком вошедших в пачку)
+        """
+        batch = {}
+        checkpoints = {}
+        
+        for address, transfers, checkpoint in self.iter_account_transfers(limit):
+            for transfer in transfers:
+                # tx_hash - хэш транзакции, если есть, иначе event_id
+                if transfer.tx_hash and transfer.tx_hash not in batch:
+                    batch[transfer.tx_hash] = transfer
             
-            # Получаем события адреса
-            url = f"{self.api_endpoint}/accounts/{address}/events"
+            if checkpoint:
+                checkpoints[address] = checkpoint
             
+            if len(batch) >= batch_size:
+                yield list(batch.values()), checkpoints
+                batch = {}
+                checkpoints = {}
+        
+        if batch or checkpoints:
+            yield list(batch.values()), checkpoints
+    
+    def get_account_transfers(self, address: str, limit: int = 100,
+                              checkpoint: Optional[Dict[str, Any]] = None) -> Tuple[List[JettonTransfer], Optional[Dict[str, Any]]]:
+        """
+        Получаем новые трансферы нашего Jetton'а для одного аккаунта.
+        Если для аккаунта есть чекпоинт, листаем события назад (before_lt)
+        только до него; иначе берём одну страницу последних событий.
+        Если за MAX_PAGES_PER_ACCOUNT страниц чекпоинт не достигнут, чекпоинт
+        не двигается: возвращается курсор продолжения, и следующее чтение
+        аккаунта продолжит листать с места остановки.
+        
+        Args:
+            address: адрес аккаунта
+            limit: количество событий на одну страницу
+            checkpoint: текущий чекпоинт аккаунта (читается вызывающим кодом,
+                        метод выполняется в рабочих потоках и не ходит в БД)
+        
+        Returns:
+            Кортеж (список трансферов, новый чекпоинт или None).
+            Чекпоинт равен None, если новых завершённых событий нет.
+            Недочитанный аккаунт возвращает прежний last_lt с полями
+            resume_before_lt, pending_lt и pending_event_id.
+        
+        Raises:
+            TonApiError, requests.exceptions.RequestException: аккаунт
+            не удалось прочитать (чекпоинт не двигается, уже полученные
+            страницы будут перечитаны повтором)
+        """
+        last_lt = checkpoint["last_lt"] if checkpoint else None
+        resume_before_lt = checkpoint.get("resume_before_lt") if checkpoint else None
+        
+        if config.INGESTION_STRATEGY == "events":
+            # Полная лента событий: фильтр по Jetton'у делаем сами
+            path = f"/accounts/{address}/events"
             params = {"limit": limit, "subject_only": "false"}
+        else:
+            # История одного Jetton'а: API отдаёт только события нашего токена,
+            # чужие события аккаунта не скачиваются вовсе. Трансфер между двумя
+            # holders всё равно приходит дважды (из истории каждой стороны):
+            # пропускать уже прочитанных контрагентов нельзя - у них есть
+            # трансферы и с остальными аккаунтами; второй экземпляр отсекается
+            # по хэшу транзакции
+            path = f"/accounts/{address}/jettons/{self.jetton_master}/history"
+            params = {"limit": limit}
+        
+        transfers = []
+        new_checkpoint = None
+        
+        if resume_before_lt:
+            # Продолжаем прошлое недочитанное чтение: новый чекпоинт -
+            # самое свежее событие, найденное в его начале
+            params["before_lt"] = resume_before_lt
+            if checkpoint.get("pending_lt") is not None:
+                new_checkpoint = {"last_lt": checkpoint["pending_lt"],
+                                  "last_event_id": checkpoint.get("pending_event_id") or ""}
+        
+        complete = False
+        
+        for page in range(config.MAX_PAGES_PER_ACCOUNT):
+            data = self.client.get_json(path, params)
             
-            headers = {"Accept": "application/json"}
-            if self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
+            events = data.get("events", [])
             
-            try:
-                response = requests.get(url, params=params, headers=headers, timeout=config.API_TIMEOUT)
-                
-                if response.status_code != 200:
-                    continue
-                
-                data = response.json()
-                events = data.get("events", [])
+            reached_checkpoint = False
+            for event in events:
+                lt = event.get("lt", 0)
                 
-                # Фильтруем JettonTransfer для нашего токена
-                found = 0
-                for event in events:
-                    actions = event.get("actions", [])
-                    for action in actions:
-                        if action.get("type") == "JettonTransfer":
-                            jetton_transfer = action.get("JettonTransfer", {})
-                            
-                            # Проверяем, что это наш токен
-                            jetton_info = jetton_transfer.get("jetton", {})
-                            jetton_address = jetton_info.get("address", "")
-                            
-                            if self.normalize_address(jetton_address) == self.normalize_address(self.jetton_master):
-                                # ВАЖНО: Добавляем timestamp и transaction_hash из события
-                                jetton_transfer["timestamp"] = event.get("timestamp", 0)
-                                jetton_transfer["event_id"] = event.get("event_id", "")
-                                # transaction_hash может быть в самом трансфере или в событии
-                                if not jetton_transfer.get("transaction_hash"):
-                                    jetton_transfer["transaction_hash"] = event.get("event_id", "")
-                                
-                                all_transfers.append(jetton_transfer)
-                                found += 1
+                if last_lt is not None and lt <= last_lt:
+                    reached_checkpoint = True
+                    break
                 
-                if config.DEBUG_MODE and found > 0:
-                    print(f"   Найдено трансферов: {found}")
+                # Незавершённое событие может ещё измениться: чекпоинт
+                # ставим только на завершённое событие старше него
+                # (при продолжении чтения чекпоинт уже известен)
+                if not resume_before_lt:
+                    if event.get("in_progress"):
+                        new_checkpoint = None
+                    elif new_checkpoint is None:
+                        new_checkpoint = {"last_lt": lt, "last_event_id": event.get("event_id", "")}
                 
-                # Небольшая задержка чтобы не перегрузить API
-                time.sleep(0.1)
-                
-            except Exception as e:
-                if config.DEBUG_MODE:
-                    print(f"⚠ Ошибка при парсинге адреса {address[:8]}...: {e}")
-                continue
+                transfers.extend(self.decoder.decode_event(event))
+            
+            # Без чекпоинта (первый запуск) ограничиваемся одной страницей
+            if reached_checkpoint or last_lt is None:
+                complete = True
+                break
+            
+            next_from = data.get("next_from")
+            if not next_from or not events:
+                complete = True
+                break
+            
+            params["before_lt"] = next_from
         
-        # Убираем дубликаты по transaction_hash или event_id
-        unique_transfers = {}
-        for transfer in all_transfers:
-            # Используем transaction_hash, если есть, иначе event_id
-            unique_id = transfer.get("transaction_hash") or transfer.get("event_id", "")
-            if unique_id and unique_id not in unique_transfers:
-                unique_transfers[unique_id] = transfer
+        if complete:
+            # Пропуск дочитан: снимаем курсор продолжения, даже если нового чекпоинта нет
+            if new_checkpoint is None and resume_before_lt:
+                new_checkpoint = {"last_lt": last_lt, "last_event_id": checkpoint.get("last_event_id") or ""}
+            return transfers, new_checkpoint
         
+        # Страницы кончились раньше чекпоинта: события между последней
+        # прочитанной страницей и last_lt ещё не получены
         if config.DEBUG_MODE:
-            print(f"\n✓ Всего трансферов найдено: {len(all_transfers)}")
-            print(f"✓ Уникальных трансферов: {len(unique_transfers)}")
-            if len(all_transfers) > len(unique_transfers):
-                print(f"⚠ Удалено дубликатов: {len(all_transfers) - len(unique_transfers)}")
-        else:
-            print(f"\n✓ Всего трансферов найдено: {len(all_transfers)}")
-            print(f"✓ Уникальных трансферов: {len(unique_transfers)}")
-        
-        return list(unique_transfers.values())
+            print(f"⚠ {address[:8]}...: {config.MAX_PAGES_PER_ACCOUNT} страниц не хватило до чекпоинта, "
+                  f"продолжим со следующего чтения")
+        
+        return transfers, {
+            "last_lt": last_lt,
+            "last_event_id": checkpoint.get("last_event_id") or "",
+            "resume_before_lt": params["before_lt"],
+            "pending_lt": new_checkpoint["last_lt"] if new_checkpoint else None,
+            "pending_event_id": new_checkpoint["last_event_id"] if new_checkpoint else None,
+        }
     
-    def parse_transaction(self, transfer: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def parse_transaction(self, transfer: JettonTransfer) -> Optional[Dict[str, Any]]:
         """
-        Парсим один Jetton трансфер и извлекаем нужные данные
+        Превращаем трансфер в запись для таблицы transactions
         
         Args:
-            transfer: данные трансфера от Tonapi
+            transfer: трансфер из EventDecoder (адреса уже в raw формате)
         
         Returns:
             Словарь с распарсенными данными или None
         """
         try:
-            # Получаем данные трансфера
-            timestamp = transfer.get("timestamp", 0)
-            
-            sender_obj = transfer.get("sender", {})
-            recipient_obj = transfer.get("recipient", {})
-            
-            sender = sender_obj.get("address", "") if isinstance(sender_obj, dict) else ""
-            receiver = recipient_obj.get("address", "") if isinstance(recipient_obj, dict) else ""
-            
             # Получаем сумму
-            amount_str = transfer.get("amount", "0")
-            decimals = transfer.get("jetton", {}).get("decimals", 9)
-            amount = float(amount_str) / (10 ** decimals) if amount_str else 0
-            
-            # Получаем comment (там наше сообщение repOWR)
-            comment = transfer.get("comment", "")
-            
-            # Получаем transaction_hash или event_id
-            tx_hash = transfer.get("transaction_hash") or transfer.get("event_id", "")
+            amount = float(transfer.amount) / (10 ** transfer.decimals) if transfer.amount else 0
             
-            # Проверяем, есть ли comment
-            if not comment:
+            # Проверяем, есть ли comment (там наше сообщение repOWR)
+            if not transfer.comment:
                 return None
             
             # Формируем результат
             result = {
-                "tx_hash": tx_hash if tx_hash else f"transfer_{timestamp}_{sender[:8]}",
-                "sender": sender,
-                "receiver": receiver,
+                "tx_hash": transfer.tx_hash or f"transfer_{transfer.timestamp}_{transfer.sender[:8]}",
+                "sender": transfer.sender,
+                "receiver": transfer.receiver,
                 "amount": amount,
-                "timestamp": timestamp,
-                "memo": comment
+                "timestamp": transfer.timestamp,
+                "memo": transfer.comment
             }
             
             return result
@@ -328,17 +519,14 @@ class TonParser:
                 print(f"⚠ Ошибка парсинга трансфера: {e}")
             return None
     
-    def process_transactions(self, transactions: List[Dict[str, Any]]) -> Dict[str, int]:
+    def new_stats(self) -> Dict[str, int]:
         """
-        Обрабатываем список транзакций: валидируем и сохраняем в БД
-        
-        Args:
-            transactions: список сырых транзакций от API
+        Пустой словарь статистики обработки (см. process_transactions)
         
         Returns:
-            Словарь со статистикой обработки
+            Словарь счётчиков с нулевыми значениями
         """
-        stats = {
+        return {
             "total": 0,
             "parsed": 0,
             "valid": 0,
@@ -346,10 +534,30 @@ class TonParser:
             "saved": 0,
             "duplicates": 0,
             "profiles": 0,  # НОВОЕ: счётчик профилей
-            "ratings": 0     # НОВОЕ: счётчик рейтингов
+            "ratings": 0,    # НОВОЕ: счётчик рейтингов
+            "skipped": 0,    # сообщения не по протоколу (см. MEMO_POLICY)
+            "archived": 0    # из них сохранено в архив memo_archive
         }
+    
+    def prepare_transactions(self, transfers: Iterable[JettonTransfer], stats: Dict[str, int]) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """
+        Парсим и валидируем пачку транзакций (без обращения к БД).
+        Сообщения проверяются одним вызовом validate_many.
         
-        for tx in transactions:
+        Args:
+            transfers: трансферы из EventDecoder
+            stats: словарь статистики (обновляется на месте)
+        
+        Returns:
+            Пары (распарсенная транзакция, данные сообщения) для записи в БД;
+            данные равны None для постороннего сообщения, которое нужно
+            только архивировать. Нераспарсенные транзакции и отброшенные
+            сообщения (MEMO_POLICY = "drop") в результат не попадают
+        """
+        records = []
+        to_validate = []
+        
+        for tx in transfers:
             stats["total"] += 1
             
             # Парсим транзакцию
@@ -369,23 +577,156 @@ class TonParser:
                 print(f"Сумма: {parsed_tx['amount']}")
                 print(f"Комментарий: {parsed_tx['memo'][:50]}...")
             
-            # ОБНОВЛЕНО: Валидируем сообщение (упрощённый или JSON формат)
-            is_valid, data, error = self.validator.validate(parsed_tx["memo"])
+            # Дешёвый фильтр до полной валидации: обычные комментарии
+            # ("спасибо", "за обмен") в горячую таблицу transactions не пишем
+            if config.MEMO_POLICY != "keep" and not self.validator.is_protocol_candidate(parsed_tx["memo"]):
+                stats["skipped"] += 1
+                if config.MEMO_POLICY == "archive":
+                    records.append((parsed_tx, None))
+                elif self.known_hashes is not None:
+                    # Отброшенное сообщение в БД не попадёт: запоминаем его хэш,
+                    # чтобы повтор (трансфер из ленты другой стороны) был дубликатом
+                    self.known_hashes.add_dropped(parsed_tx["tx_hash"])
+                continue
             
+            to_validate.append(parsed_tx)
+        
+        # ОБНОВЛЕНО: Валидируем сообщения пачкой (упрощённый или JSON формат)
+        results = self.validator.validate_many(parsed_tx["memo"] for parsed_tx in to_validate)
+        
+        for i, parsed_tx in enumerate(to_validate):
+            is_valid = results.valid[i]
             parsed_tx["is_valid"] = is_valid
             
             if is_valid:
+                data = results.records[i]
                 stats["valid"] += 1
                 if config.DEBUG_MODE:
                     print(f"✓ Валидно: {data.get('protocol')} - рейтинг {data.get('rating', 'N/A')}")
+                
+                if data.get("type") == "identity":
+                    # Это профиль пользователя
+                    # ВАЖНО: Конвертируем адрес в raw формат для единообразного хранения
+                    data["address"] = self.convert_to_raw_address(parsed_tx["sender"])
             else:
+                data = {}
                 stats["invalid"] += 1
                 if config.DEBUG_MODE:
-                    print(f"✗ Невалидно: {error}")
-            
-            # Сохраняем транзакцию в БД
-            tx_id = self.db.insert_transaction(parsed_tx)
+                    print(f"✗ Невалидно: {results.message(i)}")
             
+            records.append((parsed_tx, data))
+        
+        return records
+    
+    def skip_known(self, transfers: List[JettonTransfer], stats: Dict[str, int]) -> List[JettonTransfer]:
+        """
+        Отбрасываем уже сохранённые трансферы до валидации и записи в БД.
+        Ответы «возможно» фильтра Блума подтверждаются одним запросом к БД.
+        
+        Args:
+            transfers: пачка трансферов
+            stats: словарь статистики (известные считаются в total и duplicates)
+        
+        Returns:
+            Трансферы, которых ещё нет в БД
+        """
+        if self.known_hashes is None:
+            return transfers
+        
+        fresh = []
+        maybe = []
+        for transfer in transfers:
+            known = self.known_hashes.check(transfer.tx_hash)
+            if known is None:
+                maybe.append(transfer)
+            elif not known:
+                fresh.append(transfer)
+        
+        if maybe:
+            found = self.storage.find_known_hashes([transfer.tx_hash for transfer in maybe])
+            fresh.extend(transfer for transfer in maybe if transfer.tx_hash not in found)
+        
+        skipped = len(transfers) - len(fresh)
+        stats["total"] += skipped
+        stats["duplicates"] += skipped
+        
+        return fresh
+    
+    def process_transactions(self, transactions: Iterable[JettonTransfer]) -> Dict[str, int]:
+        """
+        Обрабатываем список транзакций: валидируем и сохраняем в БД
+        
+        Args:
+            transactions: трансферы из EventDecoder (список или генератор)
+        
+        Returns:
+            Словарь со статистикой обработки
+        """
+        stats = self.new_stats()
+        
+        # Обрабатываем и пишем в БД пачками: одна SQL-транзакция на DB_BATCH_SIZE трансферов
+        chunk = []
+        
+        for tx in transactions:
+            chunk.append(tx)
+            if len(chunk) >= config.DB_BATCH_SIZE:
+                self._process_chunk(chunk, stats)
+                chunk = []
+        
+        self._process_chunk(chunk, stats)
+        
+        return stats
+    
+    def _process_chunk(self, chunk: List[JettonTransfer], stats: Dict[str, int]):
+        """
+        Обрабатываем одну пачку: отсекаем известные, валидируем и пишем в БД
+        
+        Args:
+            chunk: пачка трансферов (не больше DB_BATCH_SIZE)
+            stats: словарь статистики process_transactions (обновляется на месте)
+        """
+        pending = self.prepare_transactions(self.skip_known(chunk, stats), stats)
+        self._write_pending(pending, stats)
+    
+    def write_records(self, records: List[Tuple[Dict[str, Any], Dict[str, Any]]], stats: Dict[str, int]):
+        """
+        Записываем уже провалидированные записи пачками по DB_BATCH_SIZE
+        (используется единственным процессом-писателем в backfill.py)
+        
+        Args:
+            records: список пар (распарсенная транзакция, данные сообщения)
+            stats: словарь статистики (обновляется на месте)
+        """
+        for i in range(0, len(records), config.DB_BATCH_SIZE):
+            self._write_pending(records[i:i + config.DB_BATCH_SIZE], stats)
+    
+    def _write_pending(self, pending: List[Tuple[Dict[str, Any], Dict[str, Any]]], stats: Dict[str, int]):
+        """
+        Записываем накопленные записи одной пачкой и обновляем статистику
+        
+        Args:
+            pending: список пар (распарсенная транзакция, данные сообщения)
+            stats: словарь статистики process_transactions (обновляется на месте)
+        """
+        if not pending:
+            return
+        
+        # Посторонние сообщения - в архив, остальное - в transactions
+        archive = [parsed_tx for parsed_tx, data in pending if data is None]
+        if archive:
+            stats["archived"] += self.storage.archive_memos(archive)
+            pending = [record for record in pending if record[1] is not None]
+            if self.known_hashes is not None:
+                self.known_hashes.update(parsed_tx["tx_hash"] for parsed_tx in archive)
+        
+        tx_ids = self.storage.write_batch(pending)
+        
+        if self.known_hashes is not None:
+            self.known_hashes.update(
+                parsed_tx["tx_hash"] for (parsed_tx, _), tx_id in zip(pending, tx_ids) if tx_id is not None
+            )
+        
+        for (parsed_tx, data), tx_id in zip(pending, tx_ids):
             if tx_id is None:
                 # Транзакция уже существует
                 stats["duplicates"] += 1
@@ -393,28 +734,155 @@ class TonParser:
             
             stats["saved"] += 1
             
-            # ОБНОВЛЕНО: Если сообщение валидно, сохраняем данные
-            if is_valid:
-                data["tx_id"] = tx_id
+            if not parsed_tx["is_valid"]:
+                continue
+            
+            if data.get("type") == "identity":
+                stats["profiles"] += 1
                 
-                # Проверяем тип сообщения
-                if data.get("type") == "identity":
-                    # Это профиль пользователя
-                    # ВАЖНО: Конвертируем адрес в raw формат для единообразного хранения
-                    raw_address = self.convert_to_raw_address(parsed_tx["sender"])
-                    data["address"] = raw_address
-                    self.db.insert_profile(data)
-                    stats["profiles"] += 1
-                    
-                    if config.DEBUG_MODE:
-                        print(f"✓ Сохранён профиль: {data.get('nickname')} ({raw_address[:20]}...)")
-                else:
-                    # Это рейтинг
-                    self.db.insert_rating(data)
-                    stats["ratings"] += 1
+                if config.DEBUG_MODE:
+                    print(f"✓ Сохранён профиль: {data.get('nickname')} ({data['address'][:20]}...)")
+            else:
+                stats["ratings"] += 1
+    
+    def ingest(self) -> Dict[str, int]:
+        """
+        Один полный проход: загрузка всех аккаунтов, обработка и запись
+        пачками, сдвиг чекпоинтов
+        
+        Returns:
+            Суммарная статистика process_transactions (пустой словарь,
+            если новых трансферов не было)
+        """
+        stats = {}
+        batches = 0
+        
+        for transfers, checkpoints in self.iter_transfer_batches(config.TRANSACTIONS_LIMIT, config.BATCH_SIZE):
+            if transfers:
+                batch_stats = self.process_transactions(transfers)
+                for key, value in batch_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+                
+                batches += 1
+                print(f"   💾 Пакет #{batches}: {batch_stats['total']} трансферов, сохранено {batch_stats['saved']}")
+            
+            # Трансферы пачки записаны - можно сдвигать чекпоинты её аккаунтов
+            self.storage.save_checkpoints(checkpoints)
+        
+        if not self.holders_complete:
+            print("⚠ Список holders загружен не полностью: проход неполный, "
+                  "остальные аккаунты будут прочитаны следующим запуском")
+        
+        return stats
+    
+    def ingest_account(self, address: str) -> Dict[str, int]:
+        """
+        Догружаем новые трансферы одного аккаунта (от его чекпоинта)
+        и сразу обрабатываем их
+        
+        Args:
+            address: адрес аккаунта
+        
+        Returns:
+            Статистика process_transactions (пустой словарь, если новых трансферов нет)
+        """
+        checkpoint = self.storage.get_checkpoint(address)
+        
+        try:
+            transfers, new_checkpoint = self.get_account_transfers(address, config.TRANSACTIONS_LIMIT, checkpoint)
+        except (TonApiError, requests.exceptions.RequestException) as e:
+            print(f"⚠ Ошибка загрузки {address[:10]}...: {e} (поставлен в очередь повторов)")
+            self.storage.record_fetch_failures(
+                {address: error_class(e)}, config.RETRY_BASE_DELAY, config.RETRY_MAX_DELAY
+            )
+            return {}
+        
+        self.storage.clear_fetch_retries([address])
+        
+        stats = self.process_transactions(transfers) if transfers else {}
+        
+        if new_checkpoint:
+            self.storage.save_checkpoints({address: new_checkpoint})
+        
+        return stats
+    
+    def ingest_accounts(self, addresses: List[str],
+                        start_checkpoints: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[Dict[str, int], Dict[str, int], Set[str]]:
+        """
+        Догружаем и обрабатываем новые трансферы заданных аккаунтов
+        (используется планировщиком режима наблюдения и проходом повторов)
+        
+        Args:
+            addresses: адреса аккаунтов
+            start_checkpoints: чекпоинты, с которых читать вместо сохранённых
+                               (см. iter_account_transfers)
+        
+        Returns:
+            Кортеж (статистика process_transactions,
+                    {адрес: число новых трансферов} для успешно прочитанных аккаунтов,
+                    участники новых трансферов - отправители и получатели)
+        """
+        transfers = []
+        checkpoints = {}
+        activity = {}
+        participants = set()
+        
+        for address, account_transfers, checkpoint in self.iter_account_transfers(config.TRANSACTIONS_LIMIT, addresses, start_checkpoints):
+            activity[address] = len(account_transfers)
+            transfers.extend(account_transfers)
+            if checkpoint:
+                checkpoints[address] = checkpoint
+            
+            for transfer in account_transfers:
+                for party in (transfer.sender, transfer.receiver):
+                    if party:
+                        participants.add(party)
+        
+        stats = self.process_transactions(transfers) if transfers else {}
+        self.storage.save_checkpoints(checkpoints)
+        
+        return stats, activity, participants
+    
+    def retry_failed_accounts(self) -> Dict[str, int]:
+        """
+        Проход повторов: перечитываем только аккаунты из очереди fetch_retries,
+        которым подошло время (с экспоненциальной задержкой между попытками)
+        
+        Returns:
+            Статистика process_transactions (пустой словарь, если повторять нечего)
+        """
+        due = self.storage.get_due_retries(config.RETRY_BATCH_SIZE, config.RETRY_MAX_ATTEMPTS)
+        if not due:
+            return {}
+        
+        addresses = [row["address"] for row in due]
+        
+        # Аккаунты, не загруженные при backfill, читаем с начала истории
+        start_checkpoints = {row["address"]: FULL_HISTORY for row in due if row["full_history"]}
+        
+        print(f"\n🔁 Повтор загрузки аккаунтов: {len(addresses)}")
+        
+        stats, activity, _ = self.ingest_accounts(addresses, start_checkpoints)
+        
+        print(f"   Загружено: {len(activity)} из {len(addresses)}, сохранено {stats.get('saved', 0)}")
         
         return stats
     
+    def run_retries(self):
+        """Запускаем только проход повторов (python ton_parser.py --retry)"""
+        print("=" * 60)
+        print("🔁 Повтор неудачных загрузок (протокол repOWR)")
+        print("=" * 60)
+        
+        summary = self.storage.get_retry_summary(config.RETRY_MAX_ATTEMPTS)
+        print(f"В очереди: {summary['queued']}, пора повторить: {summary['due']}, "
+              f"попытки исчерпаны: {summary['exhausted']}")
+        
+        self.retry_failed_accounts()
+        
+        summary = self.storage.get_retry_summary(config.RETRY_MAX_ATTEMPTS)
+        print(f"\nОсталось в очереди: {summary['queued']}")
+    
     def run(self):
         """Запускаем парсер"""
         print("=" * 60)
@@ -422,21 +890,16 @@ class TonParser:
         print(f"📍 Jetton Master: {self.jetton_master}")
         print("=" * 60)
         
-        # Получаем трансферы
-        print("\n📥 Получаем трансферы из блокчейна...")
+        # Загрузка, валидация и запись идут потоком: каждая пачка
+        # сохраняется, пока следующие аккаунты ещё загружаются
+        print("\n📥 Получаем и обрабатываем трансферы из блокчейна...")
         
-        transfers = self.get_jetton_transfers(limit=config.TRANSACTIONS_LIMIT)
+        stats = self.ingest()
         
-        if not transfers:
+        if not stats:
             print("⚠ Трансферы не найдены")
             return
         
-        print(f"✓ Получено {len(transfers)} трансферов")
-        
-        # Обрабатываем трансферы
-        print("\n⚙️ Обработка трансферов...")
-        stats = self.process_transactions(transfers)
-        
         # Выводим статистику
         print("\n" + "=" * 60)
         print("📊 СТАТИСТИКА ОБРАБОТКИ")
@@ -445,10 +908,16 @@ class TonParser:
         print(f"Успешно распарсено:    {stats['parsed']}")
         print(f"Валидных сообщений:    {stats['valid']}")
         print(f"Невалидных сообщений:  {stats['invalid']}")
+        print(f"Не по протоколу:       {stats['skipped']} (в архиве: {stats['archived']}, политика: {config.MEMO_POLICY})")
         print(f"Сохранено в БД:        {stats['saved']}")
         print(f"Дубликатов (пропущено): {stats['duplicates']}")
         print(f"  - Рейтингов:         {stats['ratings']}")
         print(f"  - Профилей:          {stats['profiles']}")
+        print(f"Запросов к API:        {self.client.stats['requests']} "
+              f"(повторов: {self.client.stats['retries']}, 304: {self.client.stats['not_modified']})")
+        print(f"В очереди повторов:    {self.storage.get_retry_summary(config.RETRY_MAX_ATTEMPTS)['queued']}")
+        cache = self.validator.cache_info()
+        print(f"Кэш валидатора:        {cache['hits']} попаданий, {cache['misses']} промахов")
         
         # Выводим общую статистику БД
         db_stats = self.db.get_stats()
@@ -465,17 +934,29 @@ class TonParser:
     
     def close(self):
         """Закрываем соединение с базой данных"""
-        self.db.close()
+        if self.db:
+            self.db.close()
+        if self.storage:
+            self.storage.close()
+        self.client.close()
 
 
 # Точка входа скрипта
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Парсер трансферов TON (протокол repOWR)")
+    arg_parser.add_argument("--retry", action="store_true",
+                            help="только повторить аккаунты из очереди неудачных загрузок")
+    args = arg_parser.parse_args()
+    
     # Создаём парсер
     parser = TonParser()
     
     try:
         # Запускаем парсинг
-        parser.run()
+        if args.retry:
+            parser.run_retries()
+        else:
+            parser.run()
     except KeyboardInterrupt:
         print("\n\n⚠ Парсинг прерван пользователем")
     except Exception as e:
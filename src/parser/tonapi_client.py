@@ -0,0 +1,310 @@
+"""
+HTTP клиент для Tonapi.
+Один объект на весь парсер: пул keep-alive соединений, сжатие ответов,
+повторы при 429/5xx с экспоненциальной задержкой и условные запросы
+(ETag / Last-Modified), чтобы неизменившиеся данные приходили как 304.
+
+Кэш условных запросов живёт только в памяти процесса, поэтому имеет смысл
+лишь для долгоживущего процесса (watcher.py), который повторяет одни и те
+же запросы; разовый запуск по cron его не включает (cache_bytes=0).
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import TokenBucket
+
+# Brotli декодируется requests только при установленном пакете brotli
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# Разбор JSON - основная часть CPU на каждое загруженное событие (сам обход
+# действий в EventDecoder занимает единицы процентов), а orjson разбирает
+# большие ответы /events примерно вдвое быстрее json - поэтому он обязателен
+import orjson
+
+json_loads = orjson.loads
+
+
+class TonApiError(Exception):
+    """Ошибка ответа Tonapi (не 200 после всех повторов)"""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(f"HTTP {status_code}: {message[:200]}")
+        self.status_code = status_code
+
+
+class TonApiClient:
+    """Клиент Tonapi с пулом соединений, повторами и кэшем ETag"""
+
+    # Коды ответа, при которых запрос имеет смысл повторить
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, endpoint: str, api_key: str = "", rate_limiter: TokenBucket = None,
+                 timeout: float = 30, max_retries: int = 3, backoff: float = 0.5,
+                 pool_size: int = 10, cache_bytes: int = 0, max_retry_after: float = 60,
+                 record_dir: str = ""):
+        """
+        Инициализация клиента
+
+        Args:
+            endpoint: базовый URL API (например https://tonapi.io/v2)
+            api_key: API ключ Tonapi (может быть пустым)
+            rate_limiter: общий ограничитель частоты запросов
+            timeout: таймаут одного запроса в секундах
+            max_retries: сколько раз повторять запрос при 429/5xx и сетевых ошибках
+            backoff: базовая задержка экспоненциального backoff в секундах
+            pool_size: размер пула соединений (не меньше числа потоков)
+            cache_bytes: сколько байт тел ответов с ETag/Last-Modified держать
+                         в кэше условных запросов (0 - кэш выключен)
+            max_retry_after: верхняя граница ожидания по Retry-After в секундах
+            record_dir: каталог для записи ответов (режим захвата для
+                        tonapi_stub.py); пустая строка - не записывать
+        """
+        self.endpoint = endpoint.rstrip("/")
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache_bytes = cache_bytes
+        self.max_retry_after = max_retry_after
+        self.record_dir = record_dir
+
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+        # Заголовки собираем один раз
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING,
+        })
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Кэш условных запросов: {ключ запроса: (etag, last_modified, тело ответа)}.
+        # Храним сырое тело, а не разобранный JSON: его размер известен точно,
+        # а каждый 304 разбирается заново и вызывающий код получает свою копию
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.cache_lock = threading.Lock()
+
+        # Счётчики для статистики
+        self.stats = {"requests": 0, "retries": 0, "not_modified": 0}
+
+    def _cache_key(self, url: str, params: Optional[Dict[str, Any]]) -> str:
+        """Ключ кэша: URL и отсортированные параметры"""
+        if not params:
+            return url
+        return url + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """
+        Сколько ждать перед повтором: Retry-After из ответа (не больше
+        max_retry_after), иначе экспоненциальная задержка backoff * 2^attempt
+
+        Args:
+            attempt: номер попытки (с нуля)
+            response: ответ сервера или None при сетевой ошибке
+
+        Returns:
+            задержка в секундах
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(0.0, delay), self.max_retry_after)
+
+        return self.backoff * (2 ** attempt)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        GET запрос к API с повторами и условным кэшем
+
+        Args:
+            path: путь относительно endpoint (например /accounts/{addr}/events)
+            params: параметры запроса
+
+        Returns:
+            Разобранный JSON ответа
+
+        Raises:
+            TonApiError: сервер вернул ошибку (в т.ч. после всех повторов)
+                         или ответ 200, который не удалось разобрать как JSON
+            requests.exceptions.RequestException: сетевая ошибка после всех повторов
+        """
+        url = f"{self.endpoint}{path}"
+        key = self._cache_key(url, params)
+
+        for attempt in range(self.max_retries + 1):
+            headers = {}
+            with self.cache_lock:
+                cached = self.cache.get(key)
+            if cached:
+                etag, last_modified, _ = cached
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            self._count("requests")
+
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt, None))
+                continue
+
+            if response.status_code == 304 and cached:
+                self._count("not_modified")
+                with self.cache_lock:
+                    if key in self.cache:
+                        self.cache.move_to_end(key)
+                return json_loads(cached[2])
+
+            if response.status_code == 200:
+                # Ответ 200 с телом не в JSON (страница прокси, обрезанный ответ)
+                # - такая же ошибка ответа, как и неуспешный статус
+                try:
+                    data = json_loads(response.content)
+                except ValueError as e:
+                    raise TonApiError(response.status_code, f"ответ не в формате JSON: {e}")
+                self._remember(key, response)
+                if self.record_dir:
+                    self._record(path, params, data)
+                return data
+
+            if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+
+            raise TonApiError(response.status_code, response.text)
+
+    def stream_events(self, path: str, params: Optional[Dict[str, Any]] = None,
+                      read_timeout: float = 60) -> Iterator[Dict[str, Any]]:
+        """
+        Подписка на поток событий в формате Server-Sent Events.
+        Генератор работает, пока сервер держит соединение; при обрыве
+        или тишине дольше read_timeout выбрасывает исключение requests.
+
+        Args:
+            path: путь потока относительно endpoint (например /sse/accounts/transactions)
+            params: параметры подписки
+            read_timeout: максимальная пауза между данными от сервера в секундах
+
+        Yields:
+            Разобранный JSON из поля data каждого события
+        """
+        url = f"{self.endpoint}{path}"
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        self._count("requests")
+
+        response = self.session.get(
+            url, params=params, headers={"Accept": "text/event-stream"},
+            stream=True, timeout=(self.timeout, read_timeout)
+        )
+
+        try:
+            if response.status_code != 200:
+                raise TonApiError(response.status_code, response.text)
+
+            data_lines = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+
+                # Пустая строка завершает событие
+                if not line:
+                    if data_lines:
+                        payload = "\n".join(data_lines)
+                        data_lines = []
+                        try:
+                            yield json.loads(payload)
+                        except ValueError:
+                            # Служебные сообщения (heartbeat и т.п.) пропускаем
+                            pass
+                    continue
+
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+        finally:
+            response.close()
+
+    def _count(self, name: str):
+        """Увеличиваем счётчик статистики (вызывается из разных потоков)"""
+        with self.cache_lock:
+            self.stats[name] += 1
+
+    def _remember(self, key: str, response: requests.Response):
+        """
+        Сохраняем тело ответа в кэш, если сервер прислал ETag или Last-Modified.
+        Самые давно использованные ответы вытесняются, пока кэш больше cache_bytes.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        body = response.content
+
+        if not etag and not last_modified or len(body) > self.cache_bytes:
+            return
+
+        with self.cache_lock:
+            old = self.cache.pop(key, None)
+            if old:
+                self.cached_bytes -= len(old[2])
+
+            self.cache[key] = (etag, last_modified, body)
+            self.cached_bytes += len(body)
+
+            while self.cached_bytes > self.cache_bytes:
+                _, (_, _, evicted) = self.cache.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+
+    def _record(self, path: str, params: Optional[Dict[str, Any]], data: Dict[str, Any]):
+        """
+        Записываем ответ на диск для последующего воспроизведения.
+        Имя файла - хэш пути и параметров, поэтому повторный запрос
+        перезаписывает тот же файл.
+        """
+        params = {k: str(v) for k, v in (params or {}).items()}
+        key = self._cache_key(path, params)
+        filename = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+        with open(os.path.join(self.record_dir, filename), "w", encoding="utf-8") as f:
+            json.dump({"path": path, "params": params, "body": data}, f, ensure_ascii=False)
+
+    def close(self):
+        """Закрываем пул соединений"""
+        self.session.close()
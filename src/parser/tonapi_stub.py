@@ -0,0 +1,432 @@
+"""
+Локальная замена Tonapi для офлайн-прогонов и бенчмарков парсера repOWR.
+Отдаёт либо записанные ранее ответы (config.API_RECORD_DIR), либо
+синтетическую цепочку: N holders, M событий на каждого, настраиваемая
+доля сообщений разных форматов и доля трансферов, видимых с обеих сторон.
+Умеет добавлять задержку и случайные ответы 429.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+
+# Доли форматов сообщений в синтетической цепочке по умолчанию
+DEFAULT_MEMO_MIX = {
+    "simple": 0.30,    # repOWR:5:Комментарий:
+    "json": 0.15,      # {"protocol":"repOWR","rating":5,...}
+    "identity": 0.05,  # {"protocol":"repOWR","type":"identity",...}
+    "other": 0.30,     # обычные комментарии и битые сообщения
+    "empty": 0.20,     # трансфер без комментария
+}
+
+# Комментарии, которые не относятся к протоколу (или нарушают его)
+OTHER_MEMOS = ["спасибо", "thanks!", "обмен #42", "repOWR:9:", "repOWR:5", '{"protocol":"repOWR"', "gm"]
+
+
+def parse_memo_mix(text: str) -> Dict[str, float]:
+    """
+    Разбираем строку вида "simple=0.3,json=0.2,other=0.5"
+
+    Args:
+        text: доли форматов через запятую
+
+    Returns:
+        Словарь {формат: доля}
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() not in DEFAULT_MEMO_MIX:
+            raise ValueError(f"Неизвестный формат сообщения: {name}")
+        mix[name.strip()] = float(value)
+    return mix
+
+
+class SyntheticChain:
+    """Синтетическая история трансферов одного Jetton'а"""
+
+    def __init__(self, jetton_master: str, holders: int = 100, events: int = 20,
+                 memo_mix: Dict[str, float] = None, duplicate_ratio: float = 0.5, seed: int = 1):
+        """
+        Генерируем цепочку
+
+        Args:
+            jetton_master: адрес Jetton мастера
+            holders: количество holders
+            events: количество исходящих трансферов на одного holder'а
+            memo_mix: доли форматов сообщений (см. DEFAULT_MEMO_MIX)
+            duplicate_ratio: доля трансферов, которые видны и в ленте получателя
+            seed: зерно генератора случайных чисел (для воспроизводимости)
+        """
+        self.jetton_master = jetton_master
+        self.memo_mix = memo_mix or DEFAULT_MEMO_MIX
+        self.duplicate_ratio = duplicate_ratio
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.holders = [f"0:{i + 1:064x}" for i in range(holders)]
+
+        # Ленты событий аккаунтов в порядке возрастания lt
+        self.feeds: Dict[str, List[Dict[str, Any]]] = {address: [] for address in self.holders}
+        self.lt = 1000
+        self.transfers = 0
+
+        for _ in range(holders * events):
+            self.append_event()
+
+    def _memo(self) -> Optional[str]:
+        """Выбираем комментарий согласно долям memo_mix"""
+        kind = self.random.choices(list(self.memo_mix), weights=list(self.memo_mix.values()))[0]
+        rating = self.random.randint(1, 5)
+
+        if kind == "simple":
+            return f"repOWR:{rating}:Отзыв {self.random.randint(1, 50)}:"
+        if kind == "json":
+            return json.dumps({
+                "protocol": "repOWR",
+                "rating": rating,
+                "type": self.random.choice(["deal", "service", "product", "general"]),
+                "comment": f"Отзыв {self.random.randint(1, 50)}",
+            }, ensure_ascii=False)
+        if kind == "identity":
+            return json.dumps({
+                "protocol": "repOWR",
+                "type": "identity",
+                "nickname": f"user{self.random.randint(1, 10000)}",
+                "bio": "Синтетический профиль",
+            }, ensure_ascii=False)
+        if kind == "other":
+            return self.random.choice(OTHER_MEMOS)
+        return None
+
+    def append_event(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Добавляем в цепочку один новый трансфер
+
+        Returns:
+            Кортеж (событие, аккаунты в ленты которых оно попало)
+        """
+        with self.lock:
+            sender, receiver = self.random.sample(self.holders, 2) if len(self.holders) > 1 else (self.holders[0],) * 2
+            self.lt += self.random.randint(1, 5)
+            self.transfers += 1
+
+            transfer = {
+                "sender": {"address": sender},
+                "recipient": {"address": receiver},
+                "amount": str(self.random.randint(1, 100) * 10 ** 9),
+                "jetton": {"address": self.jetton_master, "decimals": 9},
+            }
+            memo = self._memo()
+            if memo is not None:
+                transfer["comment"] = memo
+
+            actions = [{"type": "JettonTransfer", "JettonTransfer": transfer}]
+            # Лента аккаунта содержит и чужие действия - как в настоящем API
+            if self.random.random() < 0.3:
+                actions.append({"type": "TonTransfer", "TonTransfer": {"amount": 1000}})
+
+            event = {
+                "event_id": f"{self.lt:064x}",
+                "lt": self.lt,
+                "timestamp": 1700000000 + self.lt,
+                "in_progress": False,
+                "actions": actions,
+            }
+
+            accounts = [sender]
+            if receiver != sender and self.random.random() < self.duplicate_ratio:
+                accounts.append(receiver)
+            for address in accounts:
+                self.feeds[address].append(event)
+
+            return event, accounts
+
+    def holders_page(self, limit: int, offset: int) -> Dict[str, Any]:
+        """Ответ /jettons/{master}/holders"""
+        page = self.holders[offset:offset + limit]
+        return {
+            "addresses": [{"address": address, "balance": "1000000000"} for address in page],
+            "total": len(self.holders),
+        }
+
+    def events_page(self, address: str, limit: int, before_lt: Optional[int],
+                    jetton_only: bool) -> Dict[str, Any]:
+        """Ответ /accounts/{addr}/events и /accounts/{addr}/jettons/{master}/history"""
+        feed = self.feeds.get(address, [])
+        events = []
+
+        with self.lock:
+            for event in reversed(feed):
+                if before_lt is not None and event["lt"] >= before_lt:
+                    continue
+                if jetton_only:
+                    actions = [a for a in event["actions"] if a["type"] == "JettonTransfer"]
+                    event = dict(event, actions=actions)
+                events.append(event)
+                if len(events) > limit:
+                    break
+
+        has_more = len(events) > limit
+        events = events[:limit]
+        return {"events": events, "next_from": events[-1]["lt"] if has_more else 0}
+
+
+class ReplayStore:
+    """Записанные ответы Tonapi (см. TonApiClient.record_dir)"""
+
+    def __init__(self, record_dir: str):
+        """
+        Загружаем записи из каталога
+
+        Args:
+            record_dir: каталог с JSON файлами записей
+        """
+        self.responses = {}
+
+        for filename in os.listdir(record_dir):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(record_dir, filename), encoding="utf-8") as f:
+                record = json.load(f)
+            self.responses[self.key(record["path"], record["params"])] = record["body"]
+
+    @staticmethod
+    def key(path: str, params: Dict[str, str]) -> str:
+        """Ключ записи: путь и отсортированные параметры"""
+        return path + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+    def lookup(self, path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        return self.responses.get(self.key(path, params))
+
+
+class TonApiStub:
+    """Локальный HTTP сервер, имитирующий нужную парсеру часть Tonapi"""
+
+    HOLDERS_RE = re.compile(r"^/jettons/([^/]+)/holders$")
+    EVENTS_RE = re.compile(r"^/accounts/([^/]+)/events$")
+    HISTORY_RE = re.compile(r"^/accounts/([^/]+)/jettons/([^/]+)/history$")
+    STREAM_PATH = "/sse/accounts/transactions"
+
+    def __init__(self, chain: SyntheticChain = None, replay: ReplayStore = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 1):
+        """
+        Инициализация сервера
+
+        Args:
+            chain: синтетическая цепочка (если нет replay)
+            replay: записанные ответы
+            latency: задержка каждого ответа в секундах
+            jitter: случайная добавка к задержке (0..jitter секунд)
+            error_rate: доля запросов, на которые отвечаем 429
+            host, port: адрес сервера (port=0 - любой свободный)
+            seed: зерно для инъекции задержек и ошибок
+        """
+        if chain is None and replay is None:
+            raise ValueError("Нужен источник данных: chain или replay")
+
+        self.chain = chain
+        self.replay = replay
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+        self.stats = {"requests": 0, "throttled": 0, "bytes": 0}
+        self.stats_lock = threading.Lock()
+
+        # Уведомления для подписчиков потока (append_event)
+        self.notifications: List[Dict[str, Any]] = []
+        self.notify = threading.Condition()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """Запускаем сервер в фоновом потоке и возвращаем его URL"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        """Останавливаем сервер"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def append_event(self):
+        """Добавляем новый синтетический трансфер и уведомляем подписчиков потока"""
+        event, accounts = self.chain.append_event()
+        with self.notify:
+            for address in accounts:
+                self.notifications.append({"account_id": address, "lt": event["lt"], "tx_hash": event["event_id"]})
+            self.notify.notify_all()
+
+    def _count(self, name: str, value: int = 1):
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def _should_throttle(self) -> Tuple[float, bool]:
+        """Случайная задержка и решение, отвечать ли 429"""
+        with self.random_lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            throttle = self.error_rate > 0 and self.random.random() < self.error_rate
+        return delay, throttle
+
+    def respond(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Формируем ответ на запрос
+
+        Returns:
+            Кортеж (HTTP код, тело ответа)
+        """
+        if self.replay is not None:
+            body = self.replay.lookup(path, params)
+            if body is None:
+                return 404, {"error": "not recorded"}
+            return 200, body
+
+        limit = int(params.get("limit", 100))
+        before_lt = int(params["before_lt"]) if params.get("before_lt") else None
+
+        match = self.HOLDERS_RE.match(path)
+        if match:
+            return 200, self.chain.holders_page(limit, int(params.get("offset", 0)))
+
+        match = self.EVENTS_RE.match(path)
+        if match:
+            return 200, self.chain.events_page(match.group(1), limit, before_lt, jetton_only=False)
+
+        match = self.HISTORY_RE.match(path)
+        if match:
+            return 200, self.chain.events_page(match.group(1), limit, before_lt, jetton_only=True)
+
+        return 404, {"error": "not found"}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                stub._count("bytes", len(payload))
+
+            def _stream(self):
+                """Поток уведомлений (SSE) о новых трансферах"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                with stub.notify:
+                    position = len(stub.notifications)
+
+                while True:
+                    with stub.notify:
+                        stub.notify.wait_for(lambda: len(stub.notifications) > position, timeout=5)
+                        pending = stub.notifications[position:]
+                        position = len(stub.notifications)
+
+                    try:
+                        if not pending:
+                            self.wfile.write(b": ping\n\n")
+                        for item in pending:
+                            self.wfile.write(f"event: message\ndata: {json.dumps(item)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except OSError:
+                        return
+
+            def do_GET(self):
+                stub._count("requests")
+                parts = urlsplit(self.path)
+                params = dict(parse_qsl(parts.query))
+
+                if parts.path == stub.STREAM_PATH:
+                    self.close_connection = True
+                    self._stream()
+                    return
+
+                delay, throttle = stub._should_throttle()
+                if delay:
+                    time.sleep(delay)
+
+                if throttle:
+                    stub._count("throttled")
+                    self._send_json(429, {"error": "rate limit exceeded"}, {"Retry-After": "0"})
+                    return
+
+                status, body = stub.respond(parts.path, params)
+                self._send_json(status, body)
+
+        return Handler
+
+
+# Точка входа скрипта: сервер для ручных прогонов (в т.ч. watcher.py)
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Локальная замена Tonapi для парсера repOWR")
+    arg_parser.add_argument("--replay", help="каталог с записанными ответами (API_RECORD_DIR)")
+    arg_parser.add_argument("--holders", type=int, default=100, help="количество holders")
+    arg_parser.add_argument("--events", type=int, default=20, help="трансферов на одного holder'а")
+    arg_parser.add_argument("--memo-mix", help="доли форматов, например simple=0.3,json=0.2,other=0.5")
+    arg_parser.add_argument("--duplicate-ratio", type=float, default=0.5, help="доля трансферов, видимых обеим сторонам")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    arg_parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    arg_parser.add_argument("--live-interval", type=float, default=0.0, help="добавлять новый трансфер каждые N сек")
+    arg_parser.add_argument("--port", type=int, default=8081)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    import config
+
+    if args.replay:
+        stub = TonApiStub(replay=ReplayStore(args.replay), latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, port=args.port, seed=args.seed)
+    else:
+        chain = SyntheticChain(
+            config.JETTON_MASTER_ADDRESS, args.holders, args.events,
+            parse_memo_mix(args.memo_mix) if args.memo_mix else None,
+            args.duplicate_ratio, args.seed
+        )
+        stub = TonApiStub(chain=chain, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, port=args.port, seed=args.seed)
+
+    print(f"🧪 Tonapi stub: {stub.start()}  (TON_API_ENDPOINT для config.py)")
+
+    try:
+        while True:
+            if args.live_interval and stub.chain:
+                time.sleep(args.live_interval)
+                stub.append_event()
+            else:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\n📊 Запросов: {stub.stats['requests']}, ответов 429: {stub.stats['throttled']}")
+        stub.stop()
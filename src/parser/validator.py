@@ -3,11 +3,154 @@
 Поддерживает два формата:
 1. Упрощённый: repOWR:5:Комментарий:
 2. JSON: {"protocol":"repOWR","rating":5,...}
+
+Проверки возвращают код ошибки и её параметры; текст ошибки
+собирается только по запросу (validate() или ValidationResults.message()),
+поэтому пакетная проверка validate_many() не тратит время на f-строки.
+
+Правила JSON-сообщений (оценка и профиль) описаны декларативно
+(RATING_SCHEMA, IDENTITY_SCHEMA) и компилируются в одну функцию проверки
+модулем schema; версии схем хранятся в SCHEMAS.
+
+Проверка - чистая функция текста сообщения, поэтому результаты повторяющихся
+сообщений (шаблонные отзывы "repOWR:5:", один и тот же JSON из разных
+кошельков) берутся из LRU-кэша; вызывающий код получает копии данных.
 """
 
 import json
 import re
-from typing import Dict, Any, Tuple, Optional
+from copy import deepcopy
+from functools import lru_cache
+from typing import Dict, Any, Tuple, Optional, List, Iterable
+
+# Импортируем наши модули
+from schema import Field, Schema, Protocol, SchemaRegistry
+
+# ===== Коды ошибок =====
+OK = 0
+E_UNKNOWN_FORMAT = 1
+E_NO_PREFIX = 2
+E_NO_TRAILING_COLON = 3
+E_NO_RATING = 4
+E_RATING_NOT_NUMBER = 5
+E_RATING_RANGE = 6
+E_COMMENT_TOO_LONG = 7
+E_BAD_JSON = 8
+E_NO_PROTOCOL = 9
+E_BAD_PROTOCOL = 10
+E_JSON_NO_RATING = 11
+E_JSON_RATING_TYPE = 12
+E_JSON_RATING_RANGE = 13
+E_BAD_TYPE = 14
+E_COMMENT_TYPE = 15
+E_JSON_COMMENT_TOO_LONG = 16
+E_LINK_TYPE = 17
+E_BAD_URL = 18
+E_REF_TYPE = 19
+E_NO_NICKNAME = 20
+E_NO_BIO = 21
+E_NICKNAME_TYPE = 22
+E_BIO_TYPE = 23
+E_BIO_TOO_LONG = 24
+E_SKILLS_TYPE = 25
+E_SKILL_ITEM_TYPE = 26
+E_LANGUAGES_TYPE = 27
+E_LANGUAGE_ITEM_TYPE = 28
+E_BIRTH_YEAR_TYPE = 29
+E_BIRTH_YEAR_RANGE = 30
+E_LINKS_TYPE = 31
+
+# Тексты ошибок: шаблон форматируется параметрами, которые вернула проверка
+ERROR_MESSAGES = {
+    E_UNKNOWN_FORMAT: "Сообщение не соответствует протоколу repOWR",
+    E_NO_PREFIX: "Сообщение должно начинаться с '{0}:'",
+    E_NO_TRAILING_COLON: "Сообщение должно заканчиваться двоеточием ':'",
+    E_NO_RATING: "Отсутствует рейтинг",
+    E_RATING_NOT_NUMBER: "Рейтинг должен быть числом, получено: '{0}'",
+    E_RATING_RANGE: "Рейтинг должен быть от {0} до {1}, получено: {2}",
+    E_COMMENT_TOO_LONG: "Комментарий слишком длинный: {0} символов (максимум {1})",
+    E_BAD_JSON: "Некорректный JSON: {0}",
+    E_NO_PROTOCOL: "Отсутствует обязательное поле 'protocol'",
+    E_BAD_PROTOCOL: "Неподдерживаемая версия протокола: {0}",
+    E_JSON_NO_RATING: "Отсутствует обязательное поле 'rating'",
+    E_JSON_RATING_TYPE: "Поле 'rating' должно быть целым числом, получено: {0}",
+    E_JSON_RATING_RANGE: "Поле 'rating' должно быть от {0} до {1}, получено: {2}",
+    E_BAD_TYPE: "Недопустимое значение поля 'type': {0}. Допустимые: {1}",
+    E_COMMENT_TYPE: "Поле 'comment' должно быть строкой",
+    E_JSON_COMMENT_TOO_LONG: "Поле 'comment' слишком длинное: {0} символов (максимум {1})",
+    E_LINK_TYPE: "Поле 'link' должно быть строкой",
+    E_BAD_URL: "Некорректный URL в поле 'link': {0}",
+    E_REF_TYPE: "Поле 'ref' должно быть строкой",
+    E_NO_NICKNAME: "Профиль должен содержать поле 'nickname'",
+    E_NO_BIO: "Профиль должен содержать поле 'bio'",
+    E_NICKNAME_TYPE: "Поле 'nickname' должно быть строкой",
+    E_BIO_TYPE: "Поле 'bio' должно быть строкой",
+    E_BIO_TOO_LONG: "Поле 'bio' слишком длинное: {0} символов (максимум {1})",
+    E_SKILLS_TYPE: "Поле 'skills' должно быть массивом",
+    E_SKILL_ITEM_TYPE: "Элементы 'skills' должны быть строками",
+    E_LANGUAGES_TYPE: "Поле 'languages' должно быть массивом",
+    E_LANGUAGE_ITEM_TYPE: "Элементы 'languages' должны быть строками",
+    E_BIRTH_YEAR_TYPE: "Поле 'birth_year' должно быть числом",
+    E_BIRTH_YEAR_RANGE: "Некорректный год рождения: {2}",
+    E_LINKS_TYPE: "Поле 'links' должно быть объектом",
+}
+
+# Простая проверка URL (компилируется один раз при импорте)
+URL_RE = re.compile(
+    r'^https?://'
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'
+    r'localhost|'
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
+    r'(?::\d+)?'
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+# Быстрый путь для самого частого случая - корректного упрощённого
+# сообщения repOWR:N:comment: (всё остальное проверяется полностью)
+SIMPLE_RE = re.compile(r"repOWR:([1-5])(?::(.*))?:\Z", re.DOTALL)
+
+
+def error_message(code: int, args: tuple = ()) -> str:
+    """
+    Текст ошибки по коду
+
+    Args:
+        code: код ошибки (OK - пустая строка)
+        args: параметры ошибки, которые вернула проверка
+
+    Returns:
+        Описание ошибки
+    """
+    if code == OK:
+        return ""
+    return ERROR_MESSAGES[code].format(*args)
+
+
+class ValidationResults:
+    """Результаты пакетной проверки: по одному элементу в каждом списке на сообщение"""
+
+    __slots__ = ("valid", "records", "codes", "args")
+
+    def __init__(self):
+        """Пустые результаты"""
+        self.valid: List[bool] = []
+        self.records: List[Optional[Dict[str, Any]]] = []  # None для невалидных
+        self.codes: List[int] = []
+        self.args: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def message(self, index: int) -> str:
+        """
+        Текст ошибки сообщения (собирается только при вызове)
+
+        Args:
+            index: номер сообщения в пакете
+
+        Returns:
+            Описание ошибки или пустая строка для валидного сообщения
+        """
+        return error_message(self.codes[index], self.args[index])
 
 
 class RepOWRValidator:
@@ -21,10 +164,59 @@ class RepOWRValidator:
     
     # Поддерживаемые форматы
     PROTOCOL_NAME = "repOWR"
+    SIMPLE_PREFIX = f"{PROTOCOL_NAME}:"
     
-    def __init__(self):
-        """Инициализация валидатора"""
-        pass
+    def __init__(self, schema_version: int = None, cache_size: int = 0):
+        """
+        Инициализация валидатора
+        
+        Args:
+            schema_version: версия схем JSON-сообщений (по умолчанию последняя)
+            cache_size: сколько результатов проверки хранить в LRU-кэше (0 - без кэша)
+        """
+        # Скомпилированная проверка полей JSON-сообщения (см. schema.compile_protocol)
+        self._check_fields = SCHEMAS.get(schema_version)
+        
+        # Кэш по тексту сообщения: ключ - сама строка (словарь хранит её хэш
+        # и сравнивает строки при совпадении хэша, коллизии исключены)
+        self.cache_size = max(0, cache_size)
+        if self.cache_size:
+            self._cached_entry = lru_cache(maxsize=self.cache_size)(self._cache_entry)
+            self._check = self._check_cached
+        else:
+            self._check = self.check
+    
+    def cache_info(self) -> Dict[str, int]:
+        """
+        Статистика кэша результатов
+        
+        Returns:
+            Словарь {hits, misses, size, maxsize} (нули, если кэш выключен)
+        """
+        if not self.cache_size:
+            return {"hits": 0, "misses": 0, "size": 0, "maxsize": 0}
+        
+        info = self._cached_entry.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+    
+    def is_protocol_candidate(self, memo: str) -> bool:
+        """
+        Дешёвая предварительная проверка: похоже ли сообщение на repOWR.
+        Не разбирает сообщение - только префикс упрощённого формата или
+        JSON объект с ключом "protocol". Сообщения, не прошедшие проверку,
+        к протоколу точно не относятся (обычные "спасибо", "за обмен" и т.п.)
+        
+        Args:
+            memo: строка с сообщением из поля memo транзакции
+        
+        Returns:
+            True если сообщение нужно проверять полностью (validate)
+        """
+        if memo.startswith(self.SIMPLE_PREFIX):
+            return True
+        
+        # Ключ может быть записан escape-последовательностями ("\u0070rotocol")
+        return memo.lstrip().startswith("{") and ('"protocol"' in memo or "\\u" in memo)
     
     def validate(self, memo: str) -> Tuple[bool, Dict[str, Any], str]:
         """
@@ -40,19 +232,109 @@ class RepOWRValidator:
             - dict: распарсенные данные (или пустой словарь при ошибке)
             - str: описание ошибки (пустая строка если всё ОК)
         """
+        code, data, args = self._check(memo)
+        
+        if code != OK:
+            return False, {}, error_message(code, args)
+        
+        return True, data, ""
+    
+    def validate_many(self, memos: Iterable[str]) -> ValidationResults:
+        """
+        Пакетная проверка сообщений (для backfill и пакетной загрузки).
+        Тексты ошибок не собираются - только коды (см. ValidationResults.message)
+        
+        Args:
+            memos: строки сообщений
+        
+        Returns:
+            Результаты в виде параллельных списков
+        """
+        results = ValidationResults()
+        check = self._check
+        
+        for memo in memos:
+            code, data, args = check(memo)
+            results.valid.append(code == OK)
+            results.records.append(data)
+            results.codes.append(code)
+            results.args.append(args)
+        
+        return results
+    
+    def _cache_entry(self, memo: str) -> Tuple[int, Optional[Dict[str, Any]], tuple, Tuple[str, ...]]:
+        """
+        Результат проверки для кэша: к check() добавляются ключи вложенных
+        списков и словарей данных (чтобы копировать при попадании только их)
+        
+        Args:
+            memo: строка с сообщением
+        
+        Returns:
+            Кортеж (код ошибки, данные, параметры ошибки, вложенные ключи)
+        """
+        code, data, args = self.check(memo)
+        
+        if code != OK:
+            return code, None, args, ()
+        
+        nested = tuple(key for key, value in data.items() if isinstance(value, (list, dict)))
+        return code, data, args, nested
+    
+    def _check_cached(self, memo: str) -> Tuple[int, Optional[Dict[str, Any]], tuple]:
+        """
+        check() через LRU-кэш. Данные в кэше не отдаются наружу - вызывающий
+        код получает копию и может её изменять (парсер добавляет адрес в профиль)
+        
+        Args:
+            memo: строка с сообщением
+        
+        Returns:
+            Кортеж (код ошибки или OK, копия данных, параметры ошибки)
+        """
+        code, data, args, nested = self._cached_entry(memo)
+        
+        if code != OK:
+            return code, None, args
+        
+        result = data.copy()
+        for key in nested:
+            result[key] = deepcopy(data[key])
+        
+        return code, result, args
+    
+    def check(self, memo: str) -> Tuple[int, Optional[Dict[str, Any]], tuple]:
+        """
+        Проверка сообщения без сборки текста ошибки
+        
+        Args:
+            memo: строка с сообщением
+        
+        Returns:
+            Кортеж (код ошибки или OK, данные для валидного сообщения, параметры ошибки)
+        """
+        # Быстрый путь: корректное упрощённое сообщение одним регулярным выражением
+        match = SIMPLE_RE.match(memo)
+        if match:
+            comment = match.group(2)
+            if not comment:
+                return OK, {"protocol": self.PROTOCOL_NAME, "rating": int(match.group(1)), "format": "simple"}, ()
+            if len(comment) <= self.MAX_COMMENT_LENGTH:
+                return OK, {"protocol": self.PROTOCOL_NAME, "rating": int(match.group(1)), "format": "simple",
+                            "comment": comment}, ()
         
         # Определяем формат сообщения
-        if memo.startswith(f"{self.PROTOCOL_NAME}:"):
+        if memo.startswith(self.SIMPLE_PREFIX):
             # Упрощённый формат
-            return self._validate_simple_format(memo)
+            return self._check_simple_format(memo)
         elif memo.strip().startswith("{"):
             # JSON формат
-            return self._validate_json_format(memo)
+            return self._check_json_format(memo)
         else:
             # Неизвестный формат
-            return False, {}, "Сообщение не соответствует протоколу repOWR"
+            return E_UNKNOWN_FORMAT, None, ()
     
-    def _validate_simple_format(self, memo: str) -> Tuple[bool, Dict[str, Any], str]:
+    def _check_simple_format(self, memo: str) -> Tuple[int, Optional[Dict[str, Any]], tuple]:
         """
         Валидация упрощённого формата: repOWR:RATING:COMMENT:
         
@@ -60,16 +342,16 @@ class RepOWRValidator:
             memo: строка сообщения
         
         Returns:
-            Кортеж (валидность, данные, ошибка)
+            Кортеж (код ошибки, данные, параметры ошибки)
         """
         
         # Проверка 1: Должен начинаться с "repOWR:"
-        if not memo.startswith(f"{self.PROTOCOL_NAME}:"):
-            return False, {}, f"Сообщение должно начинаться с '{self.PROTOCOL_NAME}:'"
+        if not memo.startswith(self.SIMPLE_PREFIX):
+            return E_NO_PREFIX, None, (self.PROTOCOL_NAME,)
         
         # Проверка 2: Должен заканчиваться двоеточием
         if not memo.endswith(":"):
-            return False, {}, "Сообщение должно заканчиваться двоеточием ':'"
+            return E_NO_TRAILING_COLON, None, ()
         
         # Убираем префикс "repOWR:" и последнее двоеточие
         content = memo[len(self.PROTOCOL_NAME) + 1:-1]
@@ -79,24 +361,24 @@ class RepOWRValidator:
         
         # Проверка 3: Должен быть хотя бы рейтинг
         if len(parts) == 0 or not parts[0]:
-            return False, {}, "Отсутствует рейтинг"
+            return E_NO_RATING, None, ()
         
         # Проверка 4: Рейтинг должен быть числом
         try:
             rating = int(parts[0])
         except ValueError:
-            return False, {}, f"Рейтинг должен быть числом, получено: '{parts[0]}'"
+            return E_RATING_NOT_NUMBER, None, (parts[0],)
         
         # Проверка 5: Рейтинг в диапазоне 1-5
         if not (self.MIN_RATING <= rating <= self.MAX_RATING):
-            return False, {}, f"Рейтинг должен быть от {self.MIN_RATING} до {self.MAX_RATING}, получено: {rating}"
+            return E_RATING_RANGE, None, (self.MIN_RATING, self.MAX_RATING, rating)
         
         # Извлекаем комментарий (если есть)
         comment = parts[1] if len(parts) > 1 else ""
         
         # Проверка 6: Длина комментария
         if len(comment) > self.MAX_COMMENT_LENGTH:
-            return False, {}, f"Комментарий слишком длинный: {len(comment)} символов (максимум {self.MAX_COMMENT_LENGTH})"
+            return E_COMMENT_TOO_LONG, None, (len(comment), self.MAX_COMMENT_LENGTH)
         
         # Формируем данные в стандартном формате
         data = {
@@ -109,9 +391,9 @@ class RepOWRValidator:
         if comment:
             data["comment"] = comment
         
-        return True, data, ""
+        return OK, data, ()
     
-    def _validate_json_format(self, memo: str) -> Tuple[bool, Dict[str, Any], str]:
+    def _check_json_format(self, memo: str) -> Tuple[int, Optional[Dict[str, Any]], tuple]:
         """
         Валидация JSON формата
         
@@ -119,130 +401,20 @@ class RepOWRValidator:
             memo: строка с JSON-сообщением
         
         Returns:
-            Кортеж (валидность, данные, ошибка)
+            Кортеж (код ошибки, данные, параметры ошибки)
         """
         
         # Шаг 1: Проверяем, что это валидный JSON
         try:
             data = json.loads(memo)
-        except json.JSONDecodeError as e:
-            return False, {}, f"Некорректный JSON: {str(e)}"
-        
-        # Шаг 2: Проверяем обязательное поле "protocol"
-        if "protocol" not in data:
-            return False, {}, "Отсутствует обязательное поле 'protocol'"
-        
-        if data["protocol"] != self.PROTOCOL_NAME:
-            return False, {}, f"Неподдерживаемая версия протокола: {data['protocol']}"
-        
-        # Шаг 3: Определяем тип сообщения
-        message_type = data.get("type")
-        
-        # Если это профиль (identity), валидируем отдельно
-        if message_type == "identity":
-            return self._validate_identity(data)
-        
-        # Для оценок проверяем обязательное поле "rating"
-        if "rating" not in data:
-            return False, {}, "Отсутствует обязательное поле 'rating'"
-        
-        # Проверяем, что rating - это число
-        if not isinstance(data["rating"], int):
-            return False, {}, f"Поле 'rating' должно быть целым числом, получено: {type(data['rating'])}"
-        
-        # Проверяем диапазон rating
-        if not (self.MIN_RATING <= data["rating"] <= self.MAX_RATING):
-            return False, {}, f"Поле 'rating' должно быть от {self.MIN_RATING} до {self.MAX_RATING}, получено: {data['rating']}"
-        
-        # Шаг 4: Проверяем опциональные поля
-        
-        # Проверяем type (если указан)
-        if message_type and message_type not in self.ALLOWED_TYPES:
-            return False, {}, f"Недопустимое значение поля 'type': {message_type}. Допустимые: {', '.join(self.ALLOWED_TYPES)}"
-        
-        # Проверяем длину comment (если указан)
-        if "comment" in data:
-            if not isinstance(data["comment"], str):
-                return False, {}, "Поле 'comment' должно быть строкой"
-            if len(data["comment"]) > self.MAX_COMMENT_LENGTH:
-                return False, {}, f"Поле 'comment' слишком длинное: {len(data['comment'])} символов (максимум {self.MAX_COMMENT_LENGTH})"
-        
-        # Проверяем link (если указан)
-        if "link" in data:
-            if not isinstance(data["link"], str):
-                return False, {}, "Поле 'link' должно быть строкой"
-            if not self._is_valid_url(data["link"]):
-                return False, {}, f"Некорректный URL в поле 'link': {data['link']}"
-        
-        # Проверяем ref (если указан)
-        if "ref" in data:
-            if not isinstance(data["ref"], str):
-                return False, {}, "Поле 'ref' должно быть строкой"
-        
-        # Помечаем как JSON формат
-        data["format"] = "json"
-        
-        # Все проверки пройдены успешно
-        return True, data, ""
-    
-    def _validate_identity(self, data: Dict[str, Any]) -> Tuple[bool, Dict[str, Any], str]:
-        """
-        Валидация профиля пользователя (identity)
-        
-        Args:
-            data: словарь с данными профиля
-        
-        Returns:
-            Кортеж (валидность, данные, ошибка)
-        """
-        
-        # Проверка обязательных полей для профиля
-        if "nickname" not in data:
-            return False, {}, "Профиль должен содержать поле 'nickname'"
-        
-        if "bio" not in data:
-            return False, {}, "Профиль должен содержать поле 'bio'"
-        
-        # Проверяем типы полей
-        if not isinstance(data["nickname"], str):
-            return False, {}, "Поле 'nickname' должно быть строкой"
-        
-        if not isinstance(data["bio"], str):
-            return False, {}, "Поле 'bio' должно быть строкой"
-        
-        # Проверяем длину bio
-        if len(data["bio"]) > 200:
-            return False, {}, f"Поле 'bio' слишком длинное: {len(data['bio'])} символов (максимум 200)"
-        
-        # Проверяем опциональные поля
-        if "skills" in data:
-            if not isinstance(data["skills"], list):
-                return False, {}, "Поле 'skills' должно быть массивом"
-            for skill in data["skills"]:
-                if not isinstance(skill, str):
-                    return False, {}, "Элементы 'skills' должны быть строками"
-        
-        if "languages" in data:
-            if not isinstance(data["languages"], list):
-                return False, {}, "Поле 'languages' должно быть массивом"
-            for lang in data["languages"]:
-                if not isinstance(lang, str):
-                    return False, {}, "Элементы 'languages' должны быть строками"
-        
-        if "birth_year" in data:
-            if not isinstance(data["birth_year"], int):
-                return False, {}, "Поле 'birth_year' должно быть числом"
-            if data["birth_year"] < 1900 or data["birth_year"] > 2020:
-                return False, {}, f"Некорректный год рождения: {data['birth_year']}"
-        
-        if "links" in data:
-            if not isinstance(data["links"], dict):
-                return False, {}, "Поле 'links' должно быть объектом"
-        
-        # Помечаем как JSON формат профиля
-        data["format"] = "json"
-        
-        return True, data, ""
+        except (ValueError, RecursionError) as e:
+            # JSONDecodeError, а также числа длиннее лимита int (ValueError)
+            # и слишком глубокая вложенность (RecursionError)
+            return E_BAD_JSON, None, (str(e),)
+        
+        # Шаг 2: Проверяем поля по схемам: protocol, затем поля профиля
+        # (type = identity) или оценки (все остальные значения type)
+        return self._check_fields(data)
     
     def _is_valid_url(self, url: str) -> bool:
         """
@@ -254,15 +426,55 @@ class RepOWRValidator:
         Returns:
             True если URL выглядит корректно, False если нет
         """
-        url_pattern = re.compile(
-            r'^https?://'
-            r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'
-            r'localhost|'
-            r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
-            r'(?::\d+)?'
-            r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-        
-        return url_pattern.match(url) is not None
+        return URL_RE.match(url) is not None
+
+
+# ===== Схемы JSON-сообщений (docs/protocol.md) =====
+
+# Поле protocol обязательно для всех JSON-сообщений
+PROTOCOL_FIELD = Field("protocol", required=True, choices=(RepOWRValidator.PROTOCOL_NAME,),
+                       errors={"missing": E_NO_PROTOCOL, "choices": E_BAD_PROTOCOL})
+
+# Оценка: {"protocol":"repOWR","rating":5,"type":"deal","comment":"...","link":"...","ref":"..."}
+RATING_SCHEMA = Schema("rating", (
+    Field("rating", required=True, type=int,
+          min=RepOWRValidator.MIN_RATING, max=RepOWRValidator.MAX_RATING,
+          errors={"missing": E_JSON_NO_RATING, "type": E_JSON_RATING_TYPE, "range": E_JSON_RATING_RANGE}),
+    Field("type", skip_empty=True, choices=tuple(RepOWRValidator.ALLOWED_TYPES),
+          errors={"choices": E_BAD_TYPE}),
+    Field("comment", type=str, max_length=RepOWRValidator.MAX_COMMENT_LENGTH,
+          errors={"type": E_COMMENT_TYPE, "length": E_JSON_COMMENT_TOO_LONG}),
+    Field("link", type=str, pattern=URL_RE,
+          errors={"type": E_LINK_TYPE, "pattern": E_BAD_URL}),
+    Field("ref", type=str,
+          errors={"type": E_REF_TYPE}),
+))
+
+# Профиль: {"protocol":"repOWR","type":"identity","nickname":"...","bio":"...",...}
+IDENTITY_SCHEMA = Schema("identity", (
+    Field("nickname", required=True, type=str,
+          errors={"missing": E_NO_NICKNAME, "type": E_NICKNAME_TYPE}),
+    Field("bio", required=True, type=str, max_length=200,
+          errors={"missing": E_NO_BIO, "type": E_BIO_TYPE, "length": E_BIO_TOO_LONG}),
+    Field("skills", type=list, items=str,
+          errors={"type": E_SKILLS_TYPE, "items": E_SKILL_ITEM_TYPE}),
+    Field("languages", type=list, items=str,
+          errors={"type": E_LANGUAGES_TYPE, "items": E_LANGUAGE_ITEM_TYPE}),
+    Field("birth_year", type=int, min=1900, max=2020,
+          errors={"type": E_BIRTH_YEAR_TYPE, "range": E_BIRTH_YEAR_RANGE}),
+    Field("links", type=dict,
+          errors={"type": E_LINKS_TYPE}),
+))
+
+# Версии схем. Новая версия протокола - новая запись, например:
+#   SCHEMAS.register(2, Protocol((PROTOCOL_FIELD,), {"identity": IDENTITY_SCHEMA},
+#                                RATING_SCHEMA.with_fields(Field("link", ...))))
+SCHEMAS = SchemaRegistry()
+SCHEMAS.register(1, Protocol(
+    common=(PROTOCOL_FIELD,),
+    kinds={"identity": IDENTITY_SCHEMA},
+    default=RATING_SCHEMA,
+))
 
 
 # Тестирование валидатора
@@ -0,0 +1,275 @@
+"""
+Бенчмарк пропускной способности валидатора repOWR.
+Генерирует корпус сообщений, похожий на реальный трафик (обычные
+комментарии, шаблонные и уникальные отзывы, профили, битые сообщения
+с каждой причиной отказа), и замеряет сообщений/сек отдельно для каждой
+группы «формат: результат» и для всего корпуса - validate() и
+validate_many(), с кэшем и без.
+
+Корпус (build_memo_corpus) используется и в validator_fuzz.py как
+начальный набор для мутаций.
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+# Импортируем наши модули
+import validator as v
+from validator import RepOWRValidator
+
+# Названия кодов ошибок для отчёта: {код: "E_..."}
+ERROR_NAMES = {value: name for name, value in vars(v).items() if name.startswith("E_")}
+ERROR_NAMES[v.OK] = "OK"
+
+# Доли видов сообщений в корпусе по умолчанию
+DEFAULT_CORPUS_MIX = {
+    "other": 0.45,         # обычные комментарии к переводам
+    "simple": 0.25,        # repOWR:5:Комментарий:
+    "json": 0.12,          # оценка в JSON
+    "identity": 0.03,      # профиль
+    "invalid": 0.15,       # битые сообщения протокола (все причины отказа)
+}
+
+OTHER_MEMOS = ["спасибо", "thanks!", "за обмен", "gm", "обмен #42", "🔥🔥🔥", "payment for order 1832",
+               "Deposit", "https://t.me/omr_market", "{not json at all}"]
+
+SIMPLE_TEMPLATES = ["repOWR:5:", "repOWR:5:Спасибо!:", "repOWR:4:Хорошая работа:", "repOWR:5:Отлично:"]
+
+
+def _invalid_memo(rnd: random.Random) -> str:
+    """Сообщение протокола с одной из причин отказа"""
+    long_text = "x" * 501
+    cases = [
+        "repOWR:5",                                          # нет закрывающего двоеточия
+        "repOWR::",                                          # нет рейтинга
+        "repOWR:пять:",                                      # рейтинг не число
+        f"repOWR:{rnd.choice([0, 6, 10, -1])}:",             # рейтинг вне диапазона
+        f"repOWR:5:{long_text}:",                            # длинный комментарий
+        '{"protocol":"repOWR","rating":5',                   # битый JSON
+        '{"rating":5}',                                      # нет protocol
+        '{"protocol":"repOWR2","rating":5}',                 # чужой протокол
+        '{"protocol":"repOWR","comment":"без оценки"}',      # нет rating
+        '{"protocol":"repOWR","rating":"5"}',                # rating строкой
+        '{"protocol":"repOWR","rating":9}',                  # rating вне диапазона
+        '{"protocol":"repOWR","rating":5,"type":"trade"}',   # недопустимый type
+        '{"protocol":"repOWR","rating":5,"comment":5}',      # comment не строка
+        json.dumps({"protocol": "repOWR", "rating": 5, "comment": long_text}),
+        '{"protocol":"repOWR","rating":5,"link":42}',        # link не строка
+        '{"protocol":"repOWR","rating":5,"link":"t.me/x"}',  # link не URL
+        '{"protocol":"repOWR","rating":5,"ref":1}',          # ref не строка
+        '{"protocol":"repOWR","type":"identity","bio":"b"}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n"}',
+        '{"protocol":"repOWR","type":"identity","nickname":1,"bio":"b"}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":null}',
+        json.dumps({"protocol": "repOWR", "type": "identity", "nickname": "n", "bio": "b" * 201}),
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","skills":"python"}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","skills":["python",1]}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","languages":"ru"}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","languages":[1]}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","birth_year":"1990"}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","birth_year":1800}',
+        '{"protocol":"repOWR","type":"identity","nickname":"n","bio":"b","links":["@n"]}',
+    ]
+    return rnd.choice(cases)
+
+
+def build_memo_corpus(count: int, seed: int = 1, mix: Dict[str, float] = None,
+                      template_share: float = 0.5) -> List[str]:
+    """
+    Генерируем корпус сообщений
+
+    Args:
+        count: количество сообщений
+        seed: зерно генератора случайных чисел
+        mix: доли видов сообщений (см. DEFAULT_CORPUS_MIX)
+        template_share: доля отзывов, повторяющих шаблоны байт в байт
+
+    Returns:
+        Список сообщений
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_CORPUS_MIX
+    kinds = rnd.choices(list(mix), weights=list(mix.values()), k=count)
+    memos = []
+
+    for kind in kinds:
+        templated = rnd.random() < template_share
+
+        if kind == "other":
+            memos.append(rnd.choice(OTHER_MEMOS))
+        elif kind == "simple":
+            memos.append(rnd.choice(SIMPLE_TEMPLATES) if templated
+                         else f"repOWR:{rnd.randint(1, 5)}:Отзыв о сделке {rnd.randint(1, 10 ** 6)}:")
+        elif kind == "json":
+            message = {"protocol": "repOWR", "rating": rnd.randint(1, 5) if not templated else 5}
+            if templated or rnd.random() < 0.7:
+                message["type"] = rnd.choice(RepOWRValidator.ALLOWED_TYPES) if not templated else "deal"
+                message["comment"] = "Всё отлично" if templated else f"Отзыв {rnd.randint(1, 10 ** 6)}"
+            if not templated and rnd.random() < 0.3:
+                message["link"] = f"https://t.me/omr_market/{rnd.randint(1, 10 ** 5)}"
+                message["ref"] = f"0:{rnd.getrandbits(256):064x}"
+            memos.append(json.dumps(message, ensure_ascii=False))
+        elif kind == "identity":
+            memos.append(json.dumps({
+                "protocol": "repOWR",
+                "type": "identity",
+                "nickname": f"user{rnd.randint(1, 10 ** 5)}",
+                "bio": "Разработчик инфраструктуры ОМР",
+                "skills": rnd.sample(["python", "ton", "design", "smm", "php"], 2),
+                "languages": ["ru", "en"],
+                "birth_year": rnd.randint(1960, 2005),
+                "links": {"telegram": f"@user{rnd.randint(1, 10 ** 5)}"},
+            }, ensure_ascii=False))
+        else:
+            memos.append(_invalid_memo(rnd))
+
+    return memos
+
+
+def classify(validator: RepOWRValidator, memo: str) -> str:
+    """
+    Группа сообщения для отчёта: «формат: результат»
+
+    Args:
+        validator: валидатор (без кэша)
+        memo: сообщение
+
+    Returns:
+        Например "json: OK", "simple: E_RATING_RANGE", "identity: E_NO_BIO"
+    """
+    code, _, _ = validator.check(memo)
+
+    if memo.startswith(validator.SIMPLE_PREFIX):
+        kind = "simple"
+    elif memo.strip().startswith("{"):
+        kind = "identity" if '"identity"' in memo else "json"
+    else:
+        kind = "other"
+
+    return f"{kind}: {ERROR_NAMES[code]}"
+
+
+def measure(func, memos: List[str], repeat: int) -> float:
+    """
+    Лучшая пропускная способность из нескольких прогонов
+
+    Args:
+        func: функция, проверяющая список сообщений целиком
+        memos: сообщения
+        repeat: количество прогонов
+
+    Returns:
+        Сообщений в секунду
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(memos)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(memos) / best if best else 0.0
+
+
+def run_validator_benchmark(count: int = 100000, seed: int = 1, repeat: int = 5,
+                            cache_size: int = 100000, mix: Dict[str, float] = None) -> Dict[str, object]:
+    """
+    Замер пропускной способности валидатора
+
+    Args:
+        count: размер корпуса
+        seed: зерно генератора
+        repeat: прогонов на каждый замер (берётся лучший)
+        cache_size: размер кэша для замеров с кэшем
+        mix: доли видов сообщений (см. DEFAULT_CORPUS_MIX)
+
+    Returns:
+        Словарь {corpus: [(вариант, сообщений/сек)], groups: [(группа, количество, validate, validate_many)]}
+    """
+    memos = build_memo_corpus(count, seed, mix)
+    plain = RepOWRValidator()
+
+    # Кэш создаётся заново на каждый прогон: замер включает и промахи
+    def validate_cached(batch):
+        validator = RepOWRValidator(cache_size=cache_size)
+        for memo in batch:
+            validator.validate(memo)
+
+    def validate_many_cached(batch):
+        RepOWRValidator(cache_size=cache_size).validate_many(batch)
+
+    def validate_plain(batch):
+        for memo in batch:
+            plain.validate(memo)
+
+    corpus = [
+        ("validate", measure(validate_plain, memos, repeat)),
+        ("validate_many", measure(plain.validate_many, memos, repeat)),
+        ("validate + кэш", measure(validate_cached, memos, repeat)),
+        ("validate_many + кэш", measure(validate_many_cached, memos, repeat)),
+    ]
+
+    groups = defaultdict(list)
+    for memo in memos:
+        groups[classify(plain, memo)].append(memo)
+
+    rows = []
+    for name in sorted(groups):
+        batch = groups[name]
+        rows.append((name, len(batch), measure(validate_plain, batch, repeat),
+                     measure(plain.validate_many, batch, repeat)))
+
+    return {"count": count, "corpus": corpus, "groups": rows}
+
+
+def print_validator_report(result: Dict[str, object]):
+    """Выводим результаты замера"""
+    print("\n" + "=" * 72)
+    print(f"⏱ ВАЛИДАТОР: корпус {result['count']} сообщений")
+    print("=" * 72)
+    for name, rate in result["corpus"]:
+        print(f"{name:32} {rate:12,.0f} сообщ./с")
+
+    print("-" * 72)
+    print(f"{'Группа (без кэша)':32} {'кол-во':>8} {'validate':>14} {'validate_many':>14}")
+    for name, count, rate, batch_rate in result["groups"]:
+        print(f"{name:32} {count:8} {rate:14,.0f} {batch_rate:14,.0f}")
+    print("=" * 72)
+
+
+def parse_corpus_mix(text: str) -> Dict[str, float]:
+    """
+    Разбираем строку вида "other=0.5,simple=0.3,json=0.2"
+
+    Args:
+        text: доли видов сообщений через запятую
+
+    Returns:
+        Словарь {вид: доля}
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() not in DEFAULT_CORPUS_MIX:
+            raise ValueError(f"Неизвестный вид сообщения: {name}")
+        mix[name.strip()] = float(value)
+    return mix
+
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк валидатора repOWR")
+    arg_parser.add_argument("--count", type=int, default=100000, help="размер корпуса")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="прогонов на замер (берётся лучший)")
+    arg_parser.add_argument("--cache-size", type=int, default=100000, help="размер кэша для замеров с кэшем")
+    arg_parser.add_argument("--mix", help="доли видов сообщений, например other=0.5,simple=0.3,json=0.2")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    print_validator_report(run_validator_benchmark(
+        args.count, args.seed, args.repeat, args.cache_size,
+        parse_corpus_mix(args.mix) if args.mix else None
+    ))
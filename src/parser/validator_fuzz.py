@@ -0,0 +1,416 @@
+"""
+Фаззинг и сверка валидатора repOWR с эталоном.
+Эталон (reference_validate) - прямолинейная запись правил протокола без
+оптимизаций: без быстрого пути регулярным выражением, скомпилированных
+схем и кэша. Скрипт генерирует сообщения (корпус validator_bench.py,
+его мутации, случайные JSON-объекты и патологические входы: глубокая
+вложенность, огромные числа, длинные строки и URL) и проверяет, что:
+
+  - validate(), validate_many() и validate() с кэшем возвращают ровно то же,
+    что эталон (флаг, данные и текст ошибки);
+  - данные из кэша - копии: их изменение не влияет на следующие ответы;
+  - предварительный фильтр is_protocol_candidate() не отбрасывает валидные сообщения;
+  - проверка одного сообщения не бросает исключений и укладывается в --max-ms.
+
+Код возврата 1, если найдено расхождение или медленное сообщение.
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+# Импортируем наши модули
+from validator import RepOWRValidator
+from validator_bench import build_memo_corpus
+
+# ===== Эталон =====
+
+REFERENCE_URL_RE = re.compile(
+    r'^https?://'
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'
+    r'localhost|'
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
+    r'(?::\d+)?'
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+REFERENCE_TYPES = ["deal", "service", "product", "general"]
+
+
+def reference_validate(memo: str) -> Tuple[bool, Dict[str, Any], str]:
+    """
+    Эталонная проверка сообщения (правила протокола без оптимизаций)
+
+    Args:
+        memo: сообщение
+
+    Returns:
+        Кортеж (валидно, данные, описание ошибки) - как RepOWRValidator.validate()
+    """
+    if memo.startswith("repOWR:"):
+        if not memo.endswith(":"):
+            return False, {}, "Сообщение должно заканчиваться двоеточием ':'"
+        parts = memo[len("repOWR:"):-1].split(":", 1)
+        if not parts[0]:
+            return False, {}, "Отсутствует рейтинг"
+        try:
+            rating = int(parts[0])
+        except ValueError:
+            return False, {}, f"Рейтинг должен быть числом, получено: '{parts[0]}'"
+        if not (1 <= rating <= 5):
+            return False, {}, f"Рейтинг должен быть от 1 до 5, получено: {rating}"
+        comment = parts[1] if len(parts) > 1 else ""
+        if len(comment) > 500:
+            return False, {}, f"Комментарий слишком длинный: {len(comment)} символов (максимум 500)"
+        data = {"protocol": "repOWR", "rating": rating, "format": "simple"}
+        if comment:
+            data["comment"] = comment
+        return True, data, ""
+
+    if not memo.strip().startswith("{"):
+        return False, {}, "Сообщение не соответствует протоколу repOWR"
+
+    try:
+        data = json.loads(memo)
+    except (ValueError, RecursionError) as e:
+        return False, {}, f"Некорректный JSON: {e}"
+
+    if "protocol" not in data:
+        return False, {}, "Отсутствует обязательное поле 'protocol'"
+    if data["protocol"] != "repOWR":
+        return False, {}, f"Неподдерживаемая версия протокола: {data['protocol']}"
+
+    if data.get("type") == "identity":
+        if "nickname" not in data:
+            return False, {}, "Профиль должен содержать поле 'nickname'"
+        if "bio" not in data:
+            return False, {}, "Профиль должен содержать поле 'bio'"
+        if not isinstance(data["nickname"], str):
+            return False, {}, "Поле 'nickname' должно быть строкой"
+        if not isinstance(data["bio"], str):
+            return False, {}, "Поле 'bio' должно быть строкой"
+        if len(data["bio"]) > 200:
+            return False, {}, f"Поле 'bio' слишком длинное: {len(data['bio'])} символов (максимум 200)"
+        for field, item_error in (("skills", "Элементы 'skills' должны быть строками"),
+                                  ("languages", "Элементы 'languages' должны быть строками")):
+            if field in data:
+                if not isinstance(data[field], list):
+                    return False, {}, f"Поле '{field}' должно быть массивом"
+                if not all(isinstance(item, str) for item in data[field]):
+                    return False, {}, item_error
+        if "birth_year" in data:
+            if not isinstance(data["birth_year"], int):
+                return False, {}, "Поле 'birth_year' должно быть числом"
+            if not (1900 <= data["birth_year"] <= 2020):
+                return False, {}, f"Некорректный год рождения: {data['birth_year']}"
+        if "links" in data and not isinstance(data["links"], dict):
+            return False, {}, "Поле 'links' должно быть объектом"
+        data["format"] = "json"
+        return True, data, ""
+
+    if "rating" not in data:
+        return False, {}, "Отсутствует обязательное поле 'rating'"
+    if not isinstance(data["rating"], int):
+        return False, {}, f"Поле 'rating' должно быть целым числом, получено: {type(data['rating'])}"
+    if not (1 <= data["rating"] <= 5):
+        return False, {}, f"Поле 'rating' должно быть от 1 до 5, получено: {data['rating']}"
+    if data.get("type") and data["type"] not in REFERENCE_TYPES:
+        return False, {}, f"Недопустимое значение поля 'type': {data['type']}. Допустимые: {', '.join(REFERENCE_TYPES)}"
+    if "comment" in data:
+        if not isinstance(data["comment"], str):
+            return False, {}, "Поле 'comment' должно быть строкой"
+        if len(data["comment"]) > 500:
+            return False, {}, f"Поле 'comment' слишком длинное: {len(data['comment'])} символов (максимум 500)"
+    if "link" in data:
+        if not isinstance(data["link"], str):
+            return False, {}, "Поле 'link' должно быть строкой"
+        if not REFERENCE_URL_RE.match(data["link"]):
+            return False, {}, f"Некорректный URL в поле 'link': {data['link']}"
+    if "ref" in data and not isinstance(data["ref"], str):
+        return False, {}, "Поле 'ref' должно быть строкой"
+    data["format"] = "json"
+    return True, data, ""
+
+
+# ===== Генераторы сообщений =====
+
+# Символы для вставки: разделители форматов, escape-последовательности,
+# не-ASCII цифры (int() их принимает) и пробельные символы
+ALPHABET = list(':{}[]",\\ 0123456789-+.eE_') + ["٣", "５", " ", "\n", "\t", "repOWR", "null", "true",
+                                                  '"protocol"', '"rating"', '"identity"', "\\u0070"]
+
+KEYS = ["protocol", "rating", "type", "comment", "link", "ref", "nickname", "bio", "skills",
+        "languages", "birth_year", "links", "extra"]
+
+VALUES = [None, True, False, 0, 1, 3, 5, 6, -1, 2.0, 1.5, 1e400, 1899, 1900, 2020, 2021, "", "x", "5",
+          "repOWR", "deal", "trade", "identity", "https://t.me/x", "http://localhost:8080/a", "ftp://x",
+          "https://" + "a." * 30 + "com", [], ["a"], ["a", 1], [[]], {}, {"telegram": "@x"}]
+
+
+def mutate(memo: str, corpus: List[str], rnd: random.Random) -> str:
+    """
+    Случайная мутация сообщения
+
+    Args:
+        memo: исходное сообщение
+        corpus: корпус (для склейки с другим сообщением)
+        rnd: генератор случайных чисел
+
+    Returns:
+        Изменённое сообщение
+    """
+    for _ in range(rnd.randint(1, 4)):
+        pos = rnd.randint(0, len(memo))
+        op = rnd.randrange(7)
+        if op == 0:
+            memo = memo[:pos] + rnd.choice(ALPHABET) + memo[pos:]
+        elif op == 1:
+            memo = memo[:pos] + memo[pos + rnd.randint(1, 8):]
+        elif op == 2 and memo:
+            memo = memo[:pos] + rnd.choice(ALPHABET) + memo[pos + 1:]
+        elif op == 3:
+            memo = memo[:pos]
+        elif op == 4:
+            end = min(len(memo), pos + rnd.randint(1, 16))
+            memo = memo[:end] + memo[pos:end] * rnd.randint(1, 50) + memo[end:]
+        elif op == 5:
+            other = rnd.choice(corpus)
+            memo = memo[:pos] + other[rnd.randint(0, len(other)):]
+        else:
+            memo = " " * rnd.randint(1, 3) + memo
+    return memo
+
+
+def random_json(rnd: random.Random) -> str:
+    """Случайный JSON-объект из ключей протокола и значений на границах правил"""
+    data = {}
+    if rnd.random() < 0.9:
+        data["protocol"] = "repOWR" if rnd.random() < 0.9 else rnd.choice(VALUES)
+    if rnd.random() < 0.4:
+        data["type"] = "identity"
+    for key in KEYS[1:]:
+        if rnd.random() < 0.3:
+            data[key] = rnd.choice(VALUES)
+    if "rating" in data and rnd.random() < 0.6:
+        data["rating"] = rnd.randint(1, 5)
+    if "bio" in data and rnd.random() < 0.1:
+        data["bio"] = "b" * rnd.choice([200, 201])
+    if "comment" in data and rnd.random() < 0.1:
+        data["comment"] = "c" * rnd.choice([500, 501])
+
+    text = json.dumps(data, ensure_ascii=rnd.random() < 0.5)
+    if rnd.random() < 0.1:
+        # Ключ через escape-последовательность: "protocol"
+        text = text.replace('"protocol"', '"\\u0070rotocol"', 1)
+    return text
+
+
+def pathological(rnd: random.Random, max_len: int) -> str:
+    """
+    Патологический вход длиной до max_len символов
+
+    Args:
+        rnd: генератор случайных чисел
+        max_len: максимальная длина сообщения
+
+    Returns:
+        Сообщение
+    """
+    n = rnd.randint(max_len // 4, max_len)
+    kind = rnd.randrange(8)
+    if kind == 0:
+        depth = n // 2
+        return '{"protocol":"repOWR","rating":5,"x":' + "[" * depth + "]" * depth + "}"
+    if kind == 1:
+        return '{"protocol":"repOWR","rating":' + "9" * n + "}"
+    if kind == 2:
+        return '{"protocol":"repOWR","rating":5,"link":"http://' + rnd.choice(["a.", "a-", "1.", "a" * 62 + "."]) * (n // 3) + '!"}'
+    if kind == 3:
+        return "repOWR:5:" + ":" * n
+    if kind == 4:
+        return "repOWR:" + "9" * n + ":"
+    if kind == 5:
+        return " " * n + '{"protocol":"repOWR","rating":5}'
+    if kind == 6:
+        return '{"protocol":"repOWR","rating":5,"comment":"' + "\\u0444" * (n // 6) + '"}'
+    return json.dumps({"protocol": "repOWR", "type": "identity", "nickname": "n", "bio": "b",
+                       "skills": ["s"] * (n // 5)})
+
+
+def generate(count: int, seed: int, max_len: int) -> List[str]:
+    """
+    Набор сообщений для фаззинга
+
+    Args:
+        count: количество сообщений
+        seed: зерно генератора
+        max_len: ограничение длины сообщения
+
+    Returns:
+        Список сообщений
+    """
+    rnd = random.Random(seed)
+    corpus = build_memo_corpus(2000, seed)
+    memos = []
+
+    for _ in range(count):
+        roll = rnd.random()
+        if roll < 0.45:
+            memo = mutate(rnd.choice(corpus), corpus, rnd)
+        elif roll < 0.85:
+            memo = random_json(rnd)
+        elif roll < 0.97:
+            memo = rnd.choice(corpus)
+        else:
+            memo = pathological(rnd, max_len)
+        memos.append(memo[:max_len])
+
+    return memos
+
+
+# ===== Проверки =====
+
+def _time_validate(validator: RepOWRValidator, memo: str, repeat: int = 1) -> float:
+    """Лучшее время проверки сообщения, мс"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        validator.validate(memo)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _poke(data: Dict[str, Any]):
+    """Изменяем данные, полученные от валидатора, как это может сделать вызывающий код"""
+    data["address"] = "0:poked"
+    for value in data.values():
+        if isinstance(value, list):
+            value.append("poked")
+        elif isinstance(value, dict):
+            value["poked"] = True
+
+
+def run_fuzz(count: int = 100000, seed: int = 1, max_len: int = 65536, max_ms: float = 50.0,
+             batch_size: int = 500) -> Dict[str, Any]:
+    """
+    Фаззинг валидатора
+
+    Args:
+        count: количество сообщений
+        seed: зерно генератора
+        max_len: ограничение длины сообщения
+        max_ms: допустимое время проверки одного сообщения, мс
+        batch_size: размер пакета для validate_many
+
+    Returns:
+        Словарь {checked, valid, mismatches, slow, slowest}
+    """
+    memos = generate(count, seed, max_len)
+    plain = RepOWRValidator()
+    cached = RepOWRValidator(cache_size=1000)
+
+    mismatches = []
+    timings = []
+    valid = 0
+
+    def report(kind: str, memo: str, got: Any, expected: Any):
+        mismatches.append((kind, memo, got, expected))
+
+    for start in range(0, len(memos), batch_size):
+        batch = memos[start:start + batch_size]
+        expected = [reference_validate(memo) for memo in batch]
+
+        try:
+            results = plain.validate_many(batch)
+        except Exception as e:
+            report("validate_many: исключение", repr(batch[:3]), repr(e), None)
+            continue
+
+        for i, memo in enumerate(batch):
+            want = expected[i]
+            valid += want[0]
+
+            batch_result = (results.valid[i], results.records[i] or {}, results.message(i))
+            if batch_result != want:
+                report("validate_many", memo, batch_result, want)
+
+            try:
+                elapsed = _time_validate(plain, memo)
+                got = plain.validate(memo)
+                first = cached.validate(memo)
+                if first[0]:
+                    _poke(first[1])
+                second = cached.validate(memo)
+            except Exception as e:
+                report("исключение", memo, repr(e), want)
+                continue
+
+            timings.append((elapsed, memo))
+
+            if got != want:
+                report("validate", memo, got, want)
+            if second != want:
+                report("validate + кэш (после изменения копии)", memo, second, want)
+            if want[0] and not plain.is_protocol_candidate(memo):
+                report("is_protocol_candidate отбросил валидное", memo, False, True)
+
+    # Медленные сообщения перемеряем (лучшее из трёх), чтобы не ловить паузы машины
+    timings.sort(key=lambda item: item[0], reverse=True)
+    slowest = [(_time_validate(plain, memo, 3), memo) for _, memo in timings[:20]]
+    slowest.sort(key=lambda item: item[0], reverse=True)
+    slow = [(elapsed, memo) for elapsed, memo in slowest if elapsed > max_ms]
+
+    return {
+        "checked": len(memos),
+        "valid": valid,
+        "mismatches": mismatches,
+        "slow": slow,
+        "slowest": slowest[:5],
+        "max_ms": max_ms,
+    }
+
+
+def _short(value: Any, limit: int = 120) -> str:
+    """Укороченное представление для отчёта"""
+    text = repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} символов)"
+
+
+def print_fuzz_report(result: Dict[str, Any]):
+    """Выводим результаты фаззинга"""
+    print("\n" + "=" * 72)
+    print(f"🧪 ФАЗЗИНГ ВАЛИДАТОРА: {result['checked']} сообщений, валидных по эталону {result['valid']}")
+    print("=" * 72)
+
+    print(f"Расхождений с эталоном: {len(result['mismatches'])}")
+    for kind, memo, got, expected in result["mismatches"][:10]:
+        print(f"  ✗ {kind}: {_short(memo)}")
+        print(f"      получено: {_short(got)}")
+        print(f"      эталон:   {_short(expected)}")
+
+    print(f"Самые медленные (лимит {result['max_ms']} мс):")
+    for elapsed, memo in result["slowest"]:
+        print(f"  {elapsed:8.3f} мс  {_short(memo, 60)}")
+
+    if result["slow"]:
+        print(f"✗ Медленнее лимита: {len(result['slow'])}")
+    print("=" * 72)
+
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Фаззинг и сверка валидатора repOWR с эталоном")
+    arg_parser.add_argument("--count", type=int, default=100000, help="количество сообщений")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--max-len", type=int, default=65536, help="максимальная длина сообщения")
+    arg_parser.add_argument("--max-ms", type=float, default=50.0, help="допустимое время проверки одного сообщения, мс")
+    args = arg_parser.parse_args()
+
+    result = run_fuzz(args.count, args.seed, args.max_len, args.max_ms)
+    print_fuzz_report(result)
+
+    sys.exit(1 if result["mismatches"] or result["slow"] else 0)
@@ -0,0 +1,277 @@
+"""
+Режим наблюдения (daemon) для парсера repOWR.
+Держит процесс, соединение с БД и пул HTTP соединений «тёплыми»,
+подписывается на поток транзакций Tonapi (SSE) и обрабатывает каждое
+уведомление через обычный путь parse → validate → persist.
+При обрыве потока переключается на опрос аккаунтов по адаптивному
+расписанию (см. scheduler.py).
+
+Обрабатываются только уведомления об аккаунтах из расписания (holders
+нашего Jetton'а): JettonNotify приходит на любой токен, и догружать
+чужие аккаунты значит тратить квоту API впустую.
+"""
+
+import time
+from typing import Dict, Any
+
+import requests
+
+# Импортируем наши модули
+from ton_parser import TonParser
+from scheduler import PollScheduler
+from tonapi_client import TonApiError
+import config
+
+
+class Watcher:
+    """Класс для непрерывного отслеживания новых трансферов"""
+
+    def __init__(self, parser: TonParser):
+        """
+        Инициализация наблюдателя
+
+        Args:
+            parser: уже созданный парсер (БД и HTTP клиент переиспользуются)
+        """
+        self.parser = parser
+
+        # Расписание опроса аккаунтов на случай недоступного потока
+        self.scheduler = PollScheduler(config.WATCH_POLL_MIN, config.WATCH_POLL_MAX)
+        self.last_discovery = 0
+        self.last_retry = 0
+
+        # Статистика работы
+        self.stats = {"stream_events": 0, "foreign_events": 0, "polls": 0, "saved": 0,
+                      "reconnects": 0, "errors": 0}
+
+    def handle_notification(self, event: Dict[str, Any]):
+        """
+        Обрабатываем одно уведомление потока: догружаем новые трансферы
+        аккаунта от его чекпоинта и сохраняем их
+
+        Args:
+            event: данные уведомления ({"account_id": ..., "lt": ..., "tx_hash": ...})
+        """
+        address = event.get("account_id")
+        if not address:
+            return
+
+        # Уведомление о чужом аккаунте (другой Jetton) - не тратим на него запросы.
+        # Новые holders попадают в расписание при очередном discover()
+        if address not in self.scheduler:
+            self.stats["foreign_events"] += 1
+            return
+
+        self.stats["stream_events"] += 1
+
+        # Уведомление о транзакции, которая уже учтена чекпоинтом
+        checkpoint = self.parser.storage.get_checkpoint(address)
+        lt = event.get("lt")
+        if checkpoint and lt and int(lt) <= checkpoint["last_lt"]:
+            return
+
+        stats = self.parser.ingest_account(address)
+
+        # Держим расписание в актуальном состоянии и в режиме потока
+        # (аккаунт уже в расписании - чужие уведомления отброшены выше)
+        self.scheduler.record(address, stats.get("total", 0))
+
+        if stats.get("saved"):
+            self.stats["saved"] += stats["saved"]
+            print(f"⚡ {address[:10]}...: сохранено {stats['saved']} "
+                  f"(рейтингов {stats['ratings']}, профилей {stats['profiles']})")
+
+    def listen(self):
+        """
+        Слушаем поток транзакций, пока он не оборвётся
+
+        Raises:
+            исключения requests / TonApiError при обрыве потока
+        """
+        params = {"accounts": config.WATCH_ACCOUNTS}
+        if config.WATCH_OPERATIONS:
+            params["operations"] = config.WATCH_OPERATIONS
+
+        print(f"📡 Подписка на поток {config.WATCH_STREAM_PATH}...")
+
+        for event in self.parser.client.stream_events(
+            config.WATCH_STREAM_PATH, params, read_timeout=config.WATCH_STREAM_TIMEOUT
+        ):
+            # Ошибка обработки одного уведомления не должна останавливать поток
+            try:
+                self.handle_notification(event)
+            except Exception as e:
+                self.report_error("обработки уведомления", e)
+
+            self.retry_failed()
+
+            # Новые holders нужны фильтру handle_notification и в режиме потока
+            if time.time() - self.last_discovery >= config.WATCH_DISCOVERY_INTERVAL:
+                self.discover()
+
+    def report_error(self, stage: str, error: Exception):
+        """
+        Печатаем ошибку, после которой наблюдение продолжается
+
+        Args:
+            stage: что делали (для сообщения)
+            error: исключение
+        """
+        self.stats["errors"] += 1
+        print(f"⚠ Ошибка {stage}: {error}")
+        if config.DEBUG_MODE:
+            import traceback
+            traceback.print_exc()
+
+    def retry_failed(self):
+        """
+        Не чаще раза в RETRY_BASE_DELAY секунд перечитываем аккаунты
+        из очереди повторов (неудачные загрузки потока и опроса)
+        """
+        if time.time() - self.last_retry < config.RETRY_BASE_DELAY:
+            return
+
+        self.last_retry = time.time()
+        stats = self.parser.retry_failed_accounts()
+        self.stats["saved"] += stats.get("saved", 0)
+
+    def discover(self) -> int:
+        """
+        Добавляем в расписание новых holders (известные не трогаем)
+
+        Returns:
+            сколько аккаунтов добавлено
+        """
+        added = 0
+        try:
+            for address in self.parser.iter_ingestion_accounts():
+                if self.scheduler.add(address):
+                    added += 1
+        except Exception as e:
+            self.report_error("обновления списка holders", e)
+
+        self.last_discovery = time.time()
+
+        if added:
+            print(f"➕ Новых аккаунтов в расписании: {added} (всего {len(self.scheduler)})")
+
+        return added
+
+    def poll(self) -> int:
+        """
+        Опрашиваем аккаунты, которым пора по расписанию
+
+        Returns:
+            сколько аккаунтов опрошено
+        """
+        due = self.scheduler.pop_due(config.WATCH_POLL_BATCH)
+        if not due:
+            return 0
+
+        self.stats["polls"] += 1
+        try:
+            stats, activity, participants = self.parser.ingest_accounts(due)
+        except Exception as e:
+            self.report_error("опроса", e)
+            # Забранные аккаунты возвращаем в расписание (как пустой опрос),
+            # иначе они навсегда выпадут из очереди
+            now = time.time()
+            for address in due:
+                self.scheduler.record(address, 0, now)
+            return len(due)
+
+        saved = stats.get("saved", 0)
+        self.stats["saved"] += saved
+
+        now = time.time()
+        for address in due:
+            self.scheduler.record(address, activity.get(address, 0), now)
+
+        # Участники новых трансферов, скорее всего, тоже активны
+        for address in participants:
+            if address not in due:
+                self.scheduler.bump(address, now)
+
+        summary = self.scheduler.summary()
+        print(f"🔁 Опрошено {len(due)} аккаунтов, сохранено {saved} "
+              f"(активных {summary['hot']}, спящих {summary['cold']} из {summary['accounts']})")
+
+        return len(due)
+
+    def poll_until(self, deadline: float):
+        """
+        Опрос по расписанию до указанного момента (пока поток недоступен)
+
+        Args:
+            deadline: время (time.time()), когда пробовать переподключиться к потоку
+        """
+        while time.time() < deadline:
+            if time.time() - self.last_discovery >= config.WATCH_DISCOVERY_INTERVAL:
+                self.discover()
+
+            self.retry_failed()
+
+            if self.poll():
+                continue
+
+            wait = self.scheduler.next_due_in()
+            if wait is None:
+                wait = config.WATCH_POLL_MIN
+            time.sleep(max(0.0, min(wait, deadline - time.time())))
+
+    def run_forever(self):
+        """Основной цикл: поток, а при его обрыве - опрос и переподключение"""
+        print("=" * 60)
+        print("👁 Режим наблюдения repOWR")
+        print(f"📍 Jetton Master: {self.parser.jetton_master}")
+        print("=" * 60)
+
+        # Стартовый проход: догоняем всё, что появилось, пока процесс не работал
+        self.discover()
+        while self.poll():
+            pass
+
+        while True:
+            try:
+                self.listen()
+                print("⚠ Поток закрыт сервером")
+            except TonApiError as e:
+                # Отказ в подписке (кроме 429) - ошибка настройки: переподключение
+                # с теми же параметрами его не исправит
+                if 400 <= e.status_code < 500 and e.status_code != 429:
+                    print(f"❌ Подписка на поток отклонена ({e}): проверьте WATCH_ACCOUNTS, "
+                          f"WATCH_OPERATIONS и TON_API_KEY")
+                    raise
+                print(f"⚠ Поток недоступен: {e}")
+            except requests.exceptions.RequestException as e:
+                print(f"⚠ Поток недоступен: {e}")
+
+            self.stats["reconnects"] += 1
+
+            # Пока потока нет, новые трансферы догоняем опросом по расписанию
+            self.poll_until(time.time() + config.WATCH_RECONNECT_INTERVAL)
+
+
+# Точка входа скрипта
+if __name__ == "__main__":
+    # Создаём парсер и наблюдателя
+    parser = TonParser(api_cache_bytes=config.WATCH_API_CACHE_BYTES)
+    watcher = Watcher(parser)
+
+    try:
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠ Наблюдение прервано пользователем")
+    except Exception as e:
+        print(f"\n❌ Критическая ошибка: {e}")
+        if config.DEBUG_MODE:
+            import traceback
+            traceback.print_exc()
+    finally:
+        # Закрываем соединения
+        parser.close()
+        print(f"\n📊 Событий потока: {watcher.stats['stream_events']} "
+              f"(чужих отброшено: {watcher.stats['foreign_events']}), "
+              f"опросов: {watcher.stats['polls']}, сохранено: {watcher.stats['saved']}, "
+              f"ошибок: {watcher.stats['errors']}")
+        print("\n👋 Наблюдатель остановлен")
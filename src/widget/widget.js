@@ -342,9 +342,32 @@
     // - user-friendly: UQATKnig... (base64url, 48 символов)
     // - raw: 0:5324a7b... (workchain:hex)
     // В базе хранится raw формат, поэтому конвертируем перед запросом
+    // CRC16-XMODEM — контрольная сумма user-friendly адресов
+    function crc16(bytes) {
+        let crc = 0;
+        for (const byte of bytes) {
+            crc ^= byte << 8;
+            for (let i = 0; i < 8; i++) {
+                crc = (crc & 0x8000) ? ((crc << 1) ^ 0x1021) : (crc << 1);
+                crc &= 0xFFFF;
+            }
+        }
+        return crc;
+    }
+
+    // Тот же алгоритм, что и address.py в парсере: результат всегда
+    // "wc:hex" с hex в нижнем регистре, как адреса хранятся в базе
     function toRawAddress(address) {
-        // Если уже raw формат (начинается с "0:" или "-1:") — возвращаем как есть
-        if (/^-?[0-9]+:[a-fA-F0-9]{64}$/.test(address)) {
+        address = address.trim();
+
+        // Если уже raw формат (начинается с "0:" или "-1:") — приводим hex к нижнему регистру
+        const raw = /^(-?[0-9]+):([a-fA-F0-9]{64})$/.exec(address);
+        if (raw) {
+            return `${parseInt(raw[1], 10)}:${raw[2].toLowerCase()}`;
+        }
+
+        // User-friendly адрес: 36 байт в base64 = 48 символов
+        if (!/^[A-Za-z0-9+/_-]{48}$/.test(address)) {
             return address;
         }
 
@@ -353,7 +376,11 @@
             const b64 = address.replace(/-/g, '+').replace(/_/g, '/');
             // Декодируем base64 в бинарные данные
             const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
-            // Структура TON адреса: 2 байта флагов + 1 байт workchain + 32 байта хэша + 2 байта CRC
+            // Структура TON адреса: 1 байт флагов + 1 байт workchain + 32 байта хэша + 2 байта CRC
+            // Проверяем контрольную сумму, чтобы не искать по опечатке
+            if (crc16(bytes.slice(0, 34)) !== ((bytes[34] << 8) | bytes[35])) {
+                return address;
+            }
             // Байт 1 = workchain (подписанный байт)
             const workchain = new Int8Array([bytes[1]])[0]; // signed byte
             // Байты 2-33 = 32 байта хэша адреса